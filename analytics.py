@@ -0,0 +1,302 @@
+import asyncio
+import heapq
+import json
+import logging
+import os
+import time
+from collections import Counter
+
+from config import (
+    VOICE_ANALYTICS_PATH,
+    VOICE_ANALYTICS_CHECKPOINT_INTERVAL,
+    VOICE_ANALYTICS_RETENTION_DAYS,
+)
+
+logger = logging.getLogger(__name__)
+
+DAY = 86400
+
+# Ações de moderadores contadas
+ACTION_MOVE = 'move'
+ACTION_DISCONNECT = 'disconnect'
+
+
+class GuildVoiceStats:
+    """Agregados de voz de um servidor"""
+
+    __slots__ = ('sessions', 'member_seconds', 'channel_seconds', 'member_days', 'moderator_actions')
+
+    def __init__(self):
+        # member_id -> (channel_id, entrada em epoch) das sessões abertas
+        self.sessions = {}
+        # Tempo acumulado (segundos) de sessões já encerradas
+        self.member_seconds = Counter()
+        self.channel_seconds = Counter()
+        # member_id -> {dia (epoch // 86400, UTC) -> segundos}
+        self.member_days = {}
+        # (moderator_id, ação) -> quantidade
+        self.moderator_actions = Counter()
+
+    def to_dict(self):
+        return {
+            'sessions': {str(member_id): list(session) for member_id, session in self.sessions.items()},
+            'member_seconds': {str(key): value for key, value in self.member_seconds.items()},
+            'channel_seconds': {str(key): value for key, value in self.channel_seconds.items()},
+            'member_days': {
+                str(member_id): {str(day): seconds for day, seconds in days.items()}
+                for member_id, days in self.member_days.items()
+            },
+            'moderator_actions': [[moderator_id, action, count]
+                                  for (moderator_id, action), count in self.moderator_actions.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.sessions = {int(member_id): tuple(session) for member_id, session in data.get('sessions', {}).items()}
+        stats.member_seconds = Counter({int(key): value for key, value in data.get('member_seconds', {}).items()})
+        stats.channel_seconds = Counter({int(key): value for key, value in data.get('channel_seconds', {}).items()})
+        stats.member_days = {
+            int(member_id): {int(day): seconds for day, seconds in days.items()}
+            for member_id, days in data.get('member_days', {}).items()
+        }
+        stats.moderator_actions = Counter({
+            (moderator_id, action): count for moderator_id, action, count in data.get('moderator_actions', [])
+        })
+        return stats
+
+
+class VoiceAnalytics:
+    """Tempo em voz por membro e canal e ações de moderadores, agregados incrementalmente
+
+    Cada evento de voz atualiza os totais em O(1); as consultas usam apenas os
+    agregados (nunca o histórico de eventos). O estado é gravado em JSON a cada
+    VOICE_ANALYTICS_CHECKPOINT_INTERVAL segundos e no encerramento. Ao iniciar,
+    as sessões abertas são conciliadas com quem está de fato nos canais de voz.
+    """
+
+    def __init__(self, path=VOICE_ANALYTICS_PATH, interval=VOICE_ANALYTICS_CHECKPOINT_INTERVAL,
+                 retention_days=VOICE_ANALYTICS_RETENTION_DAYS):
+        self.path = path
+        self.interval = interval
+        self.retention_days = retention_days
+        # guild_id -> GuildVoiceStats
+        self._guilds = {}
+        # Momento do último checkpoint gravado (ou carregado)
+        self.saved_at = None
+        self._dirty = False
+        self._task = None
+
+    def caches(self):
+        # Dados persistidos (limitados por VOICE_ANALYTICS_RETENTION_DAYS), não um cache descartável
+        return {'voice_analytics': self._guilds}
+
+    def _guild(self, guild_id):
+        stats = self._guilds.get(guild_id)
+        if stats is None:
+            stats = self._guilds[guild_id] = GuildVoiceStats()
+        return stats
+
+    def observe(self, member, before, after, at=None):
+        """Atualiza os agregados com uma mudança de canal de voz
+
+        `at` é o momento do evento: um evento mais antigo que a sessão aberta
+        (entregue fora de ordem) não a encerra nem a substitui.
+        """
+        at = at or time.time()
+        stats = self._guild(member.guild.id)
+        # Uma entrada com sessão aberta: a saída ainda não chegou (ou se perdeu)
+        if before is not None or member.id in stats.sessions:
+            self._close(stats, member.id, at)
+        if after is not None:
+            session = stats.sessions.get(member.id)
+            if session is None or session[1] <= at:
+                stats.sessions[member.id] = (after.id, at)
+        self._dirty = True
+
+    def observe_moderator(self, guild_id, moderator, disconnected):
+        """Conta uma movimentação ou desconexão feita por um moderador"""
+        action = ACTION_DISCONNECT if disconnected else ACTION_MOVE
+        self._guild(guild_id).moderator_actions[moderator.id, action] += 1
+        self._dirty = True
+
+    def _close(self, stats, member_id, at):
+        session = stats.sessions.get(member_id)
+        if session is None:
+            return
+        channel_id, joined_at = session
+        if at <= joined_at:
+            # A sessão começou depois deste evento: ela continua aberta
+            return
+        del stats.sessions[member_id]
+        stats.member_seconds[member_id] += at - joined_at
+        stats.channel_seconds[channel_id] += at - joined_at
+
+        # Dividir a sessão pelos dias (UTC) que ela atravessa
+        days = stats.member_days.get(member_id)
+        if days is None:
+            days = stats.member_days[member_id] = {}
+        start = joined_at
+        while start < at:
+            day = int(start // DAY)
+            end = min(at, (day + 1) * DAY)
+            days[day] = days.get(day, 0.0) + end - start
+            start = end
+
+    def reconcile(self, guilds, now=None):
+        """Concilia as sessões abertas do checkpoint com quem está nos canais de voz agora"""
+        now = now or time.time()
+        for guild in guilds:
+            present = {}
+            for channel in guild.voice_channels:
+                for member_id in channel.voice_states:
+                    present[member_id] = channel.id
+            stats = self._guild(guild.id)
+            for member_id, (channel_id, joined_at) in list(stats.sessions.items()):
+                if present.get(member_id) != channel_id:
+                    # Saiu com o bot fora do ar: encerrar no último momento conhecido
+                    self._close(stats, member_id, self.saved_at or joined_at)
+                    stats.sessions.pop(member_id, None)
+            for member_id, channel_id in present.items():
+                if member_id not in stats.sessions:
+                    stats.sessions[member_id] = (channel_id, now)
+        self._dirty = True
+
+    def forget_guild(self, guild_id):
+        self._guilds.pop(guild_id, None)
+        self._dirty = True
+
+    # Consultas
+
+    def _with_open_sessions(self, stats, totals, key_index, now):
+        """Soma aos totais o tempo corrente das sessões abertas"""
+        combined = Counter(totals)
+        for member_id, session in stats.sessions.items():
+            key = member_id if key_index == 0 else session[0]
+            combined[key] += max(0.0, now - session[1])
+        return combined
+
+    def top_members(self, guild_id, count=10, now=None):
+        """[(member_id, segundos)] dos membros com mais tempo em voz"""
+        stats = self._guilds.get(guild_id)
+        if stats is None:
+            return []
+        totals = self._with_open_sessions(stats, stats.member_seconds, 0, now or time.time())
+        return heapq.nlargest(count, totals.items(), key=lambda item: item[1])
+
+    def top_channels(self, guild_id, count=10, now=None):
+        """[(channel_id, segundos)] dos canais mais usados"""
+        stats = self._guilds.get(guild_id)
+        if stats is None:
+            return []
+        totals = self._with_open_sessions(stats, stats.channel_seconds, 1, now or time.time())
+        return heapq.nlargest(count, totals.items(), key=lambda item: item[1])
+
+    def top_moderators(self, guild_id, count=10):
+        """[(moderator_id, movimentações, desconexões)] dos moderadores mais ativos"""
+        stats = self._guilds.get(guild_id)
+        if stats is None:
+            return []
+        per_moderator = {}
+        for (moderator_id, action), total in stats.moderator_actions.items():
+            moves, disconnects = per_moderator.get(moderator_id, (0, 0))
+            if action == ACTION_MOVE:
+                moves += total
+            else:
+                disconnects += total
+            per_moderator[moderator_id] = (moves, disconnects)
+        ranked = heapq.nlargest(count, per_moderator.items(), key=lambda item: sum(item[1]))
+        return [(moderator_id, moves, disconnects) for moderator_id, (moves, disconnects) in ranked]
+
+    def member_time(self, guild_id, member_id, days=7, now=None):
+        """Segundos em voz do membro em cada um dos últimos `days` dias (UTC), do mais antigo ao atual"""
+        now = now or time.time()
+        today = int(now // DAY)
+        first = today - days + 1
+        per_day = dict.fromkeys(range(first, today + 1), 0.0)
+        stats = self._guilds.get(guild_id)
+        if stats is None:
+            return list(per_day.items())
+        for day, seconds in stats.member_days.get(member_id, {}).items():
+            if day in per_day:
+                per_day[day] += seconds
+        session = stats.sessions.get(member_id)
+        if session is not None:
+            start = max(session[1], first * DAY)
+            while start < now:
+                day = int(start // DAY)
+                end = min(now, (day + 1) * DAY)
+                per_day[day] += end - start
+                start = end
+        return list(per_day.items())
+
+    # Checkpoint em disco
+
+    def _prune(self, now):
+        oldest = int(now // DAY) - self.retention_days
+        for stats in self._guilds.values():
+            for member_id in list(stats.member_days):
+                days = stats.member_days[member_id]
+                for day in [day for day in days if day < oldest]:
+                    del days[day]
+                if not days:
+                    del stats.member_days[member_id]
+
+    def _snapshot(self):
+        return {
+            'saved_at': time.time(),
+            'guilds': {str(guild_id): stats.to_dict() for guild_id, stats in self._guilds.items()},
+        }
+
+    def _write(self, snapshot):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+
+    def _read(self):
+        with open(self.path, encoding='utf-8') as f:
+            return json.load(f)
+
+    async def load(self):
+        loop = asyncio.get_running_loop()
+        try:
+            data = await loop.run_in_executor(None, self._read)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning("Checkpoint de estatísticas de voz ilegível em %s: %s", self.path, e)
+            return
+        self.saved_at = data.get('saved_at')
+        self._guilds = {int(guild_id): GuildVoiceStats.from_dict(stats) for guild_id, stats in data.get('guilds', {}).items()}
+        logger.info("Estatísticas de voz carregadas de %s (%s servidor(es))", self.path, len(self._guilds))
+
+    async def save(self):
+        """Grava o checkpoint (a cópia é feita no event loop, a escrita em outra thread)"""
+        self._prune(time.time())
+        snapshot = self._snapshot()
+        self._dirty = False
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self._write, snapshot)
+            self.saved_at = snapshot['saved_at']
+        except OSError as e:
+            self._dirty = True
+            logger.error("Erro ao gravar estatísticas de voz: %s", e)
+
+    async def start(self):
+        await self.load()
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.ensure_future(self._checkpoint_loop())
+
+    async def _checkpoint_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if self._dirty:
+                await self.save()
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+            await self.save()
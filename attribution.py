@@ -0,0 +1,334 @@
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+
+import discord
+
+from caches import LRUCache
+from config import (
+    ATTRIBUTION_WAIT,
+    ATTRIBUTION_WINDOW,
+    ATTRIBUTION_CLOCK_SKEW,
+    ATTRIBUTION_AGGREGATION_WINDOW,
+    ATTRIBUTION_POLL_INTERVAL,
+)
+
+logger = logging.getLogger(__name__)
+
+# Ações do audit log que indicam que um moderador mexeu na voz de alguém
+TRACKED_ACTIONS = (
+    discord.AuditLogAction.member_move,
+    discord.AuditLogAction.member_disconnect,
+)
+
+# Limite de entradas guardadas por servidor
+MAX_RECORDS_PER_GUILD = 200
+
+# Quantidade de entradas buscadas no fallback via REST
+POLL_LIMIT = 25
+
+# Moderadores obtidos via REST guardados aqui: o discord.py não mantém os usuários de fetch_user
+MODERATOR_CACHE_SIZE = 1000
+
+
+class ModerationRecord:
+    """Entrada recente de movimentação/desconexão vinda do audit log"""
+
+    __slots__ = ('entry_id', 'action', 'moderator_id', 'moderator', 'channel_id', 'count', 'consumed', 'seen_at',
+                 'created_at')
+
+    def __init__(self, entry_id, action, moderator_id, moderator, channel_id, count, consumed, seen_at):
+        self.entry_id = entry_id
+        self.action = action
+        self.moderator_id = moderator_id
+        self.moderator = moderator
+        self.channel_id = channel_id
+        self.count = count
+        # Quantos eventos de voz já foram atribuídos a esta entrada
+        self.consumed = consumed
+        # Momento da criação da entrada ou do último incremento de count
+        self.seen_at = seen_at
+        # Momento da criação da entrada (a primeira ação agregada nela)
+        self.created_at = seen_at
+
+
+class ModeratorIndex:
+    """Índice em memória das ações recentes de moderadores em canais de voz
+
+    É alimentado pelo evento on_audit_log_entry_create. Quando nenhuma entrada
+    aparece dentro da janela de espera, faz uma busca REST agrupada por servidor
+    (no máximo uma a cada ATTRIBUTION_POLL_INTERVAL segundos).
+    """
+
+    def __init__(self, bot, wait=ATTRIBUTION_WAIT, window=ATTRIBUTION_WINDOW,
+                 aggregation_window=ATTRIBUTION_AGGREGATION_WINDOW, poll_interval=ATTRIBUTION_POLL_INTERVAL,
+                 clock_skew=ATTRIBUTION_CLOCK_SKEW):
+        self.bot = bot
+        self.wait = wait
+        self.window = window
+        self.clock_skew = clock_skew
+        self.aggregation_window = aggregation_window
+        self.poll_interval = poll_interval
+        # guild_id -> deque[ModerationRecord] em ordem de chegada
+        self._records = {}
+        # guild_id -> asyncio.Event acordado a cada nova entrada
+        self._events = {}
+        # guild_id -> eventos de voz esperando uma entrada, como (ação, canal, momento); o Event
+        # não pode sair do índice enquanto houver algum
+        self._waiting = {}
+        # Servidores que já entregaram entradas pelo gateway
+        self._gateway_guilds = set()
+        # Servidores cuja primeira busca REST já serviu de linha de base
+        self._baselined = set()
+        # guild_id -> task da busca REST em andamento (agrupa chamadas concorrentes)
+        self._polls = {}
+        self._last_poll = {}
+        # user_id -> User buscado via REST (None = conta que não existe mais)
+        self._users = LRUCache(MODERATOR_CACHE_SIZE)
+        # user_id -> task do fetch_user em andamento (agrupa chamadas concorrentes)
+        self._user_fetches = {}
+        self.stats = Counter()
+
+    def ingest(self, entry, from_gateway=True):
+        """Registra uma entrada do audit log no índice"""
+        if entry.action not in TRACKED_ACTIONS:
+            return
+
+        guild_id = entry.guild.id
+        if from_gateway:
+            self._gateway_guilds.add(guild_id)
+            self.stats['gateway_entries'] += 1
+
+        count = getattr(entry.extra, 'count', None) or 1
+        channel = getattr(entry.extra, 'channel', None)
+        now = time.time()
+
+        records = self._records.get(guild_id)
+        if records is None:
+            records = self._records[guild_id] = deque(maxlen=MAX_RECORDS_PER_GUILD)
+
+        for record in records:
+            if record.entry_id == entry.id:
+                # O Discord agrega ações repetidas na mesma entrada incrementando count
+                if count > record.count:
+                    record.count = count
+                    record.seen_at = now
+                    self._wake(guild_id)
+                return
+
+        created_at = entry.created_at.timestamp()
+        consumed = 0
+        if not from_gateway and guild_id not in self._baselined and created_at < now - self.window:
+            # Na primeira busca, entradas antigas já foram atribuídas (ou perdidas)
+            consumed = count
+
+        records.append(ModerationRecord(
+            entry_id=entry.id,
+            action=entry.action,
+            moderator_id=entry.user_id,
+            moderator=entry.user,
+            channel_id=channel.id if channel else None,
+            count=count,
+            consumed=consumed,
+            seen_at=created_at,
+        ))
+        self._prune(records, now)
+        self._wake(guild_id)
+
+    def _prune(self, records, now):
+        """Descarta entradas que já não podem ser agregadas nem atribuídas"""
+        oldest = now - max(self.aggregation_window, self.window)
+        while records and records[0].seen_at < oldest:
+            records.popleft()
+
+    def _wake(self, guild_id):
+        event = self._events.pop(guild_id, None)
+        if event is not None:
+            event.set()
+
+    def _compatible(self, record, action, channel_id, at):
+        """Indica se a entrada pode ser a causa do evento de voz"""
+        if record.action is not action:
+            return False
+        if action is discord.AuditLogAction.member_move and record.channel_id != channel_id:
+            return False
+        # Entradas criadas depois do evento são de outra ação (ex.: um moderador movendo alguém
+        # para o mesmo canal logo depois de uma troca feita pelo próprio membro)
+        return at - self.window <= record.seen_at and record.created_at <= at + self.clock_skew
+
+    def _match(self, guild_id, action, channel_id, at, waiter=None):
+        """Consome a entrada mais antiga compatível com o evento de voz
+
+        Uma entrada que também serve a outro evento em espera mais próximo dela
+        no tempo fica para ele.
+        """
+        records = self._records.get(guild_id)
+        if not records:
+            return None
+
+        others = [other for other in self._waiting.get(guild_id, ()) if other is not waiter]
+        for record in records:
+            if record.consumed >= record.count or not self._compatible(record, action, channel_id, at):
+                continue
+            distance = abs(record.seen_at - at)
+            if any(abs(record.seen_at - other[2]) < distance and self._compatible(record, *other)
+                   for other in others):
+                continue
+            record.consumed += 1
+            return record
+        return None
+
+    async def _wait_for_match(self, guild_id, action, channel_id, at):
+        """Espera até ATTRIBUTION_WAIT segundos por uma entrada compatível"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait
+        waiter = (action, channel_id, at)
+        waiting = self._waiting.setdefault(guild_id, [])
+        waiting.append(waiter)
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return None
+                event = self._events.get(guild_id)
+                if event is None:
+                    event = self._events[guild_id] = asyncio.Event()
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    return None
+                record = self._match(guild_id, action, channel_id, at, waiter)
+                if record is not None:
+                    return record
+        finally:
+            waiting.remove(waiter)
+            if waiting:
+                # Entradas deixadas para este evento voltam a valer para os demais
+                self._wake(guild_id)
+            elif self._waiting.get(guild_id) is waiting:
+                del self._waiting[guild_id]
+
+    def _should_poll(self, guild, action, channel_id, at):
+        """Decide se vale a pena consultar a API como fallback"""
+        if not guild.me or not guild.me.guild_permissions.view_audit_log:
+            return False
+        if guild.id not in self._gateway_guilds:
+            # O gateway não está entregando entradas para este servidor
+            return True
+        # Ações agregadas só incrementam count, sem novo evento no gateway
+        recent = at - self.aggregation_window
+        for record in self._records.get(guild.id, ()):
+            if record.action is action and record.seen_at >= recent and (
+                    action is not discord.AuditLogAction.member_move or record.channel_id == channel_id):
+                return True
+        return False
+
+    async def _poll(self, guild):
+        """Busca entradas recentes via REST, agrupando chamadas concorrentes"""
+        task = self._polls.get(guild.id)
+        if task is None or task.done():
+            now = time.time()
+            if now - self._last_poll.get(guild.id, 0) < self.poll_interval:
+                return
+            self._last_poll[guild.id] = now
+            task = self._polls[guild.id] = asyncio.ensure_future(self._fetch_recent(guild))
+        await asyncio.shield(task)
+
+    async def _fetch_recent(self, guild):
+        self.stats['rest_polls'] += 1
+        try:
+            async for entry in guild.audit_logs(limit=POLL_LIMIT):
+                self.ingest(entry, from_gateway=False)
+            self._baselined.add(guild.id)
+        except Exception as e:
+            logger.warning("Não foi possível consultar o audit log de %s: %s", guild.name, e)
+
+    async def _resolve_moderator(self, guild, record):
+        """Obtém o usuário do moderador, priorizando os caches do discord.py"""
+        if record.moderator is None and record.moderator_id:
+            record.moderator = guild.get_member(record.moderator_id) or self.bot.get_user(record.moderator_id)
+            if record.moderator is None:
+                record.moderator = await self._fetch_user(record.moderator_id)
+        return record.moderator
+
+    async def _fetch_user(self, user_id):
+        """Busca o usuário via REST no máximo uma vez enquanto ele estiver no cache"""
+        if user_id in self._users:
+            return self._users[user_id]
+        task = self._user_fetches.get(user_id)
+        if task is None:
+            self.stats['user_fetches'] += 1
+            task = self._user_fetches[user_id] = asyncio.ensure_future(self.bot.fetch_user(user_id))
+            task.add_done_callback(lambda _: self._user_fetches.pop(user_id, None))
+        try:
+            user = await asyncio.shield(task)
+        except discord.NotFound:
+            self._users[user_id] = None
+            return None
+        except discord.HTTPException as e:
+            logger.warning("Não foi possível obter o moderador %s: %s", user_id, e)
+            return None
+        self._users[user_id] = user
+        return user
+
+    async def resolve(self, guild, action, channel_id=None, at=None):
+        """Retorna o moderador responsável por um evento de voz, ou None
+
+        Para member_move, channel_id é o canal de destino; member_disconnect
+        não tem canal no audit log.
+        """
+        at = at or time.time()
+        record = self._match(guild.id, action, channel_id, at)
+        if record is None:
+            record = await self._wait_for_match(guild.id, action, channel_id, at)
+        if record is None and self._should_poll(guild, action, channel_id, at):
+            await self._poll(guild)
+            record = self._match(guild.id, action, channel_id, at)
+
+        if record is None:
+            self.stats['misses'] += 1
+            return None
+
+        self.stats['hits'] += 1
+        return await self._resolve_moderator(guild, record)
+
+    def forget_guild(self, guild_id):
+        """Remove todo o estado de um servidor"""
+        self._records.pop(guild_id, None)
+        self._events.pop(guild_id, None)
+        self._gateway_guilds.discard(guild_id)
+        self._baselined.discard(guild_id)
+        self._polls.pop(guild_id, None)
+        self._last_poll.pop(guild_id, None)
+
+    def sweep(self, now=None):
+        """Descarta servidores sem entradas atribuíveis e buscas REST antigas; retorna quantos itens saíram"""
+        now = now or time.time()
+        removed = 0
+        for guild_id in list(self._records):
+            records = self._records[guild_id]
+            self._prune(records, now)
+            if not records:
+                # As entradas guardam o Member do moderador: sem isso ele ficaria preso na memória
+                del self._records[guild_id]
+                removed += 1
+        for guild_id in [guild_id for guild_id in self._events if guild_id not in self._waiting]:
+            del self._events[guild_id]
+            removed += 1
+        for guild_id in [guild_id for guild_id, task in self._polls.items() if task.done()]:
+            del self._polls[guild_id]
+        for guild_id in [guild_id for guild_id, polled_at in self._last_poll.items()
+                         if now - polled_at >= self.poll_interval]:
+            del self._last_poll[guild_id]
+            removed += 1
+        return removed
+
+    def caches(self):
+        return {
+            'attribution.records': self._records,
+            'attribution.events': self._events,
+            'attribution.last_poll': self._last_poll,
+            'attribution.users': self._users,
+            'attribution.gateway_guilds': self._gateway_guilds,
+        }
@@ -0,0 +1 @@
+"""Benchmarks offline do bot (sem conexão com o Discord)"""
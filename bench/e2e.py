@@ -0,0 +1,359 @@
+"""Teste de carga de ponta a ponta do bot.py contra um Discord falso local
+
+Sobe o bench.fakediscord (gateway + REST) e o bot.py real em outro
+processo, apontado para ele com DISCORD_API_BASE e DISCORD_GATEWAY_URL. Reproduz um fluxo de
+eventos de voz, ban e unban (gerado ou gravado com bench.handlers --record)
+na taxa escolhida e confere, pelas mensagens recebidas na API falsa, se
+cada embed esperado foi entregue. Mede vazão e atraso de entrega (do envio
+do evento pelo gateway até a chegada da mensagem) do bot inteiro.
+
+Uso:
+    python -m bench.e2e --events 2000 --rate 500
+    python -m bench.e2e --latency 50 --ratelimit-ratio 0.05    # REST lenta e 429 aleatórios
+    python -m bench.e2e --bucket-limit 5 --bucket-window 5     # bucket por canal como o do Discord
+    python -m bench.e2e --replay eventos.jsonl --json resultado.json
+    python -m bench.e2e --env DELIVERY_PROCESSES=2             # variáveis extras para o bot
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import re
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, deque
+
+import aiohttp
+
+from bench.fakediscord import FakeDiscord, FakeWorld
+from bench.handlers import REPO_ROOT, load_events, percentile, save_events
+from events import VOICE_TITLE, AUDIT_TITLES, BURST_TITLES
+
+logger = logging.getLogger(__name__)
+
+# Tempo máximo (segundos) para o bot conectar e responder 200 no /readyz
+STARTUP_TIMEOUT = 60.0
+
+# Tempo máximo (segundos) para o bot encerrar depois do SIGTERM
+STOP_TIMEOUT = 30.0
+
+USER_ID = re.compile(r'ID do usuário: (\d+)')
+TARGET_ID = re.compile(r'\((\d+)\)')
+AUDIT_KINDS = {title: kind for kind, title in AUDIT_TITLES.items()}
+BURST_KINDS = {title: kind for kind, title in BURST_TITLES.items()}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def process_peak_rss_kb(pid):
+    """Pico de memória residente (VmHWM) de um processo, em KB; None fora do Linux"""
+    try:
+        with open(f'/proc/{pid}/status', encoding='ascii') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+class DeliveryTracker:
+    """Embeds esperados por evento x embeds recebidos na API falsa
+
+    Cada embed esperado tem uma chave (servidor, tipo, usuário) e o horário
+    em que o evento saiu pelo gateway; os recebidos são casados em ordem
+    (FIFO por chave). Nos resumos de bans em massa, cada linha do CSV
+    anexo entrega os bans pendentes daquele usuário.
+    """
+
+    def __init__(self, world):
+        self.world = world
+        # chave -> horários (monotônicos) dos envios ainda sem embed
+        self._pending = {}
+        self.expected = 0
+        self.delivered = 0
+        self.unexpected = 0
+        self.lags = []
+        self.first_at = None
+        self.last_at = None
+        self.kinds = Counter()
+
+    @property
+    def pending(self):
+        return self.expected - self.delivered
+
+    def expect(self, event, sent_at):
+        guild = self.world.guilds[event['guild']]
+        user_id = int(guild.members[event['member']]['id'])
+        if event['type'] == 'voice':
+            key = (guild.id, 'voice', user_id)
+            # Troca de canal: um embed de saída e outro de entrada
+            count = 2 if event['before'] is not None and event['after'] is not None else 1
+        else:
+            key, count = (guild.id, event['type'], user_id), 1
+        queue = self._pending.get(key)
+        if queue is None:
+            queue = self._pending[key] = deque()
+        queue.extend([sent_at] * count)
+        self.expected += count
+
+    def _deliver(self, key, now, every=False):
+        queue = self._pending.get(key)
+        if not queue:
+            self.unexpected += 1
+            self.kinds['unexpected'] += 1
+            return
+        for _ in range(len(queue) if every else 1):
+            self.lags.append(now - queue.popleft())
+            self.delivered += 1
+            self.kinds[key[1]] += 1
+        if not queue:
+            del self._pending[key]
+        if self.first_at is None:
+            self.first_at = now
+        self.last_at = now
+
+    def on_message(self, channel_id, payload, files):
+        now = time.monotonic()
+        guild = self.world.channel_guilds.get(channel_id)
+        guild_id = guild.id if guild is not None else None
+        for embed in payload.get('embeds') or ():
+            title = embed.get('title')
+            if title == VOICE_TITLE:
+                match = USER_ID.search((embed.get('footer') or {}).get('text', ''))
+                if match:
+                    self._deliver((guild_id, 'voice', int(match.group(1))), now)
+                    continue
+            elif title in AUDIT_KINDS:
+                target = next((field['value'] for field in embed.get('fields') or () if field['name'] == "🎯 Alvo"), '')
+                match = TARGET_ID.search(target)
+                if match:
+                    self._deliver((guild_id, AUDIT_KINDS[title], int(match.group(1))), now)
+                    continue
+            elif title in BURST_KINDS:
+                # Os usuários do resumo são contados pelo CSV anexo
+                continue
+            self.unexpected += 1
+            self.kinds['unexpected'] += 1
+        for filename, content in files:
+            kind = filename.split('s-', 1)[0]
+            if kind not in BURST_TITLES:
+                continue
+            for row in csv.DictReader(io.StringIO(content.decode('utf-8'))):
+                # Bans repetidos do mesmo usuário viram uma linha só no resumo
+                self._deliver((guild_id, kind, int(row['user_id'])), now, every=True)
+
+    def missing(self, limit=5):
+        """Algumas chaves ainda sem embed (para depuração)"""
+        return [f"{kind} servidor={guild_id} usuário={user_id} x{len(queue)}"
+                for (guild_id, kind, user_id), queue in list(self._pending.items())[:limit]]
+
+
+def bot_environment(args, server, health_port, workdir):
+    from config import AUDIT_CHANNEL_NAME
+
+    env = dict(os.environ)
+    env.update({
+        'DISCORD_TOKEN': 'fake',
+        'DISCORD_API_BASE': server.api_base,
+        'DISCORD_GATEWAY_URL': server.gateway_url,
+        'AUDIT_CHANNEL_NAME': AUDIT_CHANNEL_NAME,
+        'AUDIT_CHANNEL_IDS': '',
+        'DELIVERY_MODE': 'bot',
+        # Um embed por evento, sem agrupar movimentações nem bans em massa (mude com --env)
+        'VOICE_DEBOUNCE_WINDOW': '0',
+        'BAN_BURST_THRESHOLD': '0',
+        'DELIVERY_QUEUE_SIZE': str(max(10000, args.events * 4)),
+        'GUILD_READY_TIMEOUT': '0.5',
+        'SYNC_APP_COMMANDS': 'false',
+        'BACKFILL_ENABLED': 'false',
+        'HEALTH_SERVER_ENABLED': 'true',
+        'HEALTH_HOST': '127.0.0.1',
+        'HEALTH_PORT': str(health_port),
+        'LOG_FILE': os.path.join(workdir, 'bot.log'),
+        'LOG_LEVEL': args.log_level,
+        'PYTHONUNBUFFERED': '1',
+    })
+    for item in args.env:
+        key, _, value = item.partition('=')
+        env[key] = value
+    return env
+
+
+async def wait_ready(process, health_port, timeout=STARTUP_TIMEOUT):
+    """Espera o /readyz do bot responder 200; falha se o processo sair antes"""
+    url = f"http://127.0.0.1:{health_port}/readyz"
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"bot.py saiu com código {process.returncode} antes de ficar pronto")
+            try:
+                async with session.get(url) as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"bot.py não ficou pronto em {timeout:.0f}s")
+
+
+async def stop_bot(process):
+    """SIGTERM (o bot entrega o que estiver na fila) e, se demorar, SIGKILL"""
+    if process.poll() is not None:
+        return
+    process.send_signal(signal.SIGTERM)
+    loop = asyncio.get_running_loop()
+    try:
+        await asyncio.wait_for(loop.run_in_executor(None, process.wait), timeout=STOP_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("bot.py não encerrou em %.0fs, finalizando", STOP_TIMEOUT)
+        process.kill()
+        await loop.run_in_executor(None, process.wait)
+
+
+async def run(args, workdir):
+    from bench.fakes import generate_events
+    from config import AUDIT_CHANNEL_NAME
+
+    world = FakeWorld(args.guilds, AUDIT_CHANNEL_NAME, members=args.members)
+    if args.replay:
+        events = load_events(args.replay)
+    else:
+        events = generate_events(world.guilds, args.events, seed=args.seed)
+    if args.record:
+        save_events(args.record, events)
+
+    tracker = DeliveryTracker(world)
+    server = FakeDiscord(
+        world, latency=args.latency / 1000, ratelimit_ratio=args.ratelimit_ratio, retry_after=args.retry_after,
+        bucket_limit=args.bucket_limit, bucket_window=args.bucket_window, seed=args.seed,
+        on_message=tracker.on_message,
+    )
+    await server.start()
+    health_port = free_port()
+    output = open(os.path.join(workdir, 'bot.out'), 'wb')
+    started = time.monotonic()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(REPO_ROOT, 'bot.py')],
+        cwd=workdir, env=bot_environment(args, server, health_port, workdir),
+        stdout=output, stderr=subprocess.STDOUT,
+    )
+    try:
+        await wait_ready(process, health_port)
+        startup = time.monotonic() - started
+        # Mensagens enviadas durante a inicialização não entram na conta
+        server.stats.clear()
+        server.routes.clear()
+
+        interval = 1.0 / args.rate if args.rate else 0
+        start = time.monotonic()
+        for index, event in enumerate(events):
+            if interval:
+                delay = start + index * interval - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            elif index % 100 == 0:
+                await asyncio.sleep(0)
+            await server.play(event)
+            tracker.expect(event, time.monotonic())
+        sent = time.monotonic() - start
+
+        # Esperar as entregas até não faltar nada ou parar de haver progresso
+        last_progress, last_delivered = time.monotonic(), tracker.delivered
+        while tracker.pending > 0 and process.poll() is None:
+            await asyncio.sleep(0.1)
+            if tracker.delivered != last_delivered:
+                last_progress, last_delivered = time.monotonic(), tracker.delivered
+            elif time.monotonic() - last_progress > args.drain_timeout:
+                break
+        rss = process_peak_rss_kb(process.pid)
+    finally:
+        await stop_bot(process)
+        output.close()
+        await server.close()
+
+    elapsed = (tracker.last_at - start) if tracker.last_at is not None else None
+    return {
+        'events': len(events),
+        'send_seconds': round(sent, 3),
+        'startup_seconds': round(startup, 3),
+        'embeds_expected': tracker.expected,
+        'embeds_delivered': tracker.delivered,
+        'embeds_missing': tracker.pending,
+        'embeds_unexpected': tracker.unexpected,
+        'delivered_seconds': round(elapsed, 3) if elapsed else None,
+        'events_per_second': round(len(events) / elapsed, 1) if elapsed else None,
+        'embeds_per_second': round(tracker.delivered / elapsed, 1) if elapsed else None,
+        'lag_p50_ms': round(percentile(tracker.lags, 50) * 1000, 1),
+        'lag_p95_ms': round(percentile(tracker.lags, 95) * 1000, 1),
+        'lag_p99_ms': round(percentile(tracker.lags, 99) * 1000, 1),
+        'lag_max_ms': round(max(tracker.lags, default=0) * 1000, 1),
+        'delivered_by_kind': dict(tracker.kinds),
+        'messages_received': server.stats['messages'],
+        'ratelimited_429': server.stats['429'],
+        'unknown_routes': server.stats['unknown_routes'],
+        'rest_calls_by_route': dict(server.routes),
+        'bot_max_rss_kb': rss,
+        'bot_exit_code': process.returncode,
+        'missing_sample': tracker.missing(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga de ponta a ponta do bot contra um Discord falso")
+    parser.add_argument('--guilds', type=int, default=5)
+    parser.add_argument('--members', type=int, default=200)
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--rate', type=float, default=500, help="eventos por segundo (0 = o mais rápido possível)")
+    parser.add_argument('--latency', type=float, default=0, help="latência simulada por chamada REST (ms)")
+    parser.add_argument('--ratelimit-ratio', type=float, default=0, help="fração de envios respondidos com 429")
+    parser.add_argument('--retry-after', type=float, default=0.5, help="retry_after dos 429 aleatórios (segundos)")
+    parser.add_argument('--bucket-limit', type=int, default=0, help="mensagens por canal por janela (0 = sem limite)")
+    parser.add_argument('--bucket-window', type=float, default=5.0, help="janela do bucket por canal (segundos)")
+    parser.add_argument('--drain-timeout', type=float, default=30.0,
+                        help="desiste de esperar as entregas após tantos segundos sem progresso")
+    parser.add_argument('--env', action='append', default=[], metavar='CHAVE=VALOR',
+                        help="variável de ambiente extra para o bot (pode repetir)")
+    parser.add_argument('--replay', help="arquivo JSONL com eventos gravados (formato do bench.handlers)")
+    parser.add_argument('--record', help="grava o fluxo de eventos usado em JSONL")
+    parser.add_argument('--json', help="grava o resultado em JSON")
+    parser.add_argument('--keep', action='store_true', help="mantém o diretório de trabalho (logs do bot)")
+    parser.add_argument('--log-level', default='WARNING', help="LOG_LEVEL do bot")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    # bot.log, journal e checkpoints do bot ficam em um diretório temporário
+    workdir = tempfile.mkdtemp(prefix='botrevenge-e2e-')
+    try:
+        result = asyncio.run(run(args, workdir))
+    finally:
+        if args.keep:
+            print(f"Diretório de trabalho: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    for key, value in result.items():
+        print(f"{key:>24}: {value}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+    if result['embeds_missing']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
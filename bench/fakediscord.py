@@ -0,0 +1,564 @@
+"""Gateway e API REST falsos do Discord para testes de carga de ponta a ponta
+
+Um único servidor aiohttp local faz o papel do Discord para o bot.py real
+(apontado para ele com DISCORD_API_BASE e DISCORD_GATEWAY_URL):
+    /api/v10/...   rotas REST usadas pelo bot (login, gateway, envio de
+                   mensagens, webhooks, fetch_ban, audit log, bans e comandos)
+    /gateway       websocket com HELLO, IDENTIFY, READY, GUILD_CREATE,
+                   heartbeats e os eventos injetados pelo teste
+
+Latência por requisição, buckets de rate limit por canal (com os
+cabeçalhos X-RateLimit-*) e respostas 429 aleatórias podem ser simulados.
+Cada mensagem recebida é repassada a on_message para conferência.
+
+Uso avulso (para rodar o bot manualmente contra o servidor falso):
+    python -m bench.fakediscord --port 8900 --guilds 3
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import random
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+
+import discord
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+API_PREFIX = '/api/v10'
+
+# Intervalo de heartbeat anunciado no HELLO (ms)
+HEARTBEAT_INTERVAL = 41250
+
+# Entradas de audit log guardadas por servidor (servidas em GET /audit-logs)
+AUDIT_HISTORY = 1000
+
+OP_DISPATCH = 0
+OP_HEARTBEAT = 1
+OP_IDENTIFY = 2
+OP_RESUME = 6
+OP_INVALID_SESSION = 9
+OP_HELLO = 10
+OP_HEARTBEAT_ACK = 11
+
+# Tipos de canal e ações do audit log (valores da API)
+CHANNEL_TEXT = 0
+CHANNEL_VOICE = 2
+AUDIT_ACTIONS = {
+    'ban': discord.AuditLogAction.ban.value,
+    'unban': discord.AuditLogAction.unban.value,
+    'member_move': discord.AuditLogAction.member_move.value,
+    'member_disconnect': discord.AuditLogAction.member_disconnect.value,
+}
+
+
+def _now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _user(user_id, name, bot=False):
+    return {'id': str(user_id), 'username': name, 'discriminator': '0', 'global_name': None,
+            'avatar': None, 'bot': bot}
+
+
+class FakeGuildData:
+    """Servidor do mundo falso (IDs e nomes); serve como guild para generate_events"""
+
+    def __init__(self, index, ids, audit_channel_name, bot_user, members, voice_channels, text_channels):
+        self.id = next(ids)
+        self.name = f"servidor-{index}"
+        self.bot_user = bot_user
+        self.audit_channel = (next(ids), audit_channel_name)
+        self.text_channels = [self.audit_channel] + [(next(ids), f"texto-{i}") for i in range(text_channels - 1)]
+        self.voice_channels = [(next(ids), f"voz-{i}") for i in range(voice_channels)]
+        self.members = [_user(next(ids), f"membro-{i}") for i in range(members)]
+        # Mesma proporção de moderadores do bench.fakes (generate_events usa só o tamanho)
+        self.moderators = self.members[:max(1, members // 20)]
+        self.audit_log = deque(maxlen=AUDIT_HISTORY)
+        self.bans = {}
+
+    def payload(self):
+        """GUILD_CREATE completo (o bot só é membro com o cargo @everyone de administrador)"""
+        channels = [
+            {'id': str(channel_id), 'type': CHANNEL_TEXT, 'name': name, 'position': position,
+             'permission_overwrites': [], 'parent_id': None, 'nsfw': False, 'topic': None,
+             'rate_limit_per_user': 0, 'last_message_id': None}
+            for position, (channel_id, name) in enumerate(self.text_channels)
+        ] + [
+            {'id': str(channel_id), 'type': CHANNEL_VOICE, 'name': name, 'position': position,
+             'permission_overwrites': [], 'parent_id': None, 'bitrate': 64000, 'user_limit': 0,
+             'rtc_region': None}
+            for position, (channel_id, name) in enumerate(self.voice_channels)
+        ]
+        return {
+            'id': str(self.id), 'name': self.name, 'icon': None, 'owner_id': self.members[0]['id'],
+            'afk_channel_id': None, 'afk_timeout': 300, 'verification_level': 0,
+            'default_message_notifications': 0, 'explicit_content_filter': 0, 'mfa_level': 0,
+            'features': [], 'emojis': [], 'stickers': [], 'system_channel_id': None, 'system_channel_flags': 0,
+            'premium_tier': 0, 'preferred_locale': 'pt-BR', 'nsfw_level': 0, 'large': False,
+            'member_count': len(self.members) + 1, 'unavailable': False, 'joined_at': _now_iso(),
+            'roles': [{'id': str(self.id), 'name': '@everyone', 'permissions': '8', 'position': 0, 'color': 0,
+                       'hoist': False, 'managed': False, 'mentionable': False, 'flags': 0}],
+            'members': [{'user': self.bot_user, 'roles': [], 'joined_at': _now_iso(), 'deaf': False, 'mute': False,
+                         'flags': 0}],
+            'channels': channels, 'threads': [], 'voice_states': [], 'presences': [], 'stage_instances': [],
+            'guild_scheduled_events': [],
+        }
+
+    def member_payload(self, user):
+        return {'user': user, 'roles': [], 'joined_at': _now_iso(), 'deaf': False, 'mute': False, 'flags': 0}
+
+
+class FakeWorld:
+    """Servidores, canais e membros servidos pelo FakeDiscord"""
+
+    def __init__(self, guilds, audit_channel_name, members=200, voice_channels=10, text_channels=5):
+        # Snowflakes reais (com horário) para created_at e sharding coerentes
+        self._ids = itertools.count(discord.utils.time_snowflake(datetime.now(timezone.utc)))
+        self.bot_user = _user(next(self._ids), 'BotRevenge', bot=True)
+        self.application_id = self.bot_user['id']
+        self.guilds = [
+            FakeGuildData(index, self._ids, audit_channel_name, self.bot_user, members, voice_channels, text_channels)
+            for index in range(guilds)
+        ]
+        self.by_id = {guild.id: guild for guild in self.guilds}
+        self.users = {int(user['id']): user for guild in self.guilds for user in guild.members}
+        self.users[int(self.bot_user['id'])] = self.bot_user
+        # channel_id -> servidor (para conferir as mensagens recebidas)
+        self.channel_guilds = {channel_id: guild for guild in self.guilds for channel_id, _ in guild.text_channels}
+
+    def next_id(self):
+        return next(self._ids)
+
+
+class GatewaySession:
+    __slots__ = ('ws', 'shard_id', 'shard_count', 'sequence')
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.shard_id = 0
+        self.shard_count = 1
+        self.sequence = 0
+
+    def owns(self, guild_id):
+        return (guild_id >> 22) % self.shard_count == self.shard_id
+
+
+class FakeDiscord:
+    """Servidor REST + gateway falso, com latência e rate limits simulados"""
+
+    def __init__(self, world, latency=0.0, ratelimit_ratio=0.0, retry_after=0.5,
+                 bucket_limit=0, bucket_window=5.0, seed=1, on_message=None):
+        self.world = world
+        self.latency = latency
+        self.ratelimit_ratio = ratelimit_ratio
+        self.retry_after = retry_after
+        # Limite de mensagens por canal a cada bucket_window segundos (0 = sem limite)
+        self.bucket_limit = bucket_limit
+        self.bucket_window = bucket_window
+        self.on_message = on_message
+        self._rng = random.Random(seed)
+        # bucket -> horários dos envios aceitos na janela do bucket
+        self._buckets = {}
+        # webhook_id -> dados do webhook (DELIVERY_MODE=webhook)
+        self._webhooks = {}
+        self._sessions = []
+        self._message_ids = itertools.count(world.next_id())
+        self._runner = None
+        self.host = None
+        self.port = None
+        # Disparado quando uma sessão termina de receber os GUILD_CREATE
+        self.identified = asyncio.Event()
+        # Requisições por rota, 429 enviados, mensagens e embeds recebidos
+        self.stats = Counter()
+        self.routes = Counter()
+
+    @property
+    def api_base(self):
+        return f"http://{self.host}:{self.port}{API_PREFIX}"
+
+    @property
+    def gateway_url(self):
+        return f"ws://{self.host}:{self.port}/gateway"
+
+    # Servidor
+
+    def app(self):
+        app = web.Application(middlewares=[self._middleware], client_max_size=64 * 1024 * 1024)
+        routes = (
+            ('GET', '/gateway', self.gateway_info),
+            ('GET', '/gateway/bot', self.gateway_bot),
+            ('GET', '/users/@me', self.users_me),
+            ('GET', '/users/{user_id}', self.get_user),
+            ('GET', '/oauth2/applications/@me', self.application_info),
+            ('PUT', '/applications/{application_id}/commands', self.commands),
+            ('POST', '/channels/{channel_id}/messages', self.create_message),
+            ('GET', '/channels/{channel_id}/webhooks', self.channel_webhooks),
+            ('POST', '/channels/{channel_id}/webhooks', self.create_webhook),
+            ('POST', '/webhooks/{webhook_id}/{webhook_token}', self.execute_webhook),
+            ('GET', '/guilds/{guild_id}', self.get_guild),
+            ('GET', '/guilds/{guild_id}/audit-logs', self.audit_logs),
+            ('GET', '/guilds/{guild_id}/bans', self.get_bans),
+            ('GET', '/guilds/{guild_id}/bans/{user_id}', self.get_ban),
+        )
+        for method, path, handler in routes:
+            app.router.add_route(method, API_PREFIX + path, handler)
+        app.router.add_get('/gateway', self.websocket)
+        app.router.add_route('*', API_PREFIX + '/{tail:.*}', self.unknown)
+        return app
+
+    async def start(self, host='127.0.0.1', port=0):
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.host, self.port = self._runner.addresses[0][:2]
+        logger.info("Discord falso em %s (gateway %s)", self.api_base, self.gateway_url)
+
+    async def close(self):
+        for session in list(self._sessions):
+            await session.ws.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        if request.path.startswith(API_PREFIX):
+            route = request.match_info.route.resource.canonical if request.match_info.route.resource else request.path
+            self.routes[f"{request.method} {route[len(API_PREFIX):]}"] += 1
+            if self.latency:
+                await asyncio.sleep(self.latency)
+        return await handler(request)
+
+    @staticmethod
+    def _json(data, status=200, headers=None):
+        # O discord.py só decodifica JSON com Content-Type exatamente application/json
+        return web.Response(body=json.dumps(data).encode('utf-8'), status=status,
+                            headers={'Content-Type': 'application/json', **(headers or {})})
+
+    def _rate_limited(self, retry_after, bucket):
+        self.stats['429'] += 1
+        return self._json(
+            {'message': 'You are being rate limited.', 'retry_after': retry_after, 'global': False, 'code': 0},
+            status=429,
+            headers={
+                # Sem o Via o discord.py trata o 429 como bloqueio da Cloudflare
+                'Via': '1.1 google',
+                'Retry-After': str(max(1, round(retry_after))),
+                'X-RateLimit-Limit': str(self.bucket_limit or 1),
+                'X-RateLimit-Remaining': '0',
+                'X-RateLimit-Reset-After': f"{retry_after:.3f}",
+                'X-RateLimit-Bucket': bucket,
+                'X-RateLimit-Scope': 'user',
+            },
+        )
+
+    # REST
+
+    async def unknown(self, request):
+        self.stats['unknown_routes'] += 1
+        logger.warning("Rota não simulada: %s %s", request.method, request.path)
+        return self._json({'message': '404: Not Found', 'code': 0}, status=404)
+
+    async def gateway_info(self, request):
+        return self._json({'url': self.gateway_url})
+
+    async def gateway_bot(self, request):
+        return self._json({
+            'url': self.gateway_url, 'shards': 1,
+            'session_start_limit': {'total': 1000, 'remaining': 1000, 'reset_after': 0, 'max_concurrency': 1},
+        })
+
+    async def users_me(self, request):
+        return self._json(self.world.bot_user)
+
+    async def get_user(self, request):
+        user = self.world.users.get(int(request.match_info['user_id']))
+        if user is None:
+            return self._json({'message': 'Unknown User', 'code': 10013}, status=404)
+        return self._json(user)
+
+    async def application_info(self, request):
+        return self._json({
+            'id': self.world.application_id, 'name': 'BotRevenge', 'icon': None, 'description': '',
+            'bot_public': True, 'bot_require_code_grant': False, 'verify_key': '0', 'flags': 0,
+            'owner': self.world.bot_user, 'summary': '',
+        })
+
+    async def commands(self, request):
+        return self._json([])
+
+    async def create_message(self, request):
+        channel_id = int(request.match_info['channel_id'])
+        return await self._post_message(request, channel_id, f"messages-{channel_id}")
+
+    async def channel_webhooks(self, request):
+        channel_id = request.match_info['channel_id']
+        return self._json([webhook for webhook in self._webhooks.values() if webhook['channel_id'] == channel_id])
+
+    async def create_webhook(self, request):
+        channel_id = int(request.match_info['channel_id'])
+        guild = self.world.channel_guilds.get(channel_id)
+        if guild is None:
+            return self._json({'message': 'Unknown Channel', 'code': 10003}, status=404)
+        data = await request.json()
+        webhook_id = self.world.next_id()
+        webhook = self._webhooks[webhook_id] = {
+            'id': str(webhook_id), 'type': 1, 'guild_id': str(guild.id), 'channel_id': str(channel_id),
+            'name': data.get('name') or 'webhook', 'avatar': None, 'token': f"token-{webhook_id}",
+            'application_id': None, 'user': self.world.bot_user,
+        }
+        self.stats['webhooks_created'] += 1
+        return self._json(webhook)
+
+    async def execute_webhook(self, request):
+        webhook = self._webhooks.get(int(request.match_info['webhook_id']))
+        if webhook is None or webhook['token'] != request.match_info['webhook_token']:
+            return self._json({'message': 'Unknown Webhook', 'code': 10015}, status=404)
+        self.stats['webhook_messages'] += 1
+        response = await self._post_message(request, int(webhook['channel_id']), f"webhook-{webhook['id']}")
+        if response.status == 200 and request.query.get('wait', 'false') != 'true':
+            return web.Response(status=204)
+        return response
+
+    async def _post_message(self, request, channel_id, bucket):
+        """Mensagem enviada pelo bot ou por um webhook, com os rate limits simulados"""
+        now = time.monotonic()
+        if self.ratelimit_ratio and self._rng.random() < self.ratelimit_ratio:
+            return self._rate_limited(self.retry_after, bucket)
+
+        headers = {}
+        if self.bucket_limit:
+            sent = self._buckets.get(bucket)
+            if sent is None:
+                sent = self._buckets[bucket] = deque()
+            while sent and now - sent[0] >= self.bucket_window:
+                sent.popleft()
+            if len(sent) >= self.bucket_limit:
+                return self._rate_limited(sent[0] + self.bucket_window - now, bucket)
+            sent.append(now)
+            headers = {
+                'X-RateLimit-Limit': str(self.bucket_limit),
+                'X-RateLimit-Remaining': str(self.bucket_limit - len(sent)),
+                'X-RateLimit-Reset-After': f"{sent[0] + self.bucket_window - now:.3f}",
+                'X-RateLimit-Bucket': bucket,
+            }
+
+        files = []
+        if request.content_type == 'multipart/form-data':
+            form = await request.post()
+            payload = json.loads(form.get('payload_json') or '{}')
+            for field in form.values():
+                if isinstance(field, web.FileField):
+                    files.append((field.filename, field.file.read()))
+        else:
+            payload = await request.json()
+
+        self.stats['messages'] += 1
+        self.stats['embeds'] += len(payload.get('embeds') or ())
+        self.stats['files'] += len(files)
+        if self.on_message is not None:
+            self.on_message(channel_id, payload, files)
+        return self._json({
+            'id': str(next(self._message_ids)), 'channel_id': str(channel_id), 'type': 0,
+            'content': payload.get('content') or '', 'author': self.world.bot_user, 'attachments': [],
+            'embeds': payload.get('embeds') or [], 'mentions': [], 'mention_roles': [], 'pinned': False,
+            'mention_everyone': False, 'tts': False, 'timestamp': _now_iso(), 'edited_timestamp': None,
+            'flags': 0, 'components': [],
+        }, headers=headers)
+
+    def _guild(self, request):
+        guild = self.world.by_id.get(int(request.match_info['guild_id']))
+        if guild is None:
+            raise web.HTTPNotFound(body=json.dumps({'message': 'Unknown Guild', 'code': 10004}),
+                                   content_type='application/json')
+        return guild
+
+    async def get_guild(self, request):
+        payload = self._guild(request).payload()
+        for key in ('members', 'channels', 'threads', 'voice_states', 'presences'):
+            payload.pop(key)
+        return self._json(payload)
+
+    async def audit_logs(self, request):
+        guild = self._guild(request)
+        query = request.query
+        limit = int(query.get('limit', 100))
+        action_type = int(query['action_type']) if 'action_type' in query else None
+        before = int(query['before']) if 'before' in query else None
+        after = int(query['after']) if 'after' in query else None
+        entries = []
+        # Da mais nova para a mais antiga, como o Discord (com after, da mais antiga para a mais nova)
+        source = guild.audit_log if after is not None else reversed(guild.audit_log)
+        for entry in source:
+            entry_id = int(entry['id'])
+            if action_type is not None and entry['action_type'] != action_type:
+                continue
+            if before is not None and entry_id >= before:
+                continue
+            if after is not None and entry_id <= after:
+                continue
+            entries.append(entry)
+            if len(entries) >= limit:
+                break
+        users = {entry['user_id']: entry['user_id'] for entry in entries}
+        return self._json({
+            'audit_log_entries': entries,
+            'users': [_user(user_id, f"usuario-{user_id}") for user_id in users],
+            'integrations': [], 'webhooks': [], 'guild_scheduled_events': [], 'threads': [],
+            'application_commands': [], 'auto_moderation_rules': [],
+        })
+
+    async def get_bans(self, request):
+        guild = self._guild(request)
+        limit = int(request.query.get('limit', 1000))
+        after = int(request.query.get('after', 0))
+        # Em ordem de ID de usuário, como o Discord
+        bans = sorted((int(user['id']), user, reason) for user, reason in guild.bans.values())
+        return self._json([{'user': user, 'reason': reason} for user_id, user, reason in bans if user_id > after][:limit])
+
+    async def get_ban(self, request):
+        guild = self._guild(request)
+        ban = guild.bans.get(request.match_info['user_id'])
+        if ban is None:
+            return self._json({'message': 'Unknown Ban', 'code': 10026}, status=404)
+        return self._json({'user': ban[0], 'reason': ban[1]})
+
+    # Gateway
+
+    async def websocket(self, request):
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        session = GatewaySession(ws)
+        await ws.send_str(json.dumps({'op': OP_HELLO, 'd': {'heartbeat_interval': HEARTBEAT_INTERVAL}}))
+        try:
+            async for message in ws:
+                if message.type != web.WSMsgType.TEXT:
+                    continue
+                data = json.loads(message.data)
+                op = data.get('op')
+                if op == OP_HEARTBEAT:
+                    await ws.send_str(json.dumps({'op': OP_HEARTBEAT_ACK}))
+                elif op == OP_IDENTIFY:
+                    await self._identify(session, data['d'])
+                elif op == OP_RESUME:
+                    # Sessões não são guardadas: o bot faz um novo IDENTIFY
+                    await ws.send_str(json.dumps({'op': OP_INVALID_SESSION, 'd': False}))
+        finally:
+            if session in self._sessions:
+                self._sessions.remove(session)
+        return ws
+
+    async def _identify(self, session, data):
+        shard = data.get('shard') or [0, 1]
+        session.shard_id, session.shard_count = int(shard[0]), int(shard[1])
+        guilds = [guild for guild in self.world.guilds if session.owns(guild.id)]
+        await self._send(session, 'READY', {
+            'v': 10, 'user': self.world.bot_user, 'session_id': f"fake-{session.shard_id}-{time.time_ns()}",
+            'resume_gateway_url': self.gateway_url, 'shard': [session.shard_id, session.shard_count],
+            'guilds': [{'id': str(guild.id), 'unavailable': True} for guild in guilds],
+            'application': {'id': self.world.application_id, 'flags': 0},
+            'private_channels': [], 'relationships': [], 'presences': [],
+        })
+        for guild in guilds:
+            await self._send(session, 'GUILD_CREATE', guild.payload())
+        self._sessions.append(session)
+        self.stats['identify'] += 1
+        self.identified.set()
+
+    async def _send(self, session, event, data):
+        session.sequence += 1
+        await session.ws.send_str(json.dumps({'op': OP_DISPATCH, 't': event, 's': session.sequence, 'd': data}))
+
+    async def dispatch(self, guild_id, event, data):
+        """Envia um evento à sessão do shard do servidor"""
+        for session in self._sessions:
+            if session.owns(guild_id):
+                await self._send(session, event, data)
+                self.stats['dispatched'] += 1
+
+    # Tráfego
+
+    async def audit_entry(self, guild, action, moderator, target_id=None, reason=None, options=None):
+        entry = {
+            'id': str(self.world.next_id()), 'guild_id': str(guild.id), 'action_type': AUDIT_ACTIONS[action],
+            'user_id': moderator['id'], 'target_id': str(target_id) if target_id is not None else None,
+            'reason': reason, 'options': options, 'changes': [],
+        }
+        guild.audit_log.append(entry)
+        await self.dispatch(guild.id, 'GUILD_AUDIT_LOG_ENTRY_CREATE', entry)
+
+    async def play(self, event):
+        """Reproduz um evento no formato do bench.handlers (--record/--replay)"""
+        guild = self.world.guilds[event['guild']]
+        user = guild.members[event['member']]
+        if event['type'] in ('ban', 'unban'):
+            moderator = guild.moderators[0]
+            if event['type'] == 'ban':
+                reason = event.get('reason')
+                guild.bans[user['id']] = (user, reason)
+                await self.audit_entry(guild, 'ban', moderator, user['id'], reason)
+                await self.dispatch(guild.id, 'GUILD_BAN_ADD', {'guild_id': str(guild.id), 'user': user})
+            else:
+                guild.bans.pop(user['id'], None)
+                await self.audit_entry(guild, 'unban', moderator, user['id'])
+                await self.dispatch(guild.id, 'GUILD_BAN_REMOVE', {'guild_id': str(guild.id), 'user': user})
+            return
+
+        after = guild.voice_channels[event['after']][0] if event['after'] is not None else None
+        if event.get('moderator') is not None:
+            # Como no bench.handlers, a entrada do audit log chega antes do evento de voz
+            moderator = guild.moderators[event['moderator']]
+            if after is not None:
+                await self.audit_entry(guild, 'member_move', moderator,
+                                       options={'channel_id': str(after), 'count': '1'})
+            else:
+                await self.audit_entry(guild, 'member_disconnect', moderator, options={'count': '1'})
+        await self.dispatch(guild.id, 'VOICE_STATE_UPDATE', {
+            'guild_id': str(guild.id), 'channel_id': str(after) if after is not None else None,
+            'user_id': user['id'], 'member': guild.member_payload(user), 'session_id': 'fake',
+            'deaf': False, 'mute': False, 'self_deaf': False, 'self_mute': False, 'self_video': False,
+            'suppress': False, 'request_to_speak_timestamp': None,
+        })
+
+
+async def serve(args):
+    from config import AUDIT_CHANNEL_NAME
+
+    world = FakeWorld(args.guilds, AUDIT_CHANNEL_NAME, members=args.members)
+    server = FakeDiscord(world, latency=args.latency / 1000, ratelimit_ratio=args.ratelimit_ratio,
+                         bucket_limit=args.bucket_limit, bucket_window=args.bucket_window)
+    await server.start(args.host, args.port)
+    print(f"DISCORD_API_BASE={server.api_base} DISCORD_GATEWAY_URL={server.gateway_url} "
+          "DISCORD_TOKEN=fake python3 bot.py")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gateway e API REST falsos do Discord")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--guilds', type=int, default=3)
+    parser.add_argument('--members', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0, help="latência por requisição REST (ms)")
+    parser.add_argument('--ratelimit-ratio', type=float, default=0, help="fração de envios respondidos com 429")
+    parser.add_argument('--bucket-limit', type=int, default=0, help="mensagens por canal por janela (0 = sem limite)")
+    parser.add_argument('--bucket-window', type=float, default=5.0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""Servidores, membros, canais e entradas de audit log falsos para os benchmarks
+
+Todas as chamadas que iriam para a API REST do Discord passam por FakeHTTP,
+que conta as requisições por rota e pode simular latência.
+"""
+import asyncio
+import itertools
+import random
+from collections import Counter
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import discord
+
+_ids = itertools.count(100_000_000_000_000_000)
+
+
+def next_id():
+    return next(_ids)
+
+
+class FakeHTTP:
+    """Substituto da camada HTTP: conta chamadas e simula latência"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self.messages = 0
+        self.embeds = 0
+
+    async def request(self, route):
+        self.calls[route] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    @property
+    def total(self):
+        return sum(self.calls.values())
+
+
+class FakePermissions:
+    """Permissões com tudo liberado"""
+
+    def __getattr__(self, name):
+        return True
+
+
+ALL_PERMISSIONS = FakePermissions()
+
+
+class FakeUser:
+    def __init__(self, name, user_id=None, bot=False):
+        self.id = user_id or next_id()
+        self.name = name
+        self.display_name = name
+        self.bot = bot
+        self.mention = f"<@{self.id}>"
+
+    def __eq__(self, other):
+        return getattr(other, 'id', None) == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class FakeMember(FakeUser):
+    def __init__(self, guild, name, user_id=None, bot=False):
+        super().__init__(name, user_id, bot)
+        self.guild = guild
+        self.guild_permissions = ALL_PERMISSIONS
+        self.roles = []
+
+
+class FakeVoiceChannel:
+    def __init__(self, guild, name):
+        self.id = next_id()
+        self.name = name
+        self.guild = guild
+
+
+class FakeTextChannel(discord.abc.Messageable):
+    def __init__(self, guild, name, http):
+        self.id = next_id()
+        self.name = name
+        self.guild = guild
+        self.http = http
+        self.mention = f"<#{self.id}>"
+
+    def permissions_for(self, member):
+        return ALL_PERMISSIONS
+
+    async def send(self, content=None, *, embed=None, embeds=None, **kwargs):
+        await self.http.request('POST /channels/{channel_id}/messages')
+        self.http.messages += 1
+        self.http.embeds += len(embeds) if embeds else 1
+
+
+class FakeGuild:
+    def __init__(self, name, http, audit_channel_name, text_channels=20, voice_channels=10, members=100):
+        self.id = next_id()
+        self.name = name
+        self.http = http
+        self.shard_id = 0
+        self.me = FakeMember(self, 'BotRevenge', bot=True)
+        self.text_channels = [FakeTextChannel(self, f"texto-{i}", http) for i in range(text_channels - 1)]
+        self.text_channels.append(FakeTextChannel(self, audit_channel_name, http))
+        self.voice_channels = [FakeVoiceChannel(self, f"voz-{i}") for i in range(voice_channels)]
+        self.channels = self.text_channels + self.voice_channels
+        self._channels = {channel.id: channel for channel in self.channels}
+        self.members = [FakeMember(self, f"membro-{i}") for i in range(members)]
+        self.moderators = self.members[:max(1, members // 20)]
+        self._members = {member.id: member for member in self.members}
+        self._members[self.me.id] = self.me
+        self.bans_reasons = {}
+
+    def get_channel(self, channel_id):
+        return self._channels.get(channel_id)
+
+    def get_member(self, user_id):
+        return self._members.get(user_id)
+
+    async def audit_logs(self, limit=100, **kwargs):
+        await self.http.request('GET /guilds/{guild_id}/audit-logs')
+        for entry in ():
+            yield entry
+
+    async def fetch_ban(self, user):
+        await self.http.request('GET /guilds/{guild_id}/bans/{user_id}')
+        return SimpleNamespace(user=user, reason=self.bans_reasons.get(user.id))
+
+
+class FakeVoiceState:
+    __slots__ = ('channel',)
+
+    def __init__(self, channel=None):
+        self.channel = channel
+
+
+class FakeAuditEntry:
+    """Entrada de audit log como entregue por on_audit_log_entry_create"""
+
+    def __init__(self, guild, action, moderator, channel=None, count=1, target=None, reason=None):
+        self.id = next_id()
+        self.guild = guild
+        self.action = action
+        self.user = moderator
+        self.user_id = moderator.id
+        self.target = target
+        self.reason = reason
+        self.created_at = datetime.now(timezone.utc)
+        self.extra = SimpleNamespace(count=count, channel=channel)
+
+
+def build_guilds(count, http, audit_channel_name, members=100, voice_channels=10, text_channels=20):
+    return [
+        FakeGuild(f"servidor-{i}", http, audit_channel_name, text_channels=text_channels,
+                  voice_channels=voice_channels, members=members)
+        for i in range(count)
+    ]
+
+
+def generate_events(guilds, count, seed=1, moderated_ratio=0.3, ban_ratio=0.02):
+    """Gera um fluxo sintético de eventos (voz, ban e unban) como dicionários"""
+    rng = random.Random(seed)
+    # Canal atual de cada membro (None = fora da voz)
+    location = {}
+    events = []
+    for _ in range(count):
+        guild_index = rng.randrange(len(guilds))
+        guild = guilds[guild_index]
+        member_index = rng.randrange(len(guild.members))
+        roll = rng.random()
+
+        if roll < ban_ratio:
+            events.append({'type': 'ban', 'guild': guild_index, 'member': member_index,
+                           'reason': rng.choice([None, 'spam', 'raid'])})
+            continue
+        if roll < ban_ratio * 1.5:
+            events.append({'type': 'unban', 'guild': guild_index, 'member': member_index})
+            continue
+
+        key = (guild_index, member_index)
+        before = location.get(key)
+        if before is None:
+            after = rng.randrange(len(guild.voice_channels))
+        elif rng.random() < 0.3:
+            after = None
+        else:
+            after = rng.randrange(len(guild.voice_channels))
+            if after == before:
+                after = (after + 1) % len(guild.voice_channels)
+        location[key] = after
+
+        moderator = None
+        if before is not None and rng.random() < moderated_ratio:
+            moderator = rng.randrange(len(guild.moderators))
+        events.append({'type': 'voice', 'guild': guild_index, 'member': member_index,
+                       'before': before, 'after': after, 'moderator': moderator})
+    return events
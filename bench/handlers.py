@@ -0,0 +1,185 @@
+"""Benchmark offline dos handlers de eventos do bot
+
+Monta servidores falsos, dispara on_voice_state_update, on_member_ban e
+on_member_unban com um fluxo de eventos gerado (ou gravado) e mede eventos
+por segundo, latência dos handlers (p50/p99), chamadas REST por evento e
+memória. Nada é enviado ao Discord.
+
+Uso:
+    python -m bench.handlers --events 5000 --guilds 5
+    python -m bench.handlers --record eventos.jsonl      # grava o fluxo gerado
+    python -m bench.handlers --replay eventos.jsonl      # reproduz um fluxo gravado
+    python -m bench.handlers --json resultado.json       # resultado para o CI
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(samples, value):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * value / 100))]
+
+
+def load_events(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_events(path, events):
+    with open(path, 'w', encoding='utf-8') as f:
+        for event in events:
+            f.write(json.dumps(event) + '\n')
+
+
+async def run(args):
+    import discord
+    import bot as bot_module
+    from bench.fakes import FakeHTTP, FakeVoiceState, FakeAuditEntry, build_guilds, generate_events
+
+    http = FakeHTTP(latency=args.http_latency / 1000)
+    guilds = build_guilds(args.guilds, http, bot_module.AUDIT_CHANNEL_NAME, members=args.members)
+
+    if args.replay:
+        events = load_events(args.replay)
+    else:
+        events = generate_events(guilds, args.events, seed=args.seed)
+    if args.record:
+        save_events(args.record, events)
+
+    audit_logger = bot_module.audit_logger
+    await audit_logger.start()
+    for guild in guilds:
+        audit_logger.index_guild(guild)
+
+    latencies = []
+
+    async def timed(coro):
+        start = time.perf_counter()
+        await coro
+        latencies.append(time.perf_counter() - start)
+
+    def dispatch(event):
+        guild = guilds[event['guild']]
+        member = guild.members[event['member']]
+        if event['type'] == 'ban':
+            guild.bans_reasons[member.id] = event.get('reason')
+            return bot_module.on_member_ban(guild, member)
+        if event['type'] == 'unban':
+            return bot_module.on_member_unban(guild, member)
+
+        before = guild.voice_channels[event['before']] if event['before'] is not None else None
+        after = guild.voice_channels[event['after']] if event['after'] is not None else None
+        if event.get('moderator') is not None:
+            # O gateway entrega a entrada do audit log junto com o evento de voz
+            moderator = guild.moderators[event['moderator']]
+            if after is not None:
+                entry = FakeAuditEntry(guild, discord.AuditLogAction.member_move, moderator, channel=after)
+            else:
+                entry = FakeAuditEntry(guild, discord.AuditLogAction.member_disconnect, moderator)
+            bot_module.moderator_index.ingest(entry)
+        return bot_module.on_voice_state_update(member, FakeVoiceState(before), FakeVoiceState(after))
+
+    if args.memory:
+        tracemalloc.start()
+
+    interval = 1.0 / args.rate if args.rate else 0
+    tasks = []
+    start = time.perf_counter()
+    for event in events:
+        # Como o discord.py, cada evento roda em sua própria task
+        tasks.append(asyncio.ensure_future(timed(dispatch(event))))
+        if interval:
+            await asyncio.sleep(interval)
+        elif len(tasks) % 100 == 0:
+            await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    handled = time.perf_counter() - start
+
+    # Enviar as sessões de voz e os resumos de bans em massa abertos e esperar a fila de entrega esvaziar
+    await bot_module.voice_sessions.close()
+    await bot_module.ban_bursts.close()
+    await audit_logger.close()
+    delivered = time.perf_counter() - start
+
+    traced_peak = None
+    if args.memory:
+        traced_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        'events': len(events),
+        'handled_seconds': round(handled, 4),
+        'delivered_seconds': round(delivered, 4),
+        'events_per_second': round(len(events) / handled, 1) if handled else None,
+        'handler_p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'handler_p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'rest_calls': http.total,
+        'rest_calls_per_event': round(http.total / len(events), 4) if events else 0,
+        'rest_calls_by_route': dict(http.calls),
+        'messages_sent': http.messages,
+        'embeds_sent': http.embeds,
+        # Cada sequência detectada deve virar exatamente um resumo
+        'ban_bursts': bot_module.ban_bursts.stats['bursts'],
+        'ban_burst_summaries': bot_module.ban_bursts.stats['summaries'],
+        'ban_burst_events': bot_module.ban_bursts.stats['summarized'],
+        'traced_peak_kb': round(traced_peak / 1024, 1) if traced_peak is not None else None,
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline dos handlers de auditoria")
+    parser.add_argument('--guilds', type=int, default=5)
+    parser.add_argument('--members', type=int, default=200)
+    parser.add_argument('--events', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--rate', type=float, default=0, help="eventos por segundo (0 = o mais rápido possível)")
+    parser.add_argument('--http-latency', type=float, default=0, help="latência simulada por chamada REST (ms)")
+    parser.add_argument('--attribution-wait', type=float, default=0.05,
+                        help="ATTRIBUTION_WAIT usado no benchmark (segundos)")
+    parser.add_argument('--memory', action='store_true', help="medir pico de memória com tracemalloc")
+    parser.add_argument('--replay', help="arquivo JSONL com eventos gravados")
+    parser.add_argument('--record', help="grava o fluxo de eventos usado em JSONL")
+    parser.add_argument('--json', help="grava o resultado em JSON")
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+
+    for option in ('replay', 'record', 'json'):
+        if getattr(args, option):
+            setattr(args, option, os.path.abspath(getattr(args, option)))
+
+    # Rodar isolado: bot.log e journal vão para um diretório temporário
+    workdir = tempfile.mkdtemp(prefix='botrevenge-bench-')
+    sys.path.insert(0, REPO_ROOT)
+    os.chdir(workdir)
+    os.environ.setdefault('DELIVERY_MODE', 'bot')
+    os.environ['ATTRIBUTION_WAIT'] = str(args.attribution_wait)
+
+    import bot  # noqa: F401 - configura o logging na importação
+    logging.getLogger().setLevel(args.log_level.upper())
+
+    result = asyncio.run(run(args))
+    for key, value in result.items():
+        print(f"{key:>24}: {value}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+    if result['ban_burst_summaries'] != result['ban_bursts']:
+        print(f"{result['ban_bursts'] - result['ban_burst_summaries']} sequência(s) de bans sem resumo", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,32 +1,161 @@
 import discord
 from discord.ext import commands
+import asyncio
+import copy
 import os
+import signal
+import time
 from dotenv import load_dotenv
-from datetime import datetime
+from datetime import datetime, timezone
 import logging
-from config import DISCORD_TOKEN, AUDIT_CHANNEL_NAME
+from collections import Counter
+import yarl
+from config import (
+    DISCORD_TOKEN, AUDIT_CHANNEL_NAME, AUDIT_CHANNEL_IDS, RATELIMIT_MAX_WAIT, DELIVERY_MODE,
+    DISCORD_API_BASE, DISCORD_GATEWAY_URL,
+    JOURNAL_ENABLED, JOURNAL_REPLAY_MAX_AGE, JOURNAL_REPLAY_LIMIT,
+    BACKFILL_ENABLED, BACKFILL_MAX_AGE, BACKFILL_LIMIT, BACKFILL_CONCURRENCY, CHECKPOINT_INTERVAL,
+    GUILD_READY_TIMEOUT,
+    DELIVERY_PROCESSES,
+    SHARDING_ENABLED, SHARD_COUNT, SHARD_IDS,
+    INTENTS, COMMAND_MODE, SYNC_APP_COMMANDS, GATEWAY_EVENT_STATS,
+    HEALTH_SERVER_ENABLED, VOICE_ANALYTICS_ENABLED, EXPORT_PROGRESS_INTERVAL,
+    MESSAGE_CACHE_SIZE, MEMBER_CACHE_FLAGS, CHUNK_GUILDS_AT_STARTUP,
+)
+from attribution import ModeratorIndex
+from sessions import VoiceSessionTracker
+from analytics import VoiceAnalytics
+from raids import BanBurstTracker
+from filters import EventFilter
+from delivery import DeliveryScheduler, PRIORITY_HIGH, PRIORITY_NORMAL, send_to_channel
+from delivery_workers import DeliveryPool
+from webhooks import WebhookPool
+from journal import AuditJournal
+from history import HistoryFlags, HistoryView, HISTORY_KINDS
+from export import AuditLogExporter, EXPORT_FORMATS, default_path, parse_actions
+from events import (
+    AuditEvent, EmbedRenderer, FLAG_BACKFILL, FLAG_FALLBACK, FLAG_REPLAYED,
+    voice_event, audit_event, burst_events, to_payload, from_payload,
+)
+from log_setup import setup_logging
+from shards import ShardMonitor, process_rss_bytes
+from metrics import Metrics, HealthServer, collect_shards, collect_delivery, collect_startup, collect_stats, collect_memory
+from profiling import Profiler
+from startup import StartupTimer, GatewayCheckpoint
+from caches import LRUCache, CacheSweeper, memory_report
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('bot.log'),
-        logging.StreamHandler()
-    ]
-)
+# Configurar logging (escrita em segundo plano, com rotação; LOG_LEVEL/LOG_FILE/LOG_FORMAT no config)
+setup_logging()
 logger = logging.getLogger(__name__)
 
-# Configurações do bot
-intents = discord.Intents.default()
-intents.guilds = True
-intents.voice_states = True
-intents.message_content = True  # Habilitado para comandos funcionarem
+# API e gateway alternativos (servidor falso do bench.e2e)
+if DISCORD_API_BASE:
+    discord.http.Route.BASE = discord.webhook.async_.Route.BASE = DISCORD_API_BASE.rstrip('/')
+if DISCORD_GATEWAY_URL:
+    discord.gateway.DiscordWebSocket.DEFAULT_GATEWAY = yarl.URL(DISCORD_GATEWAY_URL)
+
+# Marcos da inicialização (importação -> setup_hook -> gateway -> on_ready -> aquecimento)
+startup = StartupTimer()
+
+# Comandos de prefixo precisam receber mensagens; no modo 'slash' nada disso é usado
+PREFIX_COMMANDS = COMMAND_MODE in ('prefix', 'hybrid')
+SLASH_COMMANDS = COMMAND_MODE in ('slash', 'hybrid')
+
+# Configurações do bot: apenas os intents usados pela auditoria
+# (guilds: canais e cargos; voice_states: voz; moderation: bans e audit log)
+intents = discord.Intents.none()
+for intent_name, enabled in INTENTS.items():
+    setattr(intents, intent_name, enabled)
+if PREFIX_COMMANDS:
+    intents.guild_messages = True
+    intents.message_content = True  # Habilitado para comandos funcionarem
+
+# Com sharding ativo (ou SHARD_COUNT/SHARD_IDS definidos) o bot usa AutoShardedBot
+SHARDED = SHARDING_ENABLED or SHARD_COUNT is not None or SHARD_IDS is not None
+shard_options = {'shard_count': SHARD_COUNT, 'shard_ids': SHARD_IDS} if SHARDED else {}
+
+# Caches do discord.py: sem histórico de mensagens, apenas os membros em canais de voz
+# e sem baixar a lista de membros na conexão (cada flag exige o intent correspondente)
+member_cache_flags = discord.MemberCacheFlags.none()
+for flag_name in MEMBER_CACHE_FLAGS:
+    required = {'voice': 'voice_states', 'joined': 'members'}.get(flag_name)
+    if required is None:
+        logger.warning("MEMBER_CACHE_FLAGS: flag desconhecida '%s' ignorada", flag_name)
+    elif not getattr(intents, required):
+        logger.warning("MEMBER_CACHE_FLAGS: '%s' ignorada, exige o intent %s", flag_name, required)
+    else:
+        setattr(member_cache_flags, flag_name, True)
+cache_options = {
+    # 0 desativa o cache de mensagens (o discord.py trocaria 0 pelo padrão de 1000)
+    'max_messages': MESSAGE_CACHE_SIZE or None,
+    'member_cache_flags': member_cache_flags,
+    'chunk_guilds_at_startup': CHUNK_GUILDS_AT_STARTUP and intents.members,
+}
+
+class AuditBot(commands.AutoShardedBot if SHARDED else commands.Bot):
+    """Bot com ciclo de vida dos componentes de auditoria"""
+    
+    def dispatch(self, event_name, /, *args, **kwargs):
+        if event_name == 'voice_state_update':
+            # O discord.py passa como 'after' o VoiceState guardado no cache e o altera
+            # no próximo evento do membro, às vezes antes de o handler começar a rodar
+            member, before, after = args
+            args = (member, before, copy.copy(after))
+        super().dispatch(event_name, *args, **kwargs)
+    
+    async def setup_hook(self):
+        startup.mark('setup_hook')
+        await audit_logger.start()
+        shard_monitor.start()
+        checkpoint.start()
+        cache_sweeper.start()
+        await event_filter.start()
+        if voice_analytics:
+            await voice_analytics.start()
+        if health_server:
+            try:
+                await health_server.start()
+            except OSError as e:
+                logger.error("Não foi possível abrir o servidor de saúde na porta %s: %s", health_server.port, e)
+        if SLASH_COMMANDS and SYNC_APP_COMMANDS:
+            # Em segundo plano: a conexão com o gateway não espera a sincronização
+            asyncio.ensure_future(self.sync_app_commands())
+    
+    async def sync_app_commands(self):
+        try:
+            synced = await self.tree.sync()
+            logger.info("%s comando(s) de barra sincronizados", len(synced))
+        except discord.HTTPException as e:
+            logger.error("Erro ao sincronizar comandos de barra: %s", e)
+    
+    async def close(self):
+        # Entregar o que estiver na fila antes de fechar a conexão HTTP
+        shard_monitor.close()
+        cache_sweeper.close()
+        await checkpoint.close()
+        await event_filter.close()
+        await voice_sessions.close()
+        await ban_bursts.close()
+        await audit_logger.close()
+        if voice_analytics:
+            await voice_analytics.close()
+        if health_server:
+            await health_server.close()
+        await super().close()
+
+# Métricas do processo (as chamadas REST são contadas pelo trace do aiohttp)
+metrics = Metrics()
 
-bot = commands.Bot(command_prefix='!', intents=intents)
+# Tempos por fase dos handlers e do AuditLogger (!stats)
+profiler = Profiler()
+
+bot = AuditBot(
+    command_prefix='!', intents=intents, max_ratelimit_timeout=RATELIMIT_MAX_WAIT,
+    http_trace=metrics.trace_config(), guild_ready_timeout=GUILD_READY_TIMEOUT, **cache_options, **shard_options,
+)
 
 class AuditLogger:
     """Classe para gerenciar logs de auditoria"""
@@ -34,134 +163,542 @@ class AuditLogger:
     def __init__(self, bot):
         self.bot = bot
         self.audit_channel_name = AUDIT_CHANNEL_NAME
+        # Canais fixados por ID (guild_id -> channel_id), definidos no config
+        self.pinned_channels = dict(AUDIT_CHANNEL_IDS)
+        # Índice por servidor: guild_id -> channel_id (None quando não existe canal)
+        # Os índices guardam no máximo GUILD_CACHE_MAX servidores e são refeitos sob demanda
+        self._channel_index = LRUCache()
+        # Cache da permissão de envio no canal indexado: guild_id -> bool
+        self._can_send = LRUCache()
+        # Canal alternativo já resolvido: guild_id -> channel_id (None quando não há nenhum)
+        self._fallback_index = LRUCache()
+        # Eventos sem canal de destino e erros, por motivo
+        self.stats = Counter()
+        # (guild_id, tipo, target_id) dos bans/unbans recebidos pelo gateway até o fim da recuperação
+        # do audit log (None depois dela): a recuperação não os envia de novo
+        self._live_targets = set() if BACKFILL_ENABLED else None
+        # Entrega via webhook (sessão HTTP própria) ou pelo próprio bot; nos processos de entrega, sempre pelo bot
+        self.webhooks = None
+        if DELIVERY_MODE == 'webhook' and not DELIVERY_PROCESSES:
+            self.webhooks = WebhookPool(bot, trace_configs=[metrics.trace_config()], is_audit_channel=self.is_audit_channel)
+        # Journal local dos eventos, para reenviar o que não foi entregue
+        self.journal = AuditJournal() if JOURNAL_ENABLED else None
+        if DELIVERY_PROCESSES:
+            # Renderização e envio em processos separados; este processo só cuida do gateway
+            self.scheduler = DeliveryPool(
+                on_delivered=self.journal.mark_delivered if self.journal else None,
+                on_dropped=self.journal.mark_dropped if self.journal else None,
+            )
+        else:
+            # Filas de entrega por servidor, com prioridade e agrupamento de embeds
+            renderer = EmbedRenderer(bot)
+            self.scheduler = DeliveryScheduler(
+                sender=profiler.timed('delivery.send')(self.webhooks.send if self.webhooks else send_to_channel),
+                on_delivered=self.journal.mark_delivered if self.journal else None,
+                on_dropped=self.journal.mark_dropped if self.journal else None,
+                render=profiler.timed('delivery.render')(renderer),
+                attach=renderer.attachments,
+            )
+        self.breaker = self.scheduler.breaker
     
-    async def get_audit_channel(self, guild):
-        """Busca o canal de auditoria no servidor"""
-        for channel in guild.channels:
-            if channel.name == self.audit_channel_name:
-                return channel
-        return None
+    async def start(self):
+        """Abre o journal, a sessão dos webhooks e os workers de entrega"""
+        if self.journal:
+            await self.journal.open()
+        if self.webhooks:
+            await self.webhooks.start()
+        self.scheduler.start()
     
-    async def send_audit_log(self, guild, embed):
-        """Envia log de auditoria para o canal específico"""
-        try:
-            audit_channel = await self.get_audit_channel(guild)
-            if audit_channel:
-                # Verificar se o bot tem permissão para enviar mensagens
-                if audit_channel.permissions_for(guild.me).send_messages:
-                    await audit_channel.send(embed=embed)
-                    logger.info(f"Log de auditoria enviado para {audit_channel.name}")
-                else:
-                    logger.error(f"Bot não tem permissão para enviar mensagens no canal {audit_channel.name}")
-                    # Tentar enviar para o canal geral se disponível
-                    await self.send_fallback_log(guild, embed)
-            else:
-                logger.warning(f"Canal de auditoria '{self.audit_channel_name}' não encontrado")
-                # Tentar enviar para o canal geral se disponível
-                await self.send_fallback_log(guild, embed)
-        except Exception as e:
-            logger.error(f"Erro ao enviar log de auditoria: {e}")
+    async def close(self):
+        """Entrega os logs pendentes e encerra os workers"""
+        await self.scheduler.close()
+        if self.webhooks:
+            await self.webhooks.close()
+        if self.journal:
+            await self.journal.close()
     
-    async def send_fallback_log(self, guild, embed):
-        """Tenta enviar log para um canal alternativo se o canal de auditoria não estiver disponível"""
+    @profiler.timed('audit_logger.record_event')
+    def record_event(self, record, key=None):
+        """Grava o evento no journal e retorna sua chave de idempotência (com `key`, atualiza o já gravado)"""
+        if not self.journal:
+            return None
+        if key is None:
+            key = f"{record.kind}:{record.guild_id}:{record.target_id}:{time.time_ns()}"
+        self.journal.record(
+            key, record.guild_id, record.kind, to_payload(record),
+            target_id=record.target_id,
+            moderator_id=record.moderator_id,
+            created_at=record.created_at,
+        )
+        return key
+    
+    async def replay_pending(self):
+        """Reenvia eventos gravados no journal que não chegaram a ser entregues"""
+        if not self.journal:
+            return
+        
         try:
-            # Procurar por canais onde o bot pode enviar mensagens
-            for channel in guild.text_channels:
-                if channel.permissions_for(guild.me).send_messages:
-                    embed.add_field(name="⚠️ Aviso", value="Canal de auditoria não disponível - enviado para canal alternativo", inline=False)
-                    await channel.send(embed=embed)
-                    logger.info(f"Log de auditoria enviado para canal alternativo: {channel.name}")
-                    return
-            logger.error("Nenhum canal disponível para enviar logs de auditoria")
+            rows = await self.journal.pending(JOURNAL_REPLAY_MAX_AGE, JOURNAL_REPLAY_LIMIT)
         except Exception as e:
-            logger.error(f"Erro ao enviar log de fallback: {e}")
-    
-    def create_audit_embed(self, action, moderator, target, reason=None, **kwargs):
-        """Cria embed para logs de auditoria"""
-        embed = discord.Embed(
-            title=f"🔍 Log de Auditoria - {action}",
-            color=0xff6b6b,
-            timestamp=datetime.utcnow()
-        )
+            logger.error("Erro ao ler eventos pendentes do journal: %s", e)
+            return
         
-        embed.add_field(name="👮 Moderador", value=f"{moderator.mention} ({moderator.id})", inline=True)
-        embed.add_field(name="🎯 Alvo", value=f"{target.mention} ({target.id})", inline=True)
+        replayed = 0
+        for key, guild_id, kind, payload in rows:
+            guild = self.bot.get_guild(guild_id)
+            if guild is None:
+                continue
+            record = from_payload(kind, payload)
+            if record is None:
+                logger.warning("Evento %s do journal em formato desconhecido, ignorado", key)
+                continue
+            record = record._replace(flags=record.flags | FLAG_REPLAYED)
+            if kind == 'voice':
+                await self.send_voice_event(guild, record, key=key)
+            else:
+                await self.send_audit_log(guild, record, key=key)
+            replayed += 1
         
-        if reason:
-            embed.add_field(name="📝 Motivo", value=reason, inline=False)
+        if replayed:
+            logger.info("%s evento(s) pendente(s) do journal reenviados", replayed)
+    
+    async def warm_up(self, guilds):
+        """Indexa os servidores ainda não indexados, cedendo o event loop entre lotes"""
+        found = missing = 0
+        for position, guild in enumerate(guilds, 1):
+            if guild.id not in self._channel_index:
+                self.index_guild(guild)
+            if self._channel_index.get(guild.id):
+                found += 1
+            else:
+                missing += 1
+                logger.debug("Canal de auditoria não encontrado em %s", guild.name)
+            if position % 50 == 0:
+                # Eventos que chegam durante o aquecimento não esperam a varredura
+                await asyncio.sleep(0)
+        logger.info("Canal de auditoria encontrado em %s servidor(es), ausente em %s", found, missing)
+    
+    def note_live(self, guild_id, kind, target_id):
+        """Registra um ban/unban recebido pelo gateway enquanto a recuperação não terminou"""
+        if self._live_targets is not None:
+            self._live_targets.add((guild_id, kind, target_id))
+    
+    def finish_backfill(self):
+        """Fim da recuperação: os bans/unbans do gateway deixam de ser registrados"""
+        self._live_targets = None
+    
+    async def backfill(self, since):
+        """Recupera pelo audit log os bans e unbans feitos desde o momento informado"""
+        after = discord.Object(id=discord.utils.time_snowflake(datetime.fromtimestamp(since, timezone.utc)))
+        semaphore = asyncio.Semaphore(BACKFILL_CONCURRENCY)
         
-        # Adicionar campos específicos baseados na ação
-        for key, value in kwargs.items():
-            if value:
-                embed.add_field(name=key, value=value, inline=True)
+        async def backfill_guild(guild):
+            async with semaphore:
+                return await self._backfill_guild(guild, after, since)
         
-        embed.set_footer(text=f"ID do Servidor: {moderator.guild.id}")
-        return embed
+        guilds = [guild for guild in self.bot.guilds if guild.me and guild.me.guild_permissions.view_audit_log]
+        results = await asyncio.gather(*(backfill_guild(guild) for guild in guilds), return_exceptions=True)
+        recovered = 0
+        for guild, result in zip(guilds, results):
+            if isinstance(result, Exception):
+                logger.warning("Não foi possível recuperar o audit log de %s: %s", guild.name, result)
+            else:
+                recovered += result
+        logger.info("%s ban(s)/unban(s) recuperado(s) do audit log em %s servidor(es)", recovered, len(guilds))
+    
+    async def _backfill_guild(self, guild, after, since):
+        recovered = 0
+        async for entry in guild.audit_logs(limit=BACKFILL_LIMIT, after=after):
+            if entry.action is discord.AuditLogAction.ban:
+                kind = 'ban'
+            elif entry.action is discord.AuditLogAction.unban:
+                kind = 'unban'
+            else:
+                continue
+            if event_filter.check_ban(guild, entry.target, kind):
+                continue
+            # Já recebido pelo gateway nesta execução (o handler pode ainda nem ter gravado no journal)
+            if self._live_targets is not None and (guild.id, kind, entry.target.id) in self._live_targets:
+                continue
+            created_at = entry.created_at.timestamp()
+            # O bot pode ter registrado o evento antes de cair
+            if self.journal and await self.journal.has_event(guild.id, kind, entry.target.id, created_at - CHECKPOINT_INTERVAL):
+                continue
+            record = AuditEvent(
+                guild.id, kind, entry.target.id, entry.user_id,
+                entry.reason or "Motivo não especificado", created_at, FLAG_BACKFILL,
+            )
+            await self.send_audit_log(guild, record)
+            recovered += 1
+        return recovered
     
-    def create_voice_embed(self, user, action, channel_name, channel_emoji="💬", moderator=None, guild=None):
-        """Cria embed bonito para movimentação de voz como no comando !teste"""
-        # Formatar nome do usuário
-        user_display = f"@{user.display_name} <{user.name}>"
+    @profiler.timed('audit_logger.index_guild')
+    def index_guild(self, guild):
+        """Resolve o canal de auditoria do servidor e atualiza o índice"""
+        channel = None
+        pinned_id = self.pinned_channels.get(guild.id)
+        if pinned_id:
+            channel = guild.get_channel(pinned_id)
+            if channel is None:
+                logger.warning("Canal fixado %s não existe em %s, buscando pelo nome", pinned_id, guild.name)
         
-        # Criar embed com barra verde lateral
-        embed = discord.Embed(
-            title="🔍 Log de Auditoria - Movimentação de Voz",
-            description=f"👉🎶 {user_display} {action} {channel_emoji} • {channel_name}",
-            color=0x00ff00,  # Verde para barra lateral
-            timestamp=datetime.utcnow()
-        )
+        if channel is None:
+            for candidate in guild.channels:
+                if candidate.name == self.audit_channel_name and isinstance(candidate, discord.abc.Messageable):
+                    channel = candidate
+                    break
         
-        # Adicionar campos
-        embed.add_field(name="👤 Usuário", value=f"{user.mention} ({user.id})", inline=True)
-        embed.add_field(name="📺 Canal", value=channel_name, inline=True)
+        self._channel_index[guild.id] = channel.id if channel else None
+        self._can_send[guild.id] = self._check_send_permission(guild, channel)
+        self._reset_targets(guild.id)
+        return channel
+    
+    def _check_send_permission(self, guild, channel):
+        """Verifica se o bot pode enviar mensagens no canal"""
+        if channel is None or guild.me is None:
+            return False
+        return channel.permissions_for(guild.me).send_messages
+    
+    def refresh_permissions(self, guild):
+        """Recalcula a permissão em cache após mudança de cargos ou overwrites"""
+        channel_id = self._channel_index.get(guild.id)
+        channel = guild.get_channel(channel_id) if channel_id else None
+        self._can_send[guild.id] = self._check_send_permission(guild, channel)
+        self._reset_targets(guild.id)
+    
+    def _reset_targets(self, guild_id):
+        """Canais ou permissões mudaram: resolver o canal alternativo de novo e reabrir os envios"""
+        self._fallback_index.pop(guild_id, None)
+        self.scheduler.reset_guild(guild_id)
+    
+    def forget_guild(self, guild_id):
+        """Remove o servidor do índice"""
+        self._channel_index.pop(guild_id, None)
+        self._can_send.pop(guild_id, None)
+        self._reset_targets(guild_id)
+    
+    def caches(self):
+        return {
+            'audit_logger.channels': self._channel_index,
+            'audit_logger.can_send': self._can_send,
+            'audit_logger.fallback': self._fallback_index,
+        }
+    
+    def is_audit_channel(self, channel):
+        """Indica se o canal é o canal de auditoria indexado do servidor"""
+        return self._channel_index.get(channel.guild.id) == channel.id
+    
+    def is_audit_candidate(self, channel):
+        """Indica se o canal pode ser (ou é) o canal de auditoria do servidor"""
+        guild_id = channel.guild.id
+        return (
+            channel.name == self.audit_channel_name
+            or self.pinned_channels.get(guild_id) == channel.id
+            or self._channel_index.get(guild_id) == channel.id
+        )
+    
+    @profiler.timed('audit_logger.get_audit_channel')
+    async def get_audit_channel(self, guild):
+        """Busca o canal de auditoria no servidor usando o índice"""
+        if guild.id not in self._channel_index:
+            return self.index_guild(guild)
         
-        if moderator:
-            if guild and moderator == guild.me:
-                embed.add_field(name="👮 Moderador", value="Sistema/Moderador", inline=True)
-                embed.add_field(name="📝 Ação", value="Movido por moderador", inline=True)
-            else:
-                embed.add_field(name="👮 Moderador", value=f"{moderator.mention} ({moderator.id})", inline=True)
-                embed.add_field(name="📝 Ação", value=f"Movido por {moderator.name}", inline=True)
-        else:
-            embed.add_field(name="📝 Ação", value="Movimentação própria", inline=True)
+        channel_id = self._channel_index[guild.id]
+        if channel_id is None:
+            return None
         
-        # Footer com timestamp
-        timestamp = datetime.now().strftime("%d/%m/%Y às %H:%M")
-        embed.set_footer(text=f"ID do usuário: {user.id} • {timestamp}")
+        channel = guild.get_channel(channel_id)
+        if channel is None:
+            # Canal sumiu sem passarmos pelo evento de remoção
+            return self.index_guild(guild)
+        return channel
+    
+    def can_send(self, guild):
+        """Permissão de envio em cache para o canal de auditoria"""
+        if guild.id not in self._can_send:
+            self.index_guild(guild)
+        return self._can_send[guild.id]
+    
+    def get_fallback_channel(self, guild):
+        """Canal alternativo do servidor, resolvido uma vez e mantido em cache"""
+        if guild.id in self._fallback_index:
+            channel_id = self._fallback_index[guild.id]
+            channel = guild.get_channel(channel_id) if channel_id else None
+            if channel is not None or channel_id is None:
+                return channel
         
-        return embed
+        channel = None
+        if guild.me is not None:
+            # Procurar por canais onde o bot pode enviar mensagens
+            for candidate in guild.text_channels:
+                if candidate.permissions_for(guild.me).send_messages and not self.breaker.is_open(candidate.id):
+                    channel = candidate
+                    break
+        self._fallback_index[guild.id] = channel.id if channel else None
+        if channel:
+            logger.warning("Canal de auditoria indisponível em %s, usando o canal alternativo %s", guild.name, channel.name)
+        else:
+            logger.error("Nenhum canal disponível para enviar logs de auditoria em %s", guild.name)
+        return channel
     
-    async def send_voice_embed(self, guild, embed):
-        """Envia embed bonito para o canal de auditoria"""
+    @profiler.timed('audit_logger.send_audit_log')
+    async def send_audit_log(self, guild, record, key=None):
+        """Envia log de auditoria para o canal específico"""
         try:
+            if key is None:
+                key = self.record_event(record)
             audit_channel = await self.get_audit_channel(guild)
-            if audit_channel and audit_channel.permissions_for(guild.me).send_messages:
-                await audit_channel.send(embed=embed)
-                logger.info(f"Embed de voz enviado para {audit_channel.name}")
+            if audit_channel is None:
+                self.stats['no_channel'] += 1
+                logger.debug("Canal de auditoria '%s' não encontrado em %s", self.audit_channel_name, guild.name)
+            elif not self.can_send(guild):
+                self.stats['no_permission'] += 1
+                logger.debug("Bot não tem permissão para enviar mensagens no canal %s", audit_channel.name)
+            elif self.breaker.is_open(audit_channel.id):
+                self.stats['breaker_open'] += 1
             else:
-                logger.warning(f"Canal de auditoria não disponível para envio")
+                self.scheduler.submit(guild, audit_channel, record, PRIORITY_HIGH, key=key)
+                logger.debug("Log de auditoria enfileirado para %s", audit_channel.name)
+                return
+            # Tentar enviar para o canal alternativo se disponível
+            await self.send_fallback_log(guild, record, key=key)
         except Exception as e:
-            logger.error(f"Erro ao enviar embed de voz: {e}")
+            self.stats['errors'] += 1
+            logger.error("Erro ao enviar log de auditoria: %s", e)
+    
+    @profiler.timed('audit_logger.send_fallback_log')
+    async def send_fallback_log(self, guild, record, key=None):
+        """Tenta enviar log para um canal alternativo se o canal de auditoria não estiver disponível"""
+        try:
+            channel = self.get_fallback_channel(guild)
+            if channel is None or self.breaker.is_open(channel.id):
+                self.stats['undeliverable'] += 1
+                return
+            # A marcação de alternativo vai no registro; o embed é montado no envio
+            record = record._replace(flags=record.flags | FLAG_FALLBACK)
+            self.scheduler.submit(guild, channel, record, PRIORITY_HIGH, key=key)
+            self.stats['fallback'] += 1
+            logger.debug("Log de auditoria enfileirado para canal alternativo: %s", channel.name)
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error("Erro ao enviar log de fallback: %s", e)
+    
+    @profiler.timed('audit_logger.send_ban_burst')
+    async def send_ban_burst(self, guild, record, keys=()):
+        """Completa no journal cada ban/unban do resumo (gravados na chegada) e envia o resumo como um único log"""
+        try:
+            recorded = {}
+            for target_id, key in keys:
+                recorded.setdefault(target_id, []).append(key)
+            # Moderador e motivo resolvidos substituem os registros feitos na chegada
+            keys = tuple(
+                self.record_event(event, key=key)
+                for event in burst_events(record)
+                for key in recorded.pop(event.target_id, None) or [None]
+            )
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error("Erro ao gravar bans em massa no journal: %s", e)
+            keys = ()
+        logger.info("%s %s em sequência em %s enviados como resumo", len(record.entries), record.action, guild.name)
+        await self.send_audit_log(guild, record, key=keys)
+    
+    @profiler.timed('audit_logger.send_voice_event')
+    async def send_voice_event(self, guild, record, key=None):
+        """Enfileira o evento de voz para o canal de auditoria (o embed é montado no envio)"""
+        try:
+            if key is None:
+                key = self.record_event(record)
+            audit_channel = await self.get_audit_channel(guild)
+            if audit_channel and self.can_send(guild) and not self.breaker.is_open(audit_channel.id):
+                if self.scheduler.submit(guild, audit_channel, record, PRIORITY_NORMAL, key=key):
+                    logger.debug("Evento de voz enfileirado para %s", audit_channel.name)
+                else:
+                    logger.warning("Fila de entrega cheia em %s, evento de voz descartado", guild.name)
+            else:
+                # Sem canal de auditoria utilizável, eventos de voz não vão para o canal alternativo
+                self.stats['voice_undeliverable'] += 1
+                logger.debug("Canal de auditoria não disponível para envio em %s", guild.name)
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error("Erro ao enviar evento de voz: %s", e)
 # Instanciar o logger de auditoria
 audit_logger = AuditLogger(bot)
 
+# Índice de ações recentes de moderadores (alimentado pelo audit log)
+moderator_index = ModeratorIndex(bot)
+
+# Sessões de voz por membro (agrupa entradas e saídas rápidas sem moderador); cada movimentação
+# vai para o journal na chegada e as reconexões descartadas deixam de ficar pendentes
+voice_sessions = VoiceSessionTracker(
+    audit_logger.send_voice_event,
+    on_discarded=audit_logger.journal.mark_dropped if audit_logger.journal else None,
+)
+
+# Regras por servidor que descartam eventos antes da atribuição e das chamadas REST
+event_filter = EventFilter()
+
+# Bans/unbans em massa enviados como resumo (modo raid)
+ban_bursts = BanBurstTracker(audit_logger.send_ban_burst, journal=audit_logger.record_event)
+
+# Tempo em voz por membro/canal e ações de moderadores (!topvoz, !tempovoz)
+voice_analytics = VoiceAnalytics() if VOICE_ANALYTICS_ENABLED else None
+
+# Exportações do audit log em andamento (!exportar)
+exporter = AuditLogExporter()
+
+# Eventos e latência por shard
+shard_monitor = ShardMonitor(bot)
+
+# Último momento conectado ao gateway (para recuperar o intervalo fora do ar)
+checkpoint = GatewayCheckpoint(bot)
+
+# Limpeza periódica do estado expirado (audit log, bans em massa, circuitos, falhas de webhook)
+cache_sweeper = CacheSweeper([moderator_index, ban_bursts, audit_logger.scheduler, audit_logger.webhooks])
+
+def memory_usage():
+    """Uso de memória por cache (!memoria e /metrics)"""
+    return memory_report(bot, [
+        audit_logger, moderator_index, voice_sessions, ban_bursts, event_filter,
+        audit_logger.scheduler, audit_logger.webhooks, voice_analytics, shard_monitor,
+    ])
+
+# Métricas lidas dos contadores de cada componente e servidor de saúde (/healthz, /readyz, /metrics)
+metrics.register(collect_shards(shard_monitor))
+metrics.register(collect_startup(startup))
+metrics.register(collect_delivery(audit_logger.scheduler))
+metrics.register(collect_stats('attribution', moderator_index.stats, "Atribuição de moderadores (entradas, buscas REST, acertos)"))
+metrics.register(collect_stats('audit_logger', audit_logger.stats, "Eventos sem canal de destino, enviados ao canal alternativo e erros"))
+metrics.register(collect_stats('delivery_errors', audit_logger.scheduler.errors, "Falhas de envio por status HTTP ou exceção"))
+metrics.register(collect_stats('delivery_breaker', audit_logger.breaker.stats, "Circuitos de canais abertos e fechados"))
+metrics.register(collect_stats('voice_sessions', voice_sessions.stats, "Sessões de voz agrupadas, reconexões e despejos"))
+metrics.register(collect_stats('exports', exporter.stats, "Exportações do audit log, entradas, páginas e pausas por rate limit"))
+metrics.register(collect_stats('filtered', event_filter.stats, "Eventos descartados por regra de filtro e recargas do arquivo de regras"))
+metrics.register(collect_stats('ban_bursts', ban_bursts.stats, "Sequências de bans/unbans em massa e eventos resumidos"))
+metrics.register(collect_stats('cache_sweeps', cache_sweeper.stats, "Itens expirados descartados por componente"))
+metrics.register(collect_memory(memory_usage))
+if audit_logger.webhooks:
+    metrics.register(collect_stats('webhooks', audit_logger.webhooks.stats, "Envios por webhook e fallbacks"))
+health_server = HealthServer(bot, metrics, shard_monitor) if HEALTH_SERVER_ENABLED else None
+
+@bot.event
+async def on_connect():
+    """Primeira conexão com o gateway"""
+    startup.mark('gateway')
+
 @bot.event
 async def on_ready():
     """Evento quando o bot está pronto"""
-    logger.info(f'{bot.user} está online!')
-    logger.info(f'Bot está em {len(bot.guilds)} servidor(es)')
-    logger.info(f'Prefixo do bot: {bot.command_prefix}')
-    logger.info(f'Comandos carregados: {[cmd.name for cmd in bot.commands]}')
-    
-    # Verificar se o canal de auditoria existe em cada servidor
-    for guild in bot.guilds:
-        audit_channel = await audit_logger.get_audit_channel(guild)
-        if audit_channel:
-            logger.info(f"Canal de auditoria encontrado em {guild.name}: {audit_channel.name}")
-        else:
-            logger.warning(f"Canal de auditoria não encontrado em {guild.name}")
+    first_ready = startup.mark('ready')
+    logger.info('%s está online!', bot.user)
+    logger.info('Bot está em %s servidor(es)', len(bot.guilds))
+    logger.info('Prefixo do bot: %s', bot.command_prefix)
+    logger.info('Comandos carregados: %s', [cmd.name for cmd in bot.commands])
+    
+    # Indexar os servidores em segundo plano; eventos que chegarem antes
+    # indexam o próprio servidor sob demanda (get_audit_channel)
+    asyncio.ensure_future(catch_up(first_ready))
+
+async def catch_up(first_ready):
+    """Aquecimento do índice e, no primeiro on_ready, recuperação do que ficou para trás"""
+    try:
+        await audit_logger.warm_up(bot.guilds)
+        if not first_ready:
+            return
+        startup.mark('warm_up')
+        
+        # Sessões de voz abertas no checkpoint x quem está nos canais agora
+        if voice_analytics:
+            voice_analytics.reconcile(bot.guilds)
+        
+        # Reenviar eventos que ficaram pendentes no journal
+        await audit_logger.replay_pending()
+        
+        # Recuperar bans/unbans feitos enquanto o bot estava fora do ar
+        last_connected = checkpoint.last_connected()
+        if BACKFILL_ENABLED and last_connected:
+            offline = time.time() - last_connected
+            if offline <= BACKFILL_MAX_AGE:
+                logger.info("Bot ficou %.0fs fora do ar, recuperando eventos do audit log", offline)
+                # A margem de um CHECKPOINT_INTERVAL só é segura com o journal para descartar
+                # o que já tinha sido enviado antes da queda
+                await audit_logger.backfill(last_connected - CHECKPOINT_INTERVAL if audit_logger.journal else last_connected)
+            else:
+                logger.warning("Bot ficou %.0fs fora do ar, acima de BACKFILL_MAX_AGE; nada será recuperado", offline)
+        startup.mark('catch_up')
+    except Exception as e:
+        logger.error("Erro ao recuperar eventos na inicialização: %s", e)
+    finally:
+        if first_ready:
+            audit_logger.finish_backfill()
+
+@bot.event
+async def on_guild_join(guild):
+    """Indexa o canal de auditoria ao entrar em um novo servidor"""
+    audit_channel = audit_logger.index_guild(guild)
+    logger.info("Entrou no servidor %s - canal de auditoria: %s", guild.name, audit_channel.name if audit_channel else 'não encontrado')
+
+@bot.event
+async def on_guild_remove(guild):
+    """Remove o servidor do índice ao sair"""
+    audit_logger.forget_guild(guild.id)
+    moderator_index.forget_guild(guild.id)
+    voice_sessions.forget_guild(guild.id)
+    ban_bursts.forget_guild(guild.id)
+    shard_monitor.forget_guild(guild.id)
+    if voice_analytics:
+        voice_analytics.forget_guild(guild.id)
+
+@bot.event
+@metrics.timed('audit_log_entry_create')
+@profiler.handler('audit_log_entry_create')
+async def on_audit_log_entry_create(entry):
+    """Alimenta o índice de moderadores com as entradas do audit log"""
+    shard_monitor.count(entry.guild, 'audit_log_entry')
+    moderator_index.ingest(entry)
+    ban_bursts.ingest(entry)
+
+@bot.event
+async def on_guild_channel_create(channel):
+    """Atualiza o índice se o novo canal puder ser o de auditoria"""
+    if audit_logger.is_audit_candidate(channel):
+        audit_logger.index_guild(channel.guild)
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    """Atualiza o índice se o canal de auditoria foi removido"""
+    if audit_logger.is_audit_candidate(channel):
+        audit_logger.index_guild(channel.guild)
+
+@bot.event
+async def on_guild_channel_update(before, after):
+    """Mantém o índice atualizado com renomeações e mudanças de permissão"""
+    if before.name != after.name and (audit_logger.is_audit_candidate(before) or audit_logger.is_audit_candidate(after)):
+        audit_logger.index_guild(after.guild)
+    elif before.overwrites != after.overwrites:
+        # Overwrites do canal (ou da categoria) podem mudar a permissão do bot
+        audit_logger.refresh_permissions(after.guild)
+
+@bot.event
+async def on_guild_role_create(role):
+    audit_logger.refresh_permissions(role.guild)
+
+@bot.event
+async def on_guild_role_update(before, after):
+    if before.permissions != after.permissions:
+        audit_logger.refresh_permissions(after.guild)
+
+@bot.event
+async def on_guild_role_delete(role):
+    audit_logger.refresh_permissions(role.guild)
 
 @bot.event
+async def on_member_update(before, after):
+    """Recalcula permissões quando os cargos do próprio bot mudam"""
+    # Sem o intent de membros o Discord só envia este evento para o próprio bot
+    if after.id == bot.user.id and before.roles != after.roles:
+        audit_logger.refresh_permissions(after.guild)
+
 async def on_message(message):
     """Evento quando uma mensagem é enviada"""
     # Ignorar mensagens do próprio bot
@@ -170,12 +707,23 @@ async def on_message(message):
     
     # Log de debug para comandos
     if message.content.startswith(bot.command_prefix):
-        logger.info(f"Comando detectado: {message.content} de {message.author.name}")
+        logger.debug("Comando detectado: %s de %s", message.content, message.author.name)
     
     # Processar comandos
     await bot.process_commands(message)
 
-# Comentado: on_member_update requer intents privilegiados
+# No modo 'slash' o bot não recebe mensagens e não registra on_message
+if PREFIX_COMMANDS:
+    bot.event(on_message)
+
+async def on_socket_event_type(event_type):
+    """Conta os eventos recebidos do gateway por tipo"""
+    shard_monitor.count_gateway_event(event_type)
+
+if GATEWAY_EVENT_STATS:
+    bot.event(on_socket_event_type)
+
+# Comentado: on_member_update para outros membros requer intents privilegiados
 # @bot.event
 # async def on_member_update(before, after):
 #     """Monitora mudanças em membros (timeouts, roles, etc.)"""
@@ -183,157 +731,123 @@ async def on_message(message):
 #     pass
 
 @bot.event
+@metrics.timed('member_ban')
+@profiler.handler('member_ban')
 async def on_member_ban(guild, user):
     """Monitora quando um usuário é banido"""
+    shard_monitor.count(guild, 'member_ban')
+    if event_filter.check_ban(guild, user, 'ban'):
+        return
+    audit_logger.note_live(guild.id, 'ban', user.id)
+    # Durante um ban em massa o evento entra no resumo (sem fetch_ban)
+    if ban_bursts.observe(guild, 'ban', user):
+        return
     try:
         # Tentar obter informações do ban
         try:
-            ban_entry = await guild.fetch_ban(user)
+            with profiler.phase('ban.fetch_ban'):
+                ban_entry = await guild.fetch_ban(user)
             reason = ban_entry.reason or "Motivo não especificado"
         except:
             reason = "Motivo não disponível"
         
-        embed = audit_logger.create_audit_embed(
-            action="Usuário Banido",
-            moderator=guild.me,  # O bot não pode saber quem baniu
-            target=user,
-            reason=reason
-        )
-        
-        await audit_logger.send_audit_log(guild, embed)
-        logger.info(f"Ban detectado para {user.name}")
+        # O bot não pode saber quem baniu
+        record = audit_event(guild, 'ban', user, moderator=guild.me, reason=reason)
+        await audit_logger.send_audit_log(guild, record)
+        logger.info("Ban detectado para %s", user.name)
     
     except Exception as e:
-        logger.error(f"Erro ao processar ban: {e}")
+        logger.error("Erro ao processar ban: %s", e)
 
 @bot.event
+@metrics.timed('member_unban')
+@profiler.handler('member_unban')
 async def on_member_unban(guild, user):
     """Monitora quando um usuário é desbanido"""
+    shard_monitor.count(guild, 'member_unban')
+    if event_filter.check_ban(guild, user, 'unban'):
+        return
+    audit_logger.note_live(guild.id, 'unban', user.id)
+    if ban_bursts.observe(guild, 'unban', user):
+        return
     try:
-        embed = audit_logger.create_audit_embed(
-            action="Usuário Desbanido",
-            moderator=guild.me,  # O bot não pode saber quem desbaniu
-            target=user,
-            reason="Desban detectado"
-        )
-        
-        await audit_logger.send_audit_log(guild, embed)
-        logger.info(f"Desban detectado para {user.name}")
+        # O bot não pode saber quem desbaniu
+        record = audit_event(guild, 'unban', user, moderator=guild.me, reason="Desban detectado")
+        await audit_logger.send_audit_log(guild, record)
+        logger.info("Desban detectado para %s", user.name)
     
     except Exception as e:
-        logger.error(f"Erro ao processar desban: {e}")
+        logger.error("Erro ao processar desban: %s", e)
 
 @bot.event
+@metrics.timed('voice_state_update')
+@profiler.handler('voice_state_update')
 async def on_voice_state_update(member, before, after):
     """Monitora movimentação de usuários entre canais de voz"""
+    shard_monitor.count(member.guild, 'voice_state_update')
+    at = time.time()
     try:
         # Verificar se o usuário mudou de canal
         if before.channel != after.channel:
-            # Tentar detectar quem moveu o usuário usando audit log
+            if event_filter.check_voice(member, before.channel, after.channel):
+                # Descartado pelas regras: sem atribuição nem log, só o tempo em voz é contado
+                if voice_analytics:
+                    voice_analytics.observe(member, before.channel, after.channel, at)
+                return
+            
+            # Tempo em voz antes da espera pela atribuição: uma saída e uma volta rápidas
+            # seriam contadas fora de ordem (a entrada não espera pelo audit log)
+            if voice_analytics:
+                voice_analytics.observe(member, before.channel, after.channel, at)
+            
+            # Identificar o moderador pelo índice do audit log (sem chamada REST)
+            # Entradas em canais não podem ser feitas por moderadores
             moderator = None
             try:
-                # Buscar no audit log quem moveu especificamente este usuário
-                current_time = datetime.utcnow().timestamp()
-                moderator = None
-                
-                logger.info(f"🔍 Cruzando dados: {member.name} (ID: {member.id}) com audit log...")
-                logger.info(f"⏰ Timestamp atual: {datetime.utcnow().strftime('%H:%M:%S')}")
-                
-                # Buscar a entrada mais recente de MEMBER_MOVE
-                logger.info(f"🔍 Buscando entrada mais recente de MEMBER_MOVE...")
-                
-                # Pegar apenas a entrada mais recente
-                async for entry in member.guild.audit_logs(limit=1, action=discord.AuditLogAction.member_move):
-                    if entry.user:
-                        moderator = entry.user
-                        logger.info(f"📋 ENTRADA MAIS RECENTE:")
-                        logger.info(f"   👤 Executor: {entry.user.name} (ID: {entry.user.id})")
-                        logger.info(f"   🎯 Target: {entry.target.name if entry.target else 'None'} (ID: {entry.target.id if entry.target else 'None'})")
-                        logger.info(f"   ⏰ Timestamp: {entry.created_at.strftime('%H:%M:%S')}")
-                        logger.info(f"   📺 Before: {entry.before.channel.name if entry.before and entry.before.channel else 'None'}")
-                        logger.info(f"   📺 After: {entry.after.channel.name if entry.after and entry.after.channel else 'None'}")
-                        logger.info(f"🎯 Usando entrada mais recente: {moderator.name}")
-                        break
+                with profiler.phase('voice.attribution'):
+                    if before.channel and after.channel:
+                        moderator = await moderator_index.resolve(
+                            member.guild, discord.AuditLogAction.member_move, after.channel.id, at
+                        )
+                    elif before.channel:
+                        moderator = await moderator_index.resolve(
+                            member.guild, discord.AuditLogAction.member_disconnect, at=at
+                        )
                 
                 if moderator:
-                    logger.info(f"🎯 Moderador encontrado: {moderator.name}")
-                else:
-                    logger.warning(f"❌ Nenhum moderador encontrado para {member.name} (ID: {member.id})")
-                            
+                    logger.debug("🎯 Moderador encontrado para %s (ID: %s): %s", member.name, member.id, moderator.name)
             except Exception as e:
-                logger.warning(f"❌ Não foi possível acessar audit log: {e}")
+                logger.warning("❌ Não foi possível identificar o moderador: %s", e)
                 moderator = None
             
-            # Usuário entrou em um canal
-            if not before.channel and after.channel:
-                if moderator:
-                    embed = audit_logger.create_voice_embed(
-                        user=member,
-                        action="foi movido para o canal de voz",
-                        channel_name=after.channel.name,
-                        channel_emoji="💬",
-                        moderator=moderator,
-                        guild=member.guild
-                    )
-                else:
-                    embed = audit_logger.create_voice_embed(
-                        user=member,
-                        action="entrou no canal de voz",
-                        channel_name=after.channel.name,
-                        channel_emoji="💬",
-                        guild=member.guild
-                    )
-                await audit_logger.send_voice_embed(member.guild, embed)
-                logger.info(f"Usuário {member.name} entrou no canal {after.channel.name}")
+            if voice_analytics and moderator:
+                voice_analytics.observe_moderator(member.guild.id, moderator, after.channel is None)
             
-            # Usuário saiu de um canal
-            elif before.channel and not after.channel:
-                if moderator:
-                    embed = audit_logger.create_voice_embed(
-                        user=member,
-                        action="foi removido do canal de voz",
-                        channel_name=before.channel.name,
-                        channel_emoji="💬",
-                        moderator=moderator,
-                        guild=member.guild
-                    )
-                else:
-                    embed = audit_logger.create_voice_embed(
-                        user=member,
-                        action="saiu do canal de voz",
-                        channel_name=before.channel.name,
-                        channel_emoji="💬",
-                        guild=member.guild
-                    )
-                await audit_logger.send_voice_embed(member.guild, embed)
-                logger.info(f"Usuário {member.name} saiu do canal {before.channel.name}")
+            # Com moderator_only, movimentações sem moderador param aqui
+            if event_filter.check_moderator(member.guild, moderator):
+                return
             
-            # Usuário mudou de canal
-            elif before.channel and after.channel:
-                # Sempre mostrar duas mensagens, mas com o moderador na ação
-                embed1 = audit_logger.create_voice_embed(
-                    user=member,
-                    action="saiu do canal de voz",
-                    channel_name=before.channel.name,
-                    channel_emoji="💬",
-                    moderator=moderator,
-                    guild=member.guild
-                )
-                await audit_logger.send_voice_embed(member.guild, embed1)
-                
-                embed2 = audit_logger.create_voice_embed(
-                    user=member,
-                    action="entrou no canal de voz",
-                    channel_name=after.channel.name,
-                    channel_emoji="💬",
-                    moderator=moderator,
-                    guild=member.guild
-                )
-                await audit_logger.send_voice_embed(member.guild, embed2)
-                logger.info(f"Usuário {member.name} mudou de {before.channel.name} para {after.channel.name}")
+            if moderator is None and voice_sessions.enabled:
+                # Movimentação própria: agrupada com as próximas do mesmo membro
+                with profiler.phase('voice.session'):
+                    journal_key = audit_logger.record_event(voice_event(member, before.channel, after.channel, created_at=at))
+                    voice_sessions.observe(member, before.channel, after.channel, at, journal_key)
+            else:
+                # Ação de moderador sai na hora, depois da sequência pendente do membro
+                voice_sessions.flush_member(member)
+                # Um único registro por evento; a troca de canal vira dois embeds no envio
+                record = voice_event(member, before.channel, after.channel, moderator)
+                await audit_logger.send_voice_event(member.guild, record)
+            
+            if not before.channel:
+                logger.info("Usuário %s entrou no canal %s", member.name, after.channel.name)
+            elif not after.channel:
+                logger.info("Usuário %s saiu do canal %s", member.name, before.channel.name)
+            else:
+                logger.info("Usuário %s mudou de %s para %s", member.name, before.channel.name, after.channel.name)
     
     except Exception as e:
-        logger.error(f"Erro ao processar mudança de canal de voz: {e}")
+        logger.error("Erro ao processar mudança de canal de voz: %s", e)
 
 # Comentado: on_member_remove requer intents privilegiados
 # @bot.event
@@ -343,11 +857,11 @@ async def on_voice_state_update(member, before, after):
 #     pass
 
 # Comando para testar o bot
-@bot.command(name='teste')
+@bot.hybrid_command(name='teste')
 async def test_command(ctx):
     """Comando para testar se o bot está funcionando"""
     try:
-        logger.info(f"Comando !teste executado por {ctx.author.name}")
+        logger.info("Comando !teste executado por %s", ctx.author.name)
         
         # Criar embed bonito como no print
         embed = discord.Embed(
@@ -367,27 +881,35 @@ async def test_command(ctx):
         logger.info("Resposta do comando !teste enviada com sucesso")
         
     except Exception as e:
-        logger.error(f"Erro no comando !teste: {e}")
+        logger.error("Erro no comando !teste: %s", e)
         try:
             await ctx.send(f"❌ Erro no comando: {e}")
         except:
             logger.error("Não foi possível enviar mensagem de erro")
 
 # Comando simples para debug
-@bot.command(name='ping')
+@bot.hybrid_command(name='ping')
 async def ping_command(ctx):
     """Comando simples para testar conectividade"""
     try:
         await ctx.send("🏓 Pong!")
-        logger.info(f"Comando !ping executado por {ctx.author.name}")
+        logger.info("Comando !ping executado por %s", ctx.author.name)
     except Exception as e:
-        logger.error(f"Erro no comando !ping: {e}")
+        logger.error("Erro no comando !ping: %s", e)
 
 # Comando para debug
-@bot.command(name='debug')
+@bot.hybrid_command(name='debug')
 async def debug_command(ctx):
     """Comando para debug do bot"""
     try:
+        scheduler = audit_logger.scheduler
+        gateway_events = shard_monitor.gateway_events
+        top_events = ', '.join(f"{name}: {count}" for name, count in gateway_events.most_common(5))
+        if event_filter.active:
+            dropped = event_filter.dropped()
+            filter_summary = f"{sum(dropped.values())} evento(s) descartados ({', '.join(f'{rule}: {count}' for rule, count in dropped.most_common(3)) or 'nenhum'})"
+        else:
+            filter_summary = f"sem regras carregadas de {event_filter.path}"
         info = f"""
 **Debug do Bot:**
 - Bot: {bot.user}
@@ -397,17 +919,280 @@ async def debug_command(ctx):
 - Prefixo: {bot.command_prefix}
 - Comandos: {len(bot.commands)}
 - Intents: {bot.intents}
+- Eventos enfileirados: {scheduler.stats['events']}
+- Mensagens enviadas: {scheduler.stats['messages']} (economizadas: {scheduler.stats['messages_saved']})
+- Fila de entrega: {scheduler.depth(ctx.guild.id)} neste servidor, {scheduler.total_depth()} no total
+- Espera na fila (p50/p99): {scheduler.wait_percentile(50):.2f}s / {scheduler.wait_percentile(99):.2f}s
+- Descartados por sobrecarga: {scheduler.stats['dropped']}
+- Falhas de envio: {scheduler.stats['failures']} ({', '.join(f"{reason}: {count}" for reason, count in scheduler.errors.most_common(3)) or 'nenhuma'}), canais pausados: {audit_logger.breaker.open_count()}
+- Sessões de voz: {len(voice_sessions)} abertas, {voice_sessions.stats['chains']} sequências agrupadas, {voice_sessions.stats['reconnects']} reconexões ignoradas
+- Filtros: {filter_summary}
+- Bans em massa: {ban_bursts.stats['bursts']} sequência(s), {ban_bursts.stats['absorbed']} ban(s)/unban(s) resumidos
+- Modo de entrega: {DELIVERY_MODE}
+- Shard: {ctx.guild.shard_id} ({bot.shard_count or 1} no total) - latência {bot.latency * 1000:.0f}ms
+- Modo de comandos: {COMMAND_MODE}
+- Inicialização: {startup.summary() or 'em andamento'}
+- Memória (RSS): {process_rss_bytes() / 1024 / 1024:.1f} MB
+- Eventos do gateway: {sum(gateway_events.values())} ({top_events or 'nenhum contado'})
         """
         await ctx.send(info)
-        logger.info(f"Comando !debug executado por {ctx.author.name}")
+        logger.info("Comando !debug executado por %s", ctx.author.name)
     except Exception as e:
-        logger.error(f"Erro no comando !debug: {e}")
+        logger.error("Erro no comando !debug: %s", e)
+
+def format_duration(seconds):
+    """Formata segundos como '3h 05min'"""
+    minutes = int(seconds // 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}min" if hours else f"{minutes}min"
+
+# Rankings de voz a partir dos agregados (sem reler logs)
+@bot.hybrid_command(name='topvoz')
+async def top_voice_command(ctx, tipo: str = 'membros', quantidade: int = 10):
+    """Ranking de tempo em voz: 'membros', 'canais' ou 'moderadores'"""
+    try:
+        if not voice_analytics:
+            await ctx.send("ℹ️ Estatísticas de voz desativadas (VOICE_ANALYTICS_ENABLED=false).")
+            return
+        quantidade = max(1, min(quantidade, 25))
+        
+        if tipo == 'canais':
+            title = "🔊 Canais mais usados"
+            lines = [f"{i}. <#{channel_id}> - {format_duration(seconds)}"
+                     for i, (channel_id, seconds) in enumerate(voice_analytics.top_channels(ctx.guild.id, quantidade), 1)]
+        elif tipo == 'moderadores':
+            title = "👮 Moderadores que mais moveram/desconectaram"
+            lines = [f"{i}. <@{moderator_id}> - {moves} movimentação(ões), {disconnects} desconexão(ões)"
+                     for i, (moderator_id, moves, disconnects) in enumerate(voice_analytics.top_moderators(ctx.guild.id, quantidade), 1)]
+        else:
+            title = "🎧 Membros com mais tempo em voz"
+            lines = [f"{i}. <@{member_id}> - {format_duration(seconds)}"
+                     for i, (member_id, seconds) in enumerate(voice_analytics.top_members(ctx.guild.id, quantidade), 1)]
+        
+        embed = discord.Embed(title=title, description="\n".join(lines) or "Sem dados ainda.", color=0x00ff00)
+        await ctx.send(embed=embed)
+        logger.info("Comando !topvoz executado por %s", ctx.author.name)
+    except Exception as e:
+        logger.error("Erro no comando !topvoz: %s", e)
+
+@bot.hybrid_command(name='tempovoz')
+async def voice_time_command(ctx, membro: discord.Member = None, dias: int = 7):
+    """Tempo em voz de um membro por dia nos últimos dias"""
+    try:
+        if not voice_analytics:
+            await ctx.send("ℹ️ Estatísticas de voz desativadas (VOICE_ANALYTICS_ENABLED=false).")
+            return
+        membro = membro or ctx.author
+        dias = max(1, min(dias, 31))
+        per_day = voice_analytics.member_time(ctx.guild.id, membro.id, dias)
+        total = sum(seconds for _, seconds in per_day)
+        
+        lines = [
+            f"{datetime.fromtimestamp(day * 86400, timezone.utc).strftime('%d/%m')}: {format_duration(seconds)}"
+            for day, seconds in per_day if seconds
+        ]
+        embed = discord.Embed(
+            title=f"🎧 Tempo em voz de {membro.display_name}",
+            description="\n".join(lines) or "Nenhum tempo em voz no período.",
+            color=0x00ff00,
+        )
+        embed.add_field(name=f"Total em {dias} dia(s)", value=format_duration(total), inline=False)
+        await ctx.send(embed=embed)
+        logger.info("Comando !tempovoz executado por %s", ctx.author.name)
+    except Exception as e:
+        logger.error("Erro no comando !tempovoz: %s", e)
+
+# Histórico de auditoria do journal, com filtros e páginas (quem pode ver o audit log)
+@bot.hybrid_command(name='historico')
+@commands.guild_only()
+@commands.has_permissions(view_audit_log=True)
+async def history_command(ctx, *, filtros: HistoryFlags):
+    """Eventos de auditoria do servidor filtrados por usuário, moderador, tipo e dias"""
+    try:
+        if not audit_logger.journal:
+            await ctx.send("ℹ️ Histórico indisponível: o journal está desativado (JOURNAL_ENABLED=false).")
+            return
+        kind = None
+        if filtros.tipo is not None:
+            kind = HISTORY_KINDS.get(filtros.tipo.lower())
+            if kind is None:
+                await ctx.send(f"❌ Tipo desconhecido. Use: {', '.join(HISTORY_KINDS)}.")
+                return
+        dias = max(1, min(filtros.dias, audit_logger.journal.retention_days))
+        
+        view = HistoryView(
+            audit_logger.journal, ctx.guild.id, ctx.author.id,
+            {
+                'target_id': filtros.usuario.id if filtros.usuario else None,
+                'moderator_id': filtros.moderador.id if filtros.moderador else None,
+                'kind': kind,
+                'since': time.time() - dias * 86400,
+            },
+        )
+        with profiler.phase('history.search'):
+            embed = await view.render()
+        view.message = await ctx.send(embed=embed, view=view)
+        logger.info("Comando !historico executado por %s", ctx.author.name)
+    except Exception as e:
+        logger.error("Erro no comando !historico: %s", e)
+
+@history_command.error
+async def history_command_error(ctx, error):
+    if isinstance(error, commands.MissingPermissions):
+        await ctx.send("❌ É preciso ter a permissão 'Ver registro de auditoria' para usar este comando.")
+    elif isinstance(error, commands.BadArgument):
+        await ctx.send("❌ Filtros inválidos. Exemplo: `!historico usuario: @Fulano tipo: ban dias: 30`")
+    else:
+        logger.error("Erro no comando !historico: %s", error)
+
+# Exportação completa do audit log em JSONL/CSV compactado (quem pode ver o audit log)
+@bot.hybrid_command(name='exportar')
+@commands.guild_only()
+@commands.has_permissions(view_audit_log=True)
+@commands.bot_has_permissions(view_audit_log=True)
+async def export_command(ctx, formato: str = 'jsonl', acoes: str = 'todas', dias: int = 0):
+    """Exporta o audit log (ações separadas por vírgula, ex.: ban,unban); repetir retoma uma exportação interrompida"""
+    try:
+        formato = formato.lower()
+        if formato not in EXPORT_FORMATS:
+            await ctx.send(f"❌ Formato desconhecido. Use: {', '.join(EXPORT_FORMATS)}.")
+            return
+        try:
+            actions = parse_actions(acoes)
+        except ValueError as e:
+            await ctx.send(f"❌ {e}. Exemplos: ban, unban, kick, member_move, member_disconnect.")
+            return
+        if ctx.guild.id in exporter.running:
+            await ctx.send("⏳ Já existe uma exportação em andamento neste servidor.")
+            return
+        
+        await ctx.defer()
+        dias = max(0, dias)
+        path = default_path(ctx.guild.id, actions, formato, dias)
+        status = await ctx.send(f"⏳ Exportando o audit log ({acoes}, {formato})...")
+        last_update = time.monotonic()
+        
+        async def progress(entries):
+            nonlocal last_update
+            if time.monotonic() - last_update < EXPORT_PROGRESS_INTERVAL:
+                return
+            last_update = time.monotonic()
+            try:
+                await status.edit(content=f"⏳ Exportando o audit log ({acoes}, {formato})... {entries} entradas")
+            except discord.HTTPException:
+                pass
+        
+        with profiler.phase('export.audit_log'):
+            result = await exporter.export(ctx.guild, path, actions, formato, dias, progress)
+        summary = f"✅ {ctx.author.mention} {result.entries} entrada(s) exportada(s)"
+        if result.resumed:
+            summary += f" ({result.resumed} retomadas de uma exportação interrompida)"
+        # A exportação pode passar dos 15 minutos de validade da interação: responder no canal
+        if result.size <= ctx.guild.filesize_limit:
+            await ctx.channel.send(summary, file=discord.File(result.path))
+        else:
+            await ctx.channel.send(f"{summary}. Arquivo grande demais para anexar ({result.size / 1024 / 1024:.1f} MB), gravado em `{result.path}`.")
+        logger.info("Comando !exportar executado por %s", ctx.author.name)
+    except ValueError as e:
+        await ctx.channel.send(f"❌ {e}. Repita com os mesmos parâmetros para continuar ou apague o arquivo.")
+    except Exception as e:
+        logger.error("Erro no comando !exportar: %s", e)
+        await ctx.channel.send(f"❌ Exportação interrompida: {e}. Execute o comando novamente para continuar de onde parou.")
+
+@export_command.error
+async def export_command_error(ctx, error):
+    if isinstance(error, commands.MissingPermissions):
+        await ctx.send("❌ É preciso ter a permissão 'Ver registro de auditoria' para usar este comando.")
+    elif isinstance(error, commands.BotMissingPermissions):
+        await ctx.send("❌ O bot precisa da permissão 'Ver registro de auditoria' para exportar.")
+    else:
+        logger.error("Erro no comando !exportar: %s", error)
+
+# Tempos por fase dos handlers e profiler por amostragem (apenas administradores)
+@bot.hybrid_command(name='stats')
+@commands.has_permissions(administrator=True)
+async def stats_command(ctx, acao: str = None, segundos: int = 30):
+    """Percentis por fase e eventos mais lentos; 'perfil [segundos]' grava um perfil, 'parar' encerra"""
+    try:
+        if acao == 'perfil':
+            sampler = profiler.start_sampling(segundos)
+            if sampler is None:
+                await ctx.send("⏳ Já existe um perfil em andamento. Use `!stats parar` para encerrá-lo.")
+            else:
+                await ctx.send(f"🔬 Perfil por amostragem iniciado por {sampler.duration:.0f}s, será gravado em `{sampler.path}`")
+            return
+        if acao == 'parar':
+            sampler = profiler.stop_sampling()
+            await ctx.send(f"🛑 Perfil encerrado, gravando em `{sampler.path}`" if sampler else "Nenhum perfil em andamento.")
+            return
+        
+        if not profiler.enabled:
+            await ctx.send("ℹ️ Medição por fase desativada (PROFILE_ENABLED=false).")
+            return
+        
+        lines = [f"{'fase':<34} {'n':>7} {'p50':>8} {'p95':>8} {'p99':>8}"]
+        for name, count, p50, p95, p99 in profiler.summary()[:12]:
+            lines.append(f"{name:<34} {count:>7} {p50 * 1000:>6.1f}ms {p95 * 1000:>6.1f}ms {p99 * 1000:>6.1f}ms")
+        
+        slow = []
+        for trace in profiler.slowest(5):
+            phases = ', '.join(f"{name} {duration * 1000:.1f}ms" for name, duration in trace.phases[:4])
+            slow.append(f"- {trace.handler} {trace.total * 1000:.1f}ms (servidor {trace.guild_id}): {phases or 'sem fases'}")
+        
+        message = "**Tempos por fase:**\n```\n" + "\n".join(lines) + "\n```"
+        if slow:
+            message += "\n**Eventos recentes mais lentos:**\n" + "\n".join(slow)
+        if profiler.sampling:
+            message += "\n🔬 Perfil por amostragem em andamento"
+        await ctx.send(message[:2000])
+        logger.info("Comando !stats executado por %s", ctx.author.name)
+    except Exception as e:
+        logger.error("Erro no comando !stats: %s", e)
+
+@stats_command.error
+async def stats_command_error(ctx, error):
+    if isinstance(error, commands.MissingPermissions):
+        await ctx.send("❌ Apenas administradores podem usar este comando.")
+    else:
+        logger.error("Erro no comando !stats: %s", error)
+
+@bot.hybrid_command(name='memoria')
+@commands.has_permissions(administrator=True)
+async def memory_command(ctx):
+    """Memória do processo e itens/bytes aproximados de cada cache"""
+    try:
+        usage = sorted(memory_usage(), key=lambda item: item.bytes, reverse=True)
+        lines = [f"{'cache':<30} {'itens':>8} {'KB':>9} {'limite':>7}"]
+        for item in usage:
+            limit = '-' if item.limit is None else item.limit
+            lines.append(f"{item.name:<30} {item.entries:>8} {item.bytes / 1024:>9.1f} {limit:>7}")
+        evictions = sum(cache.evictions for cache in audit_logger.caches().values())
+        swept = ', '.join(f"{name}: {count}" for name, count in cache_sweeper.stats.most_common()) or 'nenhum'
+        message = (
+            f"**Memória (RSS):** {process_rss_bytes() / 1024 / 1024:.1f} MB, "
+            f"caches ~{sum(item.bytes for item in usage) / 1024 / 1024:.1f} MB\n"
+            "```\n" + "\n".join(lines) + "\n```"
+            f"Despejos por limite (LRU): {evictions} - itens expirados descartados: {swept}"
+        )
+        await ctx.send(message[:2000])
+        logger.info("Comando !memoria executado por %s", ctx.author.name)
+    except Exception as e:
+        logger.error("Erro no comando !memoria: %s", e)
+
+@memory_command.error
+async def memory_command_error(ctx, error):
+    if isinstance(error, commands.MissingPermissions):
+        await ctx.send("❌ Apenas administradores podem usar este comando.")
+    else:
+        logger.error("Erro no comando !memoria: %s", error)
 
 # Comando para testar audit log
-@bot.command(name='audit')
+@bot.hybrid_command(name='audit')
 async def audit_command(ctx):
     """Comando para testar audit log"""
     try:
+        # A consulta ao audit log pode passar do limite de 3s de uma interação
+        await ctx.defer()
         embed = discord.Embed(
             title="📋 Teste de Audit Log",
             description="Verificando se o bot tem acesso ao audit log...",
@@ -439,12 +1224,12 @@ async def audit_command(ctx):
             embed.add_field(name="Solução", value="O bot precisa da permissão 'View Audit Log'. Siga o guia de reinstalação.", inline=False)
         
         await ctx.send(embed=embed)
-        logger.info(f"Comando !audit executado por {ctx.author.name}")
+        logger.info("Comando !audit executado por %s", ctx.author.name)
     except Exception as e:
-        logger.error(f"Erro no comando !audit: {e}")
+        logger.error("Erro no comando !audit: %s", e)
         await ctx.send(f"❌ Erro geral: {e}")
 
-@bot.command(name='testmove')
+@bot.hybrid_command(name='testmove')
 async def test_move_detection(ctx):
     """Testa a detecção de movimentação em tempo real"""
     embed = discord.Embed(
@@ -465,7 +1250,7 @@ async def test_move_detection(ctx):
     await ctx.send(embed=embed)
 
 # Comando para verificar configurações
-@bot.command(name='config')
+@bot.hybrid_command(name='config')
 async def config_command(ctx):
     """Mostra as configurações atuais do bot"""
     audit_channel = await audit_logger.get_audit_channel(ctx.guild)
@@ -478,15 +1263,19 @@ async def config_command(ctx):
     embed.add_field(name="Nome do Canal", value=audit_logger.audit_channel_name, inline=True)
     embed.add_field(name="Servidor", value=ctx.guild.name, inline=True)
     
+    pinned_id = audit_logger.pinned_channels.get(ctx.guild.id)
+    if pinned_id:
+        embed.add_field(name="Canal Fixado (ID)", value=str(pinned_id), inline=True)
+    
     # Verificar permissões
     if audit_channel:
-        perms = audit_channel.permissions_for(ctx.guild.me)
-        embed.add_field(name="Permissões no Canal", value="✅ Enviar Mensagens" if perms.send_messages else "❌ Enviar Mensagens", inline=True)
+        can_send = audit_logger.can_send(ctx.guild)
+        embed.add_field(name="Permissões no Canal", value="✅ Enviar Mensagens" if can_send else "❌ Enviar Mensagens", inline=True)
     
     await ctx.send(embed=embed)
 
 # Comando para verificar permissões
-@bot.command(name='perms')
+@bot.hybrid_command(name='perms')
 async def perms_command(ctx):
     """Verifica as permissões do bot no servidor"""
     embed = discord.Embed(
@@ -515,7 +1304,7 @@ async def perms_command(ctx):
     await ctx.send(embed=embed)
 
 # Comando para mostrar permissões necessárias
-@bot.command(name='permissoes')
+@bot.hybrid_command(name='permissoes')
 async def permissoes_command(ctx):
     """Mostra quais permissões o bot precisa ter"""
     embed = discord.Embed(
@@ -567,12 +1356,29 @@ async def permissoes_command(ctx):
     
     await ctx.send(embed=embed)
 
-if __name__ == "__main__":
+async def main():
+    """Inicia o bot e encerra de forma limpa ao receber SIGTERM"""
+    async with bot:
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGTERM, lambda: asyncio.ensure_future(bot.close()))
+        except NotImplementedError:
+            # Windows não suporta add_signal_handler
+            pass
+        await bot.start(DISCORD_TOKEN)
+
+def run():
+    """Ponto de entrada do processo (também usado pelos workers do cluster.py)"""
     if not DISCORD_TOKEN:
         logger.error("Token do Discord não encontrado!")
         exit(1)
     
     try:
-        bot.run(DISCORD_TOKEN)
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
     except Exception as e:
-        logger.error(f"Erro ao iniciar o bot: {e}")
+        logger.error("Erro ao iniciar o bot: %s", e)
+
+if __name__ == "__main__":
+    run()
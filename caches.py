@@ -0,0 +1,198 @@
+"""Limites do estado em memória e relatório de uso por cache
+
+Os caches do discord.py são configurados no bot.py (MESSAGE_CACHE_SIZE,
+MEMBER_CACHE_FLAGS e CHUNK_GUILDS_AT_STARTUP): o bot só precisa de canais,
+cargos, estados de voz e dos membros que estão em canais de voz.
+
+O estado que o próprio bot guarda por servidor ou canal tem dois tipos de
+limite:
+    LRUCache        índices que podem ser refeitos sob demanda (canal de
+                    auditoria, canal alternativo, webhooks); no máximo
+                    GUILD_CACHE_MAX itens, o menos usado sai primeiro
+    sweep()         estado com validade (entradas do audit log, janelas de
+                    bans, circuitos fechados, falhas de webhook): cada
+                    componente descarta o que expirou quando o CacheSweeper
+                    o chama, a cada CACHE_SWEEP_INTERVAL segundos
+
+memory_report mede entradas e bytes aproximados de cada cache (por
+amostragem), mostrado no !memoria e nas métricas.
+"""
+import asyncio
+import itertools
+import logging
+import sys
+from collections import Counter, OrderedDict, deque
+from typing import NamedTuple
+
+from config import GUILD_CACHE_MAX, CACHE_SWEEP_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Itens medidos por cache; o total é extrapolado pela média
+SAMPLE_SIZE = 64
+
+# Valores contados junto com o objeto que os guarda
+_SCALARS = (str, bytes, int, float, bool, type(None))
+_SEQUENCES = (tuple, list, deque, set, frozenset)
+
+
+class LRUCache(OrderedDict):
+    """Dicionário com no máximo max_size itens; ao passar do limite, sai o usado há mais tempo"""
+
+    def __init__(self, max_size=GUILD_CACHE_MAX):
+        super().__init__()
+        self.max_size = max_size
+        self.evictions = 0
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def get(self, key, default=None):
+        # O get do OrderedDict não passa pelo __getitem__
+        if key in self:
+            return self[key]
+        return default
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        if self.max_size and len(self) > self.max_size:
+            self.popitem(last=False)
+            self.evictions += 1
+
+
+class CacheUsage(NamedTuple):
+    name: str
+    entries: int
+    bytes: int
+    # Limite de itens (None = limitado por outro critério, como TTL ou a quantidade de servidores)
+    limit: int
+
+
+def estimate_size(obj, depth=2, root=True):
+    """Bytes do objeto e do que ele guarda, até `depth` níveis
+
+    Objetos do discord.py referenciados por outro (servidor, membro, estado da
+    conexão) não são seguidos: eles são contados no próprio cache.
+    """
+    size = sys.getsizeof(obj)
+    if isinstance(obj, _SCALARS) or depth <= 0:
+        return size
+    if isinstance(obj, dict):
+        return size + sum(estimate_size(key, depth - 1, False) + estimate_size(value, depth - 1, False)
+                          for key, value in obj.items())
+    if isinstance(obj, _SEQUENCES):
+        return size + sum(estimate_size(item, depth - 1, False) for item in obj)
+    if not root and type(obj).__module__.startswith('discord'):
+        return size
+    values = []
+    for cls in type(obj).__mro__:
+        for slot in getattr(cls, '__slots__', ()):
+            if hasattr(obj, slot):
+                values.append(getattr(obj, slot))
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+        values.extend(obj.__dict__.values())
+    return size + sum(estimate_size(value, depth - 1, False) for value in values if not callable(value))
+
+
+def sampled_size(items, count, depth=2):
+    """Bytes aproximados de `count` itens a partir dos primeiros SAMPLE_SIZE"""
+    sample = list(itertools.islice(items, SAMPLE_SIZE))
+    if not sample:
+        return 0
+    return int(sum(estimate_size(item, depth) for item in sample) / len(sample) * count)
+
+
+def container_usage(name, container, depth=3):
+    """Uso de um dicionário/conjunto/fila do próprio bot"""
+    count = len(container)
+    size = sys.getsizeof(container)
+    if isinstance(container, dict):
+        size += sampled_size(container.items(), count, depth)
+    else:
+        size += sampled_size(iter(container), count, depth)
+    return CacheUsage(name, count, size, getattr(container, 'max_size', None))
+
+
+def discord_usage(bot):
+    """Caches do discord.py: servidores, canais, cargos, membros, estados de voz, usuários e mensagens"""
+    state = bot._connection
+    guilds = list(bot.guilds)
+
+    def collect(name, attribute):
+        count = sum(len(getattr(guild, attribute)) for guild in guilds)
+        items = itertools.chain.from_iterable(getattr(guild, attribute).values() for guild in guilds)
+        return CacheUsage(name, count, sampled_size(items, count), None)
+
+    usage = [
+        # depth=1: os dicionários do servidor contam só a própria tabela, os itens estão nos caches abaixo
+        CacheUsage('discord.guilds', len(guilds), sampled_size(iter(guilds), len(guilds), depth=1), None),
+        collect('discord.channels', '_channels'),
+        collect('discord.threads', '_threads'),
+        collect('discord.roles', '_roles'),
+        collect('discord.members', '_members'),
+        collect('discord.voice_states', '_voice_states'),
+    ]
+    users = list(state._users.values())
+    usage.append(CacheUsage('discord.users', len(users), sampled_size(iter(users), len(users)), None))
+    emojis = len(state._emojis) + len(state._stickers)
+    usage.append(CacheUsage(
+        'discord.emojis', emojis,
+        sampled_size(itertools.chain(state._emojis.values(), state._stickers.values()), emojis), None,
+    ))
+    messages = state._messages
+    usage.append(CacheUsage(
+        'discord.messages', len(messages) if messages is not None else 0,
+        sampled_size(iter(messages), len(messages)) if messages else 0,
+        messages.maxlen if messages is not None else 0,
+    ))
+    return usage
+
+
+def memory_report(bot, components):
+    """Uso de memória por cache: os do discord.py e os de cada componente (método caches())"""
+    usage = discord_usage(bot)
+    for component in components:
+        if component is None:
+            continue
+        for name, container in component.caches().items():
+            usage.append(container_usage(name, container))
+    return usage
+
+
+class CacheSweeper:
+    """Chama sweep() dos componentes periodicamente para descartar o estado expirado"""
+
+    def __init__(self, components, interval=CACHE_SWEEP_INTERVAL):
+        self.components = [component for component in components if component is not None]
+        self.interval = interval
+        self._task = None
+        # Itens descartados por componente
+        self.stats = Counter()
+
+    def sweep(self):
+        for component in self.components:
+            try:
+                removed = component.sweep()
+            except Exception as e:
+                logger.error("Erro ao limpar o cache de %s: %s", type(component).__name__, e)
+                continue
+            if removed:
+                self.stats[type(component).__name__] += removed
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.ensure_future(self._loop())
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.sweep()
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
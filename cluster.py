@@ -0,0 +1,149 @@
+"""Inicia o bot em vários processos, cada um com um grupo de shards
+
+Cada worker é um processo separado rodando um AutoShardedBot com parte dos
+shards, para usar mais de um núcleo sem rodar cópias independentes do bot.
+
+Uso:
+    python cluster.py                       # shards recomendados pelo Discord, CLUSTER_WORKERS processos
+    python cluster.py --shards 8 --workers 4
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+from config import DISCORD_TOKEN, SHARD_COUNT, CLUSTER_WORKERS
+
+logger = logging.getLogger('cluster')
+
+# O Discord permite um IDENTIFY a cada 5 segundos (max_concurrency = 1)
+IDENTIFY_INTERVAL = 5.0
+
+# Espera antes de reiniciar um worker que caiu
+RESTART_DELAY = 10.0
+
+
+def shard_groups(shard_count, workers):
+    """Divide os shards em grupos contíguos, um por worker"""
+    workers = max(1, min(workers, shard_count))
+    size, extra = divmod(shard_count, workers)
+    groups = []
+    start = 0
+    for index in range(workers):
+        end = start + size + (1 if index < extra else 0)
+        groups.append(list(range(start, end)))
+        start = end
+    return groups
+
+
+async def recommended_shard_count(token):
+    """Consulta a quantidade de shards recomendada pelo Discord"""
+    import discord
+
+    http = discord.http.HTTPClient(asyncio.get_running_loop())
+    try:
+        await http.static_login(token)
+        shards, _ = await http.get_bot_gateway()
+        return shards
+    finally:
+        await http.close()
+
+
+def run_worker(cluster_id, shard_ids, shard_count, start_delay):
+    """Ponto de entrada do processo worker"""
+    # O config é lido na importação do bot, então o ambiente vem antes
+    os.environ['CLUSTER_ID'] = str(cluster_id)
+    os.environ['SHARD_COUNT'] = str(shard_count)
+    os.environ['SHARD_IDS'] = ','.join(map(str, shard_ids))
+    # Arquivos locais separados por worker (log rotacionado, journal SQLite e checkpoint)
+    log_file = os.environ.get('LOG_FILE', 'bot.log')
+    if log_file:
+        root, ext = os.path.splitext(log_file)
+        os.environ['LOG_FILE'] = f"{root}.cluster{cluster_id}{ext}"
+    journal_path = os.environ.get('JOURNAL_PATH', 'audit_journal.db')
+    root, ext = os.path.splitext(journal_path)
+    os.environ['JOURNAL_PATH'] = f"{root}.cluster{cluster_id}{ext}"
+    checkpoint_path = os.environ.get('CHECKPOINT_PATH', 'gateway_checkpoint.json')
+    root, ext = os.path.splitext(checkpoint_path)
+    os.environ['CHECKPOINT_PATH'] = f"{root}.cluster{cluster_id}{ext}"
+    analytics_path = os.environ.get('VOICE_ANALYTICS_PATH', 'voice_analytics.json')
+    root, ext = os.path.splitext(analytics_path)
+    os.environ['VOICE_ANALYTICS_PATH'] = f"{root}.cluster{cluster_id}{ext}"
+    # Uma porta de saúde/métricas por worker, a partir da porta base
+    base_port = int(os.environ.get('HEALTH_PORT', os.environ.get('PORT', '8080')))
+    os.environ['HEALTH_PORT'] = str(base_port + cluster_id)
+
+    # Escalonar os IDENTIFYs entre os processos
+    time.sleep(start_delay)
+
+    import bot
+    bot.run()
+
+
+def start_worker(context, cluster_id, shard_ids, shard_count, start_delay):
+    process = context.Process(
+        target=run_worker,
+        args=(cluster_id, shard_ids, shard_count, start_delay),
+        name=f"botrevenge-cluster-{cluster_id}",
+    )
+    process.start()
+    logger.info("Worker %s iniciado (pid %s) com os shards %s", cluster_id, process.pid, shard_ids)
+    return process
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inicia o bot em vários processos com grupos de shards")
+    parser.add_argument('--shards', type=int, default=SHARD_COUNT, help="total de shards (padrão: recomendado pelo Discord)")
+    parser.add_argument('--workers', type=int, default=CLUSTER_WORKERS, help="quantidade de processos")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if not DISCORD_TOKEN:
+        logger.error("Token do Discord não encontrado!")
+        sys.exit(1)
+
+    shard_count = args.shards or asyncio.run(recommended_shard_count(DISCORD_TOKEN))
+    groups = shard_groups(shard_count, args.workers)
+    logger.info("Iniciando %s shard(s) em %s worker(s)", shard_count, len(groups))
+
+    context = multiprocessing.get_context('spawn')
+    processes = {}
+    shards_before = 0
+    for cluster_id, shard_ids in enumerate(groups):
+        delay = shards_before * IDENTIFY_INTERVAL
+        processes[cluster_id] = start_worker(context, cluster_id, shard_ids, shard_count, delay)
+        shards_before += len(shard_ids)
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for process in processes.values():
+            if process.is_alive():
+                # Os workers tratam SIGTERM esvaziando as filas de entrega
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    # Supervisionar: reiniciar workers que caírem
+    while not stopping:
+        time.sleep(1.0)
+        for cluster_id, process in list(processes.items()):
+            if not process.is_alive() and not stopping:
+                logger.warning("Worker %s saiu com código %s, reiniciando em %.0fs",
+                               cluster_id, process.exitcode, RESTART_DELAY)
+                processes[cluster_id] = start_worker(context, cluster_id, groups[cluster_id], shard_count, RESTART_DELAY)
+
+    for process in processes.values():
+        process.join(timeout=30)
+
+
+if __name__ == '__main__':
+    main()
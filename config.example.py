@@ -8,12 +8,223 @@ load_dotenv()
 DISCORD_TOKEN = os.getenv('DISCORD_TOKEN')  # Adicione seu token aqui
 AUDIT_CHANNEL_NAME = os.getenv('AUDIT_CHANNEL_NAME', '🔐╺╸auditoria')
 
+# URLs da API REST e do gateway (vazio = Discord). O bench.e2e aponta as duas para o
+# servidor falso local (bench.fakediscord)
+DISCORD_API_BASE = os.getenv('DISCORD_API_BASE', '')
+DISCORD_GATEWAY_URL = os.getenv('DISCORD_GATEWAY_URL', '')
+
+
+def _parse_id_map(value):
+    """Converte 'guild_id:channel_id,guild_id:channel_id' em dicionário de IDs"""
+    mapping = {}
+    for pair in (value or '').split(','):
+        if ':' not in pair:
+            continue
+        guild_id, channel_id = pair.split(':', 1)
+        if guild_id.strip().isdigit() and channel_id.strip().isdigit():
+            mapping[int(guild_id)] = int(channel_id)
+    return mapping
+
+
+def _parse_url_map(value):
+    """Converte 'guild_id:url,guild_id:url' em dicionário guild_id -> URL"""
+    mapping = {}
+    for pair in (value or '').split(','):
+        if ':' not in pair:
+            continue
+        guild_id, url = pair.split(':', 1)
+        if guild_id.strip().isdigit() and url.strip():
+            mapping[int(guild_id)] = url.strip()
+    return mapping
+
+
+# Canal de auditoria fixado por ID em cada servidor (tem prioridade sobre o nome)
+# Exemplo: AUDIT_CHANNEL_IDS=123456789012345678:234567890123456789
+AUDIT_CHANNEL_IDS = _parse_id_map(os.getenv('AUDIT_CHANNEL_IDS', ''))
+
+# Atribuição de moderadores (segundos)
+# Tempo máximo que um evento de voz espera pela entrada do audit log
+ATTRIBUTION_WAIT = float(os.getenv('ATTRIBUTION_WAIT', '2.0'))
+# Diferença máxima entre a entrada do audit log e o evento de voz
+ATTRIBUTION_WINDOW = float(os.getenv('ATTRIBUTION_WINDOW', '10'))
+# Tolerância para entradas criadas depois do evento de voz (diferença entre os relógios do Discord e do bot)
+ATTRIBUTION_CLOCK_SKEW = float(os.getenv('ATTRIBUTION_CLOCK_SKEW', '1.0'))
+# Janela em que o Discord agrega movimentações repetidas na mesma entrada
+ATTRIBUTION_AGGREGATION_WINDOW = float(os.getenv('ATTRIBUTION_AGGREGATION_WINDOW', '300'))
+# Intervalo mínimo entre consultas REST de fallback por servidor
+ATTRIBUTION_POLL_INTERVAL = float(os.getenv('ATTRIBUTION_POLL_INTERVAL', '5'))
+
+# Agrupamento de movimentação de voz por membro (sem moderador envolvido)
+# Janela (segundos) sem novos eventos antes de enviar a sequência; 0 desativa
+VOICE_DEBOUNCE_WINDOW = float(os.getenv('VOICE_DEBOUNCE_WINDOW', '5'))
+# Tempo máximo (segundos) que uma sequência pode ficar acumulando antes do envio
+VOICE_DEBOUNCE_MAX = float(os.getenv('VOICE_DEBOUNCE_MAX', '60'))
+# Quantidade máxima de sessões acompanhadas; as mais antigas são enviadas antes
+VOICE_SESSIONS_MAX = int(os.getenv('VOICE_SESSIONS_MAX', '5000'))
+
+# Estatísticas de voz (tempo por membro/canal e ações de moderadores)
+VOICE_ANALYTICS_ENABLED = os.getenv('VOICE_ANALYTICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+VOICE_ANALYTICS_PATH = os.getenv('VOICE_ANALYTICS_PATH', 'voice_analytics.json')
+# Intervalo (segundos) entre gravações do checkpoint em disco
+VOICE_ANALYTICS_CHECKPOINT_INTERVAL = float(os.getenv('VOICE_ANALYTICS_CHECKPOINT_INTERVAL', '60'))
+# Dias de histórico diário guardados para consultas por período
+VOICE_ANALYTICS_RETENTION_DAYS = int(os.getenv('VOICE_ANALYTICS_RETENTION_DAYS', '90'))
+
+# Entrega dos logs
+# Janela (segundos) para agrupar embeds do mesmo canal em uma única mensagem
+# Use 0 para enviar cada embed imediatamente
+EMBED_BATCH_WINDOW = float(os.getenv('EMBED_BATCH_WINDOW', '1.0'))
+# Tamanho máximo da fila de entrega de cada servidor
+DELIVERY_QUEUE_SIZE = int(os.getenv('DELIVERY_QUEUE_SIZE', '500'))
+# Quantidade de workers enviando mensagens em paralelo (servidores diferentes)
+DELIVERY_WORKERS = int(os.getenv('DELIVERY_WORKERS', '4'))
+# Espera máxima (segundos) em um rate limit antes de devolver o lote para a fila
+# O discord.py não aceita valores menores que 30
+RATELIMIT_MAX_WAIT = float(os.getenv('RATELIMIT_MAX_WAIT', '30'))
+# Canais que respondem 403/404 ficam pausados: falhas seguidas até abrir o circuito
+# e espera inicial (segundos), dobrada a cada nova falha até o máximo
+DELIVERY_BREAKER_THRESHOLD = int(os.getenv('DELIVERY_BREAKER_THRESHOLD', '1'))
+DELIVERY_BREAKER_BACKOFF = float(os.getenv('DELIVERY_BREAKER_BACKOFF', '30'))
+DELIVERY_BREAKER_MAX_BACKOFF = float(os.getenv('DELIVERY_BREAKER_MAX_BACKOFF', '3600'))
+
+# Processos de entrega separados do gateway (0 = tudo no processo do bot)
+# Cada processo renderiza e envia os logs de parte dos servidores (guild_id % DELIVERY_PROCESSES)
+DELIVERY_PROCESSES = int(os.getenv('DELIVERY_PROCESSES', '0'))
+# Eventos aguardando em cada fila entre o gateway e um processo de entrega
+DELIVERY_IPC_QUEUE_SIZE = int(os.getenv('DELIVERY_IPC_QUEUE_SIZE', '10000'))
+
+# Regras de filtro por servidor (JSON), verificadas antes da atribuição e das chamadas REST
+FILTER_RULES_PATH = os.getenv('FILTER_RULES_PATH', 'filters.json')
+# Intervalo (segundos) entre verificações de mudança no arquivo de regras (0 = sem recarga)
+FILTER_RELOAD_INTERVAL = float(os.getenv('FILTER_RELOAD_INTERVAL', '5'))
+
+# Modo raid: BAN_BURST_THRESHOLD bans (ou unbans) em BAN_BURST_WINDOW segundos num servidor
+# fazem os próximos serem enviados como um resumo (0 = desativado)
+BAN_BURST_THRESHOLD = int(os.getenv('BAN_BURST_THRESHOLD', '5'))
+BAN_BURST_WINDOW = float(os.getenv('BAN_BURST_WINDOW', '10'))
+# Segundos sem novos bans que encerram a sequência e enviam o resumo
+BAN_BURST_QUIET = float(os.getenv('BAN_BURST_QUIET', '5'))
+# Duração (segundos) e tamanho máximos de um resumo antes de ser enviado
+BAN_BURST_MAX_DURATION = float(os.getenv('BAN_BURST_MAX_DURATION', '60'))
+BAN_BURST_MAX = int(os.getenv('BAN_BURST_MAX', '1000'))
+
+# Modo de entrega: 'bot' (channel.send) ou 'webhook' (webhook por canal de auditoria)
+DELIVERY_MODE = os.getenv('DELIVERY_MODE', 'bot').lower()
+# Nome do webhook criado pelo bot nos canais de auditoria
+AUDIT_WEBHOOK_NAME = os.getenv('AUDIT_WEBHOOK_NAME', 'BotRevenge Auditoria')
+# Webhooks já existentes por servidor (guild_id:url, separados por vírgula)
+AUDIT_WEBHOOK_URLS = _parse_url_map(os.getenv('AUDIT_WEBHOOK_URLS', ''))
+# Conexões simultâneas da sessão HTTP compartilhada pelos webhooks
+WEBHOOK_POOL_SIZE = int(os.getenv('WEBHOOK_POOL_SIZE', '20'))
+
+# Journal local de eventos (SQLite) para reenviar logs não entregues
+JOURNAL_ENABLED = os.getenv('JOURNAL_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+JOURNAL_PATH = os.getenv('JOURNAL_PATH', 'audit_journal.db')
+# Intervalo (segundos) entre gravações em lote
+JOURNAL_FLUSH_INTERVAL = float(os.getenv('JOURNAL_FLUSH_INTERVAL', '1.0'))
+# Dias que eventos já entregues ficam no journal (e disponíveis no !historico)
+JOURNAL_RETENTION_DAYS = int(os.getenv('JOURNAL_RETENTION_DAYS', '30'))
+# Idade máxima (segundos) e quantidade de eventos pendentes reenviados ao iniciar
+JOURNAL_REPLAY_MAX_AGE = float(os.getenv('JOURNAL_REPLAY_MAX_AGE', '86400'))
+JOURNAL_REPLAY_LIMIT = int(os.getenv('JOURNAL_REPLAY_LIMIT', '1000'))
+
+# Histórico de auditoria (!historico), lido do journal
+# Eventos por página
+HISTORY_PAGE_SIZE = int(os.getenv('HISTORY_PAGE_SIZE', '10'))
+# Segundos até os botões de página deixarem de responder
+HISTORY_VIEW_TIMEOUT = float(os.getenv('HISTORY_VIEW_TIMEOUT', '300'))
+
+# Exportação do audit log (!exportar e export.py): diretório dos arquivos e
+# entradas gravadas entre checkpoints do cursor de retomada
+EXPORT_DIR = os.getenv('EXPORT_DIR', 'exports')
+EXPORT_CHECKPOINT_ENTRIES = int(os.getenv('EXPORT_CHECKPOINT_ENTRIES', '1000'))
+# Intervalo mínimo (segundos) entre atualizações do progresso no !exportar
+EXPORT_PROGRESS_INTERVAL = float(os.getenv('EXPORT_PROGRESS_INTERVAL', '15'))
+
+# Início rápido e recuperação após reinício
+# Arquivo com o último momento em que o bot estava conectado ao gateway
+CHECKPOINT_PATH = os.getenv('CHECKPOINT_PATH', 'gateway_checkpoint.json')
+CHECKPOINT_INTERVAL = float(os.getenv('CHECKPOINT_INTERVAL', '10'))
+# Recuperar pelo audit log os bans/unbans feitos com o bot fora do ar
+BACKFILL_ENABLED = os.getenv('BACKFILL_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# Intervalo máximo (segundos) fora do ar que ainda é recuperado
+BACKFILL_MAX_AGE = float(os.getenv('BACKFILL_MAX_AGE', '3600'))
+# Entradas do audit log lidas por servidor e servidores consultados em paralelo
+BACKFILL_LIMIT = int(os.getenv('BACKFILL_LIMIT', '100'))
+BACKFILL_CONCURRENCY = int(os.getenv('BACKFILL_CONCURRENCY', '4'))
+# Espera (segundos) por novos servidores do gateway antes do on_ready
+GUILD_READY_TIMEOUT = float(os.getenv('GUILD_READY_TIMEOUT', '2.0'))
+
+def _parse_int_list(value):
+    """Converte '0,1,2' em lista de inteiros"""
+    return [int(item) for item in (value or '').split(',') if item.strip().isdigit()]
+
+
+# Sharding: SHARD_COUNT vazio usa a quantidade recomendada pelo Discord
+SHARDING_ENABLED = os.getenv('SHARDING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+SHARD_COUNT = int(os.getenv('SHARD_COUNT')) if os.getenv('SHARD_COUNT') else None
+# Shards atendidos por este processo (ex: 0,1,2,3); exige SHARD_COUNT
+SHARD_IDS = _parse_int_list(os.getenv('SHARD_IDS', '')) or None
+# Processos usados pelo cluster.py
+CLUSTER_WORKERS = int(os.getenv('CLUSTER_WORKERS', '2'))
+# Identificação do processo no cluster (definida pelo cluster.py)
+CLUSTER_ID = os.getenv('CLUSTER_ID', '0')
+# Intervalo (segundos) do relatório de latência e eventos por shard (0 desativa)
+SHARD_REPORT_INTERVAL = float(os.getenv('SHARD_REPORT_INTERVAL', '300'))
+
 # Configurações de logging
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
 LOG_FILE = os.getenv('LOG_FILE', 'bot.log')
+# 'text' ou 'json' (uma linha JSON por registro)
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+# Rotação do arquivo de log: tamanho máximo (bytes) e quantidade de arquivos antigos
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '3'))
+
+# Servidor HTTP de saúde e métricas (/healthz, /readyz, /metrics)
+HEALTH_SERVER_ENABLED = os.getenv('HEALTH_SERVER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+HEALTH_HOST = os.getenv('HEALTH_HOST', '0.0.0.0')
+# O Render define PORT nos serviços web
+HEALTH_PORT = int(os.getenv('HEALTH_PORT', os.getenv('PORT', '8080')))
+# Tempo (segundos) sem conexão com o gateway antes de /healthz falhar
+HEALTH_GRACE = float(os.getenv('HEALTH_GRACE', '300'))
+# Separar as métricas de eventos e filas por servidor (label guild)
+METRICS_PER_GUILD = os.getenv('METRICS_PER_GUILD', 'true').lower() in ('1', 'true', 'yes')
+
+# Tempos por fase dos handlers (mostrados no !stats)
+PROFILE_ENABLED = os.getenv('PROFILE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# Amostras guardadas por fase e eventos recentes considerados nos mais lentos
+PROFILE_SAMPLES = int(os.getenv('PROFILE_SAMPLES', '1000'))
+PROFILE_RECENT = int(os.getenv('PROFILE_RECENT', '500'))
+# Profiler por amostragem (!stats perfil): diretório, intervalo e duração máxima em segundos
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', '0.005'))
+PROFILE_MAX_DURATION = float(os.getenv('PROFILE_MAX_DURATION', '300'))
+
+# Modo dos comandos: 'prefix' (!comando), 'slash' (/comando, sem o intent
+# message_content e sem on_message) ou 'hybrid' (os dois)
+COMMAND_MODE = os.getenv('COMMAND_MODE', 'prefix').lower()
+# Sincronizar os comandos de barra com o Discord ao iniciar
+SYNC_APP_COMMANDS = os.getenv('SYNC_APP_COMMANDS', 'true').lower() in ('1', 'true', 'yes')
+# Contar os eventos recebidos do gateway por tipo (mostrado no !debug)
+GATEWAY_EVENT_STATS = os.getenv('GATEWAY_EVENT_STATS', 'true').lower() in ('1', 'true', 'yes')
 
 # Configurações de intents
+# (message_content e guild_messages só são ativados com comandos de prefixo)
 INTENTS = {
     'guilds': True,
-    'voice_states': True
+    'voice_states': True,
+    'moderation': True
 }
+
+# Caches do discord.py: o bot só usa canais, cargos, estados de voz e os membros em canais de voz
+# Mensagens guardadas em memória (0 = nenhuma; o bot não trata edição nem exclusão de mensagens)
+MESSAGE_CACHE_SIZE = int(os.getenv('MESSAGE_CACHE_SIZE', '0'))
+# Membros mantidos em cache: 'voice' (quem está em canais de voz) e/ou 'joined' (exige o intent members); vazio = nenhum
+MEMBER_CACHE_FLAGS = [flag.strip() for flag in os.getenv('MEMBER_CACHE_FLAGS', 'voice').split(',') if flag.strip()]
+# Baixar a lista completa de membros de cada servidor ao conectar (só com o intent members)
+CHUNK_GUILDS_AT_STARTUP = os.getenv('CHUNK_GUILDS_AT_STARTUP', 'false').lower() in ('1', 'true', 'yes')
+# Limite de itens dos índices por servidor/canal do próprio bot (canal de auditoria, canal alternativo, webhooks)
+GUILD_CACHE_MAX = int(os.getenv('GUILD_CACHE_MAX', '10000'))
+# Intervalo (segundos) da limpeza do estado expirado (audit log recente, janelas de bans, circuitos); 0 desativa
+CACHE_SWEEP_INTERVAL = float(os.getenv('CACHE_SWEEP_INTERVAL', '60'))
@@ -0,0 +1,509 @@
+import asyncio
+import io
+import logging
+import time
+from collections import Counter, deque
+
+import discord
+
+from config import (
+    EMBED_BATCH_WINDOW,
+    DELIVERY_QUEUE_SIZE,
+    DELIVERY_WORKERS,
+    DELIVERY_BREAKER_THRESHOLD,
+    DELIVERY_BREAKER_BACKOFF,
+    DELIVERY_BREAKER_MAX_BACKOFF,
+)
+
+logger = logging.getLogger(__name__)
+
+# Limites do Discord por mensagem
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_EMBED_CHARS_PER_MESSAGE = 6000
+
+# Classes de prioridade (menor valor sai primeiro)
+PRIORITY_HIGH = 0    # bans e unbans
+PRIORITY_NORMAL = 1  # movimentação de voz
+
+# Quantidade de tempos de espera guardados para os percentis
+WAIT_SAMPLES = 1000
+
+
+class DeliveryItem:
+    """Evento aguardando envio"""
+
+    __slots__ = ('channel', 'record', 'embeds', 'priority', 'key', 'enqueued_at')
+
+    def __init__(self, channel, record, priority, key=None):
+        self.channel = channel
+        self.record = record
+        # Embeds do registro, montados só quando o item entra em um lote
+        self.embeds = None
+        self.priority = priority
+        # Chave de idempotência do evento no journal
+        self.key = key
+        self.enqueued_at = time.monotonic()
+
+
+class GuildQueue:
+    """Fila limitada de um servidor, com uma deque por prioridade"""
+
+    __slots__ = ('lanes', 'dropped', 'last_channel', 'cooldown_until')
+
+    def __init__(self):
+        self.lanes = (deque(), deque())
+        # Eventos de voz descartados desde o último envio (viram um resumo)
+        self.dropped = 0
+        self.last_channel = None
+        self.cooldown_until = 0.0
+
+    def __len__(self):
+        return len(self.lanes[PRIORITY_HIGH]) + len(self.lanes[PRIORITY_NORMAL])
+
+
+class _BreakerState:
+    __slots__ = ('guild_id', 'failures', 'open_until', 'failed_at')
+
+    def __init__(self, guild_id):
+        self.guild_id = guild_id
+        self.failures = 0
+        self.open_until = 0.0
+        self.failed_at = time.monotonic()
+
+
+class CircuitBreaker:
+    """Pausa os envios para canais que falham seguidamente com 403/404
+
+    Depois de `threshold` falhas seguidas o circuito do canal abre por
+    `backoff` segundos, dobrando a cada nova falha até `max_backoff`. Passada
+    a espera, o próximo envio é uma tentativa: sucesso fecha o circuito,
+    falha o reabre por mais tempo. Mudanças de canais ou permissões no
+    servidor fecham os circuitos dele (reset_guild).
+    """
+
+    def __init__(self, threshold=DELIVERY_BREAKER_THRESHOLD, backoff=DELIVERY_BREAKER_BACKOFF,
+                 max_backoff=DELIVERY_BREAKER_MAX_BACKOFF):
+        self.threshold = max(1, threshold)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # channel_id -> _BreakerState (só canais que falharam)
+        self._states = {}
+        # Chamado com (channel_id, guild_id, espera) quando um circuito abre
+        self.on_open = None
+        self.stats = Counter()
+
+    def is_open(self, channel_id):
+        state = self._states.get(channel_id)
+        return state is not None and state.open_until > time.monotonic()
+
+    def _state(self, channel_id, guild_id):
+        state = self._states.get(channel_id)
+        if state is None:
+            state = self._states[channel_id] = _BreakerState(guild_id)
+        return state
+
+    def failure(self, channel):
+        """Registra uma falha; retorna a espera (segundos) se o circuito abriu"""
+        state = self._state(channel.id, channel.guild.id)
+        state.failures += 1
+        state.failed_at = time.monotonic()
+        if state.failures < self.threshold:
+            return None
+        wait = min(self.max_backoff, self.backoff * 2 ** (state.failures - self.threshold))
+        self.trip(channel.id, channel.guild.id, wait)
+        return wait
+
+    def trip(self, channel_id, guild_id, wait):
+        """Abre o circuito do canal por `wait` segundos"""
+        now = time.monotonic()
+        state = self._state(channel_id, guild_id)
+        state.open_until = now + wait
+        state.failed_at = now
+        self.stats['opened'] += 1
+        if self.on_open is not None:
+            self.on_open(channel_id, guild_id, wait)
+
+    def success(self, channel_id):
+        if self._states.pop(channel_id, None) is not None:
+            self.stats['closed'] += 1
+
+    def reset_guild(self, guild_id):
+        """Fecha os circuitos dos canais do servidor; retorna quantos havia"""
+        channel_ids = [channel_id for channel_id, state in self._states.items() if state.guild_id == guild_id]
+        for channel_id in channel_ids:
+            del self._states[channel_id]
+        return len(channel_ids)
+
+    def sweep(self):
+        """Esquece canais com o circuito fechado e sem falhas há mais de max_backoff segundos"""
+        now = time.monotonic()
+        expired = [channel_id for channel_id, state in self._states.items()
+                   if state.open_until <= now and now - state.failed_at >= self.max_backoff]
+        for channel_id in expired:
+            del self._states[channel_id]
+        return len(expired)
+
+    def caches(self):
+        return {'delivery.breaker': self._states}
+
+    def open_count(self):
+        now = time.monotonic()
+        return sum(1 for state in self._states.values() if state.open_until > now)
+
+    def __bool__(self):
+        return bool(self._states)
+
+
+def as_files(attachments):
+    """discord.File novos para cada tentativa (o discord.py fecha os arquivos após o envio)"""
+    if not attachments:
+        return None
+    return [discord.File(io.BytesIO(data), filename=filename) for filename, data in attachments]
+
+
+async def send_to_channel(channel, embeds, attachments=None):
+    """Envio padrão: uma mensagem do bot com vários embeds"""
+    if attachments:
+        await channel.send(embeds=embeds, files=as_files(attachments))
+    else:
+        await channel.send(embeds=embeds)
+
+
+def as_embeds(record):
+    """Renderização padrão: o item enfileirado já é um embed"""
+    return [record]
+
+
+class DeliveryScheduler:
+    """Agendador de entregas entre o AuditLogger e o Discord
+
+    Cada servidor tem uma fila limitada (DELIVERY_QUEUE_SIZE) com duas classes
+    de prioridade. Os workers atendem os servidores em rodízio, enviando até
+    10 embeds por mensagem. Quando a fila enche, eventos de voz são
+    descartados e resumidos em um único aviso; bans nunca são descartados.
+
+    Os itens enfileirados são registros compactos; render os transforma na
+    lista de embeds apenas quando o item é retirado para envio, e attach
+    (opcional) nos arquivos anexados à mesma mensagem.
+
+    Canais com o circuito aberto (CircuitBreaker) não recebem envios: seus
+    itens saem da fila sem chamada REST e continuam pendentes no journal.
+    """
+
+    def __init__(self, sender=send_to_channel, queue_size=DELIVERY_QUEUE_SIZE,
+                 workers=DELIVERY_WORKERS, batch_window=EMBED_BATCH_WINDOW,
+                 on_delivered=None, on_dropped=None, render=as_embeds, attach=None):
+        self.sender = sender
+        self.render = render
+        self.attach = attach
+        # Callbacks com as chaves dos eventos entregues/descartados (journal)
+        self.on_delivered = on_delivered
+        self.on_dropped = on_dropped
+        self.queue_size = queue_size
+        self.worker_count = workers
+        self.batch_window = batch_window
+        self._queues = {}
+        # Servidores prontos para serem atendidos, em ordem de chegada (rodízio)
+        self._ready = deque()
+        # Servidores agendados: na fila de prontos, aguardando a janela ou em atendimento
+        self._scheduled = set()
+        self._timers = {}
+        self._has_work = asyncio.Event()
+        self._workers = []
+        # close() em andamento: nada novo entra na fila
+        self._closing = False
+        # Fila esvaziada ou prazo esgotado: os workers só terminam o lote em envio
+        self._stopping = False
+        self.wait_times = deque(maxlen=WAIT_SAMPLES)
+        self.breaker = CircuitBreaker()
+        self.stats = Counter()
+        # Falhas de envio por motivo (status HTTP ou exceção)
+        self.errors = Counter()
+
+    def start(self):
+        """Inicia os workers de entrega"""
+        if not self._workers:
+            self._workers = [asyncio.ensure_future(self._worker()) for _ in range(self.worker_count)]
+
+    async def close(self, timeout=10.0):
+        """Para de aceitar eventos, entrega o que estiver pendente e encerra os workers
+
+        Um lote cancelado no meio do envio não seria marcado como entregue e
+        voltaria repetido do journal: os workers terminam o lote atual antes
+        de sair e só os que passarem do prazo são cancelados.
+        """
+        self._closing = True
+        for guild_id in list(self._timers):
+            self._make_ready(guild_id)
+        deadline = time.monotonic() + timeout
+        while self.total_depth() and time.monotonic() < deadline and self._workers:
+            await asyncio.sleep(0.1)
+        self._stopping = True
+        self._has_work.set()
+        if self._workers:
+            _, pending = await asyncio.wait(self._workers, timeout=max(1.0, deadline - time.monotonic()))
+            for task in pending:
+                task.cancel()
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        self._workers = []
+
+    def submit(self, guild, channel, record, priority=PRIORITY_NORMAL, key=None):
+        """Enfileira um evento sem bloquear; retorna False se foi descartado"""
+        if self._closing:
+            # Continua pendente no journal e volta no próximo início
+            self.stats['rejected_closing'] += 1
+            return False
+        queue = self._queues.get(guild.id)
+        if queue is None:
+            queue = self._queues[guild.id] = GuildQueue()
+
+        if len(queue) >= self.queue_size:
+            normal = queue.lanes[PRIORITY_NORMAL]
+            if priority == PRIORITY_NORMAL:
+                queue.dropped += 1
+                queue.last_channel = channel
+                self.stats['dropped'] += 1
+                self._notify(self.on_dropped, [key])
+                self._schedule(guild.id, priority)
+                return False
+            if normal:
+                # Prioridade alta toma o lugar do evento de voz mais antigo
+                evicted = normal.popleft()
+                queue.dropped += 1
+                self.stats['dropped'] += 1
+                self._notify(self.on_dropped, [evicted.key])
+
+        queue.lanes[priority].append(DeliveryItem(channel, record, priority, key))
+        queue.last_channel = channel
+        self.stats['events'] += 1
+        self._schedule(guild.id, priority)
+        return True
+
+    def _schedule(self, guild_id, priority):
+        """Agenda o servidor respeitando a janela de agrupamento"""
+        if guild_id in self._scheduled:
+            # Prioridade alta não espera a janela terminar (mas respeita o rate limit)
+            queue = self._queues[guild_id]
+            if priority == PRIORITY_HIGH and guild_id in self._timers and queue.cooldown_until <= time.monotonic():
+                self._timers.pop(guild_id).cancel()
+                self._make_ready(guild_id)
+            return
+
+        self._scheduled.add(guild_id)
+        if self.batch_window > 0 and priority != PRIORITY_HIGH:
+            loop = asyncio.get_running_loop()
+            self._timers[guild_id] = loop.call_later(self.batch_window, self._make_ready, guild_id)
+        else:
+            self._make_ready(guild_id)
+
+    def _make_ready(self, guild_id):
+        timer = self._timers.pop(guild_id, None)
+        if timer is not None:
+            timer.cancel()
+        self._ready.append(guild_id)
+        self._has_work.set()
+
+    async def _worker(self):
+        while True:
+            while not self._ready and not self._stopping:
+                self._has_work.clear()
+                await self._has_work.wait()
+            if self._stopping:
+                return
+
+            guild_id = self._ready.popleft()
+            queue = self._queues.get(guild_id)
+            try:
+                if queue is not None:
+                    await self._serve(guild_id, queue)
+            except Exception as e:
+                logger.error("Erro no worker de entrega: %s", e)
+            finally:
+                self._reschedule(guild_id, queue)
+
+    def _reschedule(self, guild_id, queue):
+        """Devolve o servidor ao fim do rodízio se ainda houver itens"""
+        if queue is None or (not len(queue) and not queue.dropped):
+            self._scheduled.discard(guild_id)
+            self._queues.pop(guild_id, None)
+            return
+
+        delay = queue.cooldown_until - time.monotonic()
+        if delay > 0:
+            loop = asyncio.get_running_loop()
+            self._timers[guild_id] = loop.call_later(delay, self._make_ready, guild_id)
+        else:
+            self._make_ready(guild_id)
+
+    def _take_batch(self, queue):
+        """Retira até 10 embeds do mesmo canal, prioridade alta primeiro"""
+        batch = []
+        count = 0
+        size = 0
+        channel = None
+        for lane in queue.lanes:
+            while lane and count < MAX_EMBEDS_PER_MESSAGE:
+                item = lane[0]
+                if channel is not None and item.channel.id != channel.id:
+                    break
+                if item.embeds is None:
+                    item.embeds = self.render(item.record)
+                item_size = sum(len(embed) for embed in item.embeds)
+                if batch and (count + len(item.embeds) > MAX_EMBEDS_PER_MESSAGE
+                              or size + item_size > MAX_EMBED_CHARS_PER_MESSAGE):
+                    return channel, batch
+                lane.popleft()
+                channel = item.channel
+                batch.append(item)
+                count += len(item.embeds)
+                size += item_size
+        return channel, batch
+
+    def _overflow_summary(self, queue):
+        embed = discord.Embed(
+            title="⚠️ Eventos de voz descartados",
+            description=f"{queue.dropped} evento(s) de voz foram descartados por sobrecarga na fila de entrega.",
+            color=0xffa500,
+        )
+        queue.dropped = 0
+        self.stats['summaries'] += 1
+        return embed
+
+    def _discard_blocked(self, queue):
+        """Remove da fila os itens de canais com o circuito aberto"""
+        for lane in queue.lanes:
+            if any(self.breaker.is_open(item.channel.id) for item in lane):
+                kept = [item for item in lane if not self.breaker.is_open(item.channel.id)]
+                self.stats['blocked'] += len(lane) - len(kept)
+                lane.clear()
+                lane.extend(kept)
+
+    async def _serve(self, guild_id, queue):
+        if self.breaker:
+            self._discard_blocked(queue)
+        channel, batch = self._take_batch(queue)
+        embeds = [embed for item in batch for embed in item.embeds]
+
+        if queue.dropped and len(embeds) < MAX_EMBEDS_PER_MESSAGE:
+            if not batch:
+                channel = queue.last_channel
+            if self.breaker.is_open(queue.last_channel.id):
+                # Sem para onde mandar o resumo: ele não prende o servidor no rodízio
+                queue.dropped = 0
+            elif channel.id == queue.last_channel.id:
+                embeds.append(self._overflow_summary(queue))
+
+        if not embeds:
+            return
+
+        now = time.monotonic()
+        for item in batch:
+            self.wait_times.append(now - item.enqueued_at)
+
+        attachments = None
+        if self.attach is not None:
+            attachments = [attachment for item in batch for attachment in self.attach(item.record) or ()]
+
+        try:
+            if attachments:
+                await self.sender(channel, embeds, attachments)
+            else:
+                await self.sender(channel, embeds)
+        except discord.RateLimited as e:
+            # O discord.py desistiu de esperar (max_ratelimit_timeout): o servidor
+            # sai do rodízio até o bucket liberar e os outros seguem sendo atendidos
+            self._requeue(queue, batch, e.retry_after)
+            logger.warning("Rate limit ao enviar para %s, aguardando %.1fs", channel.name, e.retry_after)
+            return
+        except discord.HTTPException as e:
+            if e.status == 429:
+                retry_after = float(e.response.headers.get('Retry-After', 1.0))
+                self._requeue(queue, batch, retry_after)
+                logger.warning("Rate limit ao enviar para %s, aguardando %.1fs", channel.name, retry_after)
+                return
+            self.stats['failures'] += 1
+            self.errors[str(e.status)] += 1
+            if isinstance(e, (discord.Forbidden, discord.NotFound)):
+                # Canal apagado ou sem permissão: pausar o canal em vez de falhar a cada evento
+                wait = self.breaker.failure(channel)
+                if wait is not None:
+                    logger.warning("Envio para %s falhou (%s); canal pausado por %.0fs", channel.name, e.status, wait)
+                    return
+            elif 400 <= e.status < 500:
+                # Payload recusado (embed inválido, 413...): reenviar do journal falharia de novo
+                self.stats['rejected'] += len(batch)
+                self._notify(self.on_dropped, [item.key for item in batch])
+            logger.error("Erro ao enviar %s embed(s) para %s: %s", len(embeds), channel.name, e)
+            return
+        except Exception as e:
+            self.stats['failures'] += 1
+            self.errors[type(e).__name__] += 1
+            logger.error("Erro ao enviar %s embed(s) para %s: %s", len(embeds), channel.name, e)
+            return
+
+        if self.breaker:
+            self.breaker.success(channel.id)
+        self.stats['messages'] += 1
+        self.stats['messages_saved'] += len(embeds) - 1
+        self._notify(self.on_delivered, [item.key for item in batch])
+        logger.debug("%s embed(s) enviados para %s", len(embeds), channel.name)
+
+    def _notify(self, callback, keys):
+        # Um resumo em massa carrega a tupla com as chaves de todos os seus eventos
+        flat = []
+        for key in keys:
+            if isinstance(key, tuple):
+                flat.extend(k for k in key if k is not None)
+            elif key is not None:
+                flat.append(key)
+        if callback is not None and flat:
+            callback(flat)
+
+    def _requeue(self, queue, batch, retry_after):
+        """Devolve o lote para o início da fila e pausa o servidor"""
+        queue.cooldown_until = time.monotonic() + retry_after
+        for item in reversed(batch):
+            queue.lanes[item.priority].appendleft(item)
+        self.stats['rate_limited'] += 1
+
+    def reset_guild(self, guild_id):
+        """Canais ou permissões do servidor mudaram: voltar a tentar os envios"""
+        return self.breaker.reset_guild(guild_id)
+
+    def sweep(self):
+        return self.breaker.sweep()
+
+    def caches(self):
+        return {'delivery.queues': self._queues, **self.breaker.caches()}
+
+    def depth(self, guild_id):
+        """Quantidade de eventos na fila de um servidor"""
+        queue = self._queues.get(guild_id)
+        return len(queue) if queue is not None else 0
+
+    def total_depth(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def depths(self):
+        """Quantidade de eventos na fila de cada servidor"""
+        return {guild_id: len(queue) for guild_id, queue in self._queues.items()}
+
+    def oldest_wait(self):
+        """Há quanto tempo (segundos) o evento mais antigo aguarda envio"""
+        now = time.monotonic()
+        oldest = 0.0
+        for queue in self._queues.values():
+            for lane in queue.lanes:
+                if lane:
+                    oldest = max(oldest, now - lane[0].enqueued_at)
+        return oldest
+
+    def wait_percentile(self, percentile):
+        """Percentil (0-100) do tempo de espera na fila, em segundos"""
+        if not self.wait_times:
+            return 0.0
+        samples = sorted(self.wait_times)
+        index = min(len(samples) - 1, int(len(samples) * percentile / 100))
+        return samples[index]
@@ -0,0 +1,428 @@
+"""Entrega dos logs em processos separados do gateway
+
+Com DELIVERY_PROCESSES > 0 o processo do bot só recebe os eventos do
+gateway, identifica o moderador e grava o journal; cada evento vira uma
+mensagem compacta (servidor, canal, prioridade, chave e o registro) em uma
+multiprocessing.Queue. Os processos de entrega não se conectam ao gateway:
+fazem login apenas na API REST e renderizam, agrupam e enviam com o mesmo
+DeliveryScheduler do modo em processo único.
+
+Os eventos de um servidor vão sempre para o mesmo processo
+(guild_id % DELIVERY_PROCESSES), o que preserva a ordem e o agrupamento por
+canal. Confirmações de entrega (para o journal), circuitos abertos e as
+estatísticas de cada processo voltam por uma fila compartilhada.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import Counter
+
+import discord
+
+from config import (
+    DISCORD_TOKEN, DISCORD_API_BASE, RATELIMIT_MAX_WAIT, DELIVERY_PROCESSES, DELIVERY_IPC_QUEUE_SIZE,
+    DELIVERY_QUEUE_SIZE, LOG_FILE,
+)
+from caches import LRUCache
+from delivery import CircuitBreaker, DeliveryScheduler, GuildQueue, PRIORITY_NORMAL, send_to_channel
+
+logger = logging.getLogger(__name__)
+
+# Intervalo (segundos) entre envios das estatísticas de cada processo
+STATS_INTERVAL = 5.0
+
+# Espera antes de reiniciar um processo de entrega que caiu
+RESTART_DELAY = 5.0
+
+# Tempo máximo (segundos) para os processos esvaziarem as filas no encerramento
+CLOSE_TIMEOUT = 15.0
+
+# Intervalo (segundos) entre tentativas de passar à fila do processo os eventos que não couberam nela
+STAGE_RETRY_INTERVAL = 0.05
+
+# Mensagens da fila de retorno
+MSG_DELIVERED = 'delivered'
+MSG_DROPPED = 'dropped'
+MSG_BREAKER = 'breaker'
+MSG_STATS = 'stats'
+# Mensagem de controle da fila de entrada
+MSG_RESET = 'reset'
+
+
+class RemoteChannel:
+    """Canal de destino no processo de entrega (sem cache do gateway)"""
+
+    __slots__ = ('id', 'name', 'guild', '_messageable')
+
+    def __init__(self, client, channel_id, name, guild_id):
+        self.id = channel_id
+        self.name = name
+        self.guild = discord.Object(id=guild_id)
+        self._messageable = client.get_partial_messageable(channel_id, guild_id=guild_id)
+
+    async def send(self, embeds, files=None):
+        await self._messageable.send(embeds=embeds, files=files)
+
+
+class DeliveryWorker:
+    """Lado do processo de entrega: lê a fila e envia pelo DeliveryScheduler"""
+
+    def __init__(self, worker_id, inbox, outbox):
+        self.worker_id = worker_id
+        self.inbox = inbox
+        self.outbox = outbox
+        self.client = None
+        self.scheduler = None
+        # channel_id -> RemoteChannel (os menos usados saem após GUILD_CACHE_MAX canais)
+        self._channels = LRUCache()
+        self._stopped = None
+
+    async def run(self):
+        from events import EmbedRenderer
+
+        loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        self.client = discord.Client(intents=discord.Intents.none(), max_ratelimit_timeout=RATELIMIT_MAX_WAIT)
+        # Só REST: o login preenche client.user (usado na renderização), sem conectar ao gateway
+        await self.client.login(DISCORD_TOKEN)
+
+        renderer = EmbedRenderer(self.client)
+        self.scheduler = DeliveryScheduler(
+            sender=send_to_channel,
+            on_delivered=lambda keys: self.outbox.put((MSG_DELIVERED, keys)),
+            on_dropped=lambda keys: self.outbox.put((MSG_DROPPED, keys)),
+            render=renderer,
+            attach=renderer.attachments,
+        )
+        self.scheduler.breaker.on_open = lambda channel_id, guild_id, wait: self.outbox.put(
+            (MSG_BREAKER, channel_id, guild_id, wait)
+        )
+        self.scheduler.start()
+
+        reader = threading.Thread(target=self._read, args=(loop,), name='delivery-inbox', daemon=True)
+        reader.start()
+        logger.info("Processo de entrega %s pronto (pid %s)", self.worker_id, os.getpid())
+
+        try:
+            while not self._stopped.is_set():
+                try:
+                    await asyncio.wait_for(self._stopped.wait(), timeout=STATS_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self.scheduler.sweep()
+                self.outbox.put((MSG_STATS, self.worker_id, self.snapshot()))
+        finally:
+            await self.scheduler.close()
+            self.outbox.put((MSG_STATS, self.worker_id, self.snapshot()))
+            await self.client.close()
+
+    def _read(self, loop):
+        """Thread que lê a fila de entrada e repassa as mensagens ao event loop"""
+        while True:
+            message = self.inbox.get()
+            if message is None:
+                loop.call_soon_threadsafe(self._stopped.set)
+                return
+            loop.call_soon_threadsafe(self._submit, message)
+
+    def _submit(self, message):
+        if message[0] == MSG_RESET:
+            self.scheduler.reset_guild(message[1])
+            return
+        guild_id, channel_id, channel_name, priority, key, record = message
+        channel = self._channels.get(channel_id)
+        if channel is None or channel.name != channel_name:
+            channel = self._channels[channel_id] = RemoteChannel(self.client, channel_id, channel_name, guild_id)
+        self.scheduler.submit(channel.guild, channel, record, priority, key=key)
+
+    def snapshot(self):
+        scheduler = self.scheduler
+        return {
+            'stats': dict(scheduler.stats),
+            'errors': dict(scheduler.errors),
+            'depths': scheduler.depths(),
+            'oldest': scheduler.oldest_wait(),
+            'wait': {50: scheduler.wait_percentile(50), 99: scheduler.wait_percentile(99)},
+        }
+
+
+def run_delivery_worker(worker_id, inbox, outbox):
+    """Ponto de entrada do processo de entrega"""
+    from log_setup import setup_logging
+
+    path = None
+    if LOG_FILE:
+        root, ext = os.path.splitext(LOG_FILE)
+        path = f"{root}.delivery{worker_id}{ext}"
+    setup_logging(path=path)
+    # Processos spawn não herdam a alteração feita no bot.py
+    if DISCORD_API_BASE:
+        discord.http.Route.BASE = DISCORD_API_BASE.rstrip('/')
+    try:
+        asyncio.run(DeliveryWorker(worker_id, inbox, outbox).run())
+    except KeyboardInterrupt:
+        pass
+
+
+class DeliveryPool:
+    """Lado do gateway: distribui os eventos entre os processos de entrega
+
+    Tem a mesma interface do DeliveryScheduler usada pelo AuditLogger, pelo
+    !debug e pelas métricas; filas e contadores são os do último retrato
+    enviado por cada processo.
+
+    Quando a fila de um processo está cheia, os eventos do servidor esperam
+    aqui em uma GuildQueue (até DELIVERY_QUEUE_SIZE por servidor), com a mesma
+    política do DeliveryScheduler: bans passam à frente e, no limite, eventos
+    de voz são descartados primeiro.
+    """
+
+    def __init__(self, processes=DELIVERY_PROCESSES, queue_size=DELIVERY_IPC_QUEUE_SIZE,
+                 on_delivered=None, on_dropped=None, staged_size=DELIVERY_QUEUE_SIZE):
+        self.process_count = processes
+        self.queue_size = queue_size
+        self.staged_size = staged_size
+        self.on_delivered = on_delivered
+        self.on_dropped = on_dropped
+        self._context = multiprocessing.get_context('spawn')
+        self._inboxes = [self._context.Queue(maxsize=queue_size) for _ in range(processes)]
+        self._outbox = self._context.Queue()
+        self._processes = [None] * processes
+        self._snapshots = [{} for _ in range(processes)]
+        self._reader = None
+        self._supervisor = None
+        self._closing = False
+        # guild_id -> GuildQueue dos eventos à espera de espaço na fila do processo (em ordem de chegada)
+        self._staged = {}
+        self._staged_event = asyncio.Event()
+        self._stager = None
+        # Espelho dos circuitos abertos nos processos (o AuditLogger consulta antes de enfileirar)
+        self.breaker = CircuitBreaker()
+        # Contadores somados dos processos e os do próprio gateway
+        self.stats = Counter()
+        self.errors = Counter()
+        self.local_stats = Counter()
+
+    def _spawn(self, worker_id):
+        process = self._context.Process(
+            target=run_delivery_worker,
+            args=(worker_id, self._inboxes[worker_id], self._outbox),
+            name=f"botrevenge-delivery-{worker_id}",
+            daemon=True,
+        )
+        process.start()
+        self._processes[worker_id] = process
+        logger.info("Processo de entrega %s iniciado (pid %s)", worker_id, process.pid)
+
+    def start(self):
+        if self._reader is not None:
+            return
+        loop = asyncio.get_running_loop()
+        for worker_id in range(self.process_count):
+            self._spawn(worker_id)
+        self._reader = threading.Thread(target=self._read, args=(loop,), name='delivery-outbox', daemon=True)
+        self._reader.start()
+        self._supervisor = asyncio.ensure_future(self._supervise())
+        self._stager = asyncio.ensure_future(self._drain_staged())
+
+    async def _supervise(self):
+        """Reinicia processos de entrega que caírem (o que estava na fila deles segue pendente no journal)"""
+        while not self._closing:
+            await asyncio.sleep(RESTART_DELAY)
+            for worker_id, process in enumerate(self._processes):
+                if not self._closing and process is not None and not process.is_alive():
+                    logger.warning("Processo de entrega %s saiu com código %s, reiniciando", worker_id, process.exitcode)
+                    self.local_stats['restarts'] += 1
+                    self._spawn(worker_id)
+
+    def _read(self, loop):
+        """Thread que lê a fila de retorno e repassa as mensagens ao event loop"""
+        while True:
+            message = self._outbox.get()
+            if message is None:
+                return
+            loop.call_soon_threadsafe(self._handle, message)
+
+    def _handle(self, message):
+        kind = message[0]
+        if kind == MSG_DELIVERED:
+            if self.on_delivered is not None:
+                self.on_delivered(message[1])
+        elif kind == MSG_DROPPED:
+            if self.on_dropped is not None:
+                self.on_dropped(message[1])
+        elif kind == MSG_BREAKER:
+            _, channel_id, guild_id, wait = message
+            self.breaker.trip(channel_id, guild_id, wait)
+        elif kind == MSG_STATS:
+            _, worker_id, snapshot = message
+            self._snapshots[worker_id] = snapshot
+            self._merge()
+
+    def _merge(self):
+        stats = Counter(self.local_stats)
+        errors = Counter()
+        for snapshot in self._snapshots:
+            stats.update(snapshot.get('stats', {}))
+            errors.update(snapshot.get('errors', {}))
+        # Atualizados no lugar: as métricas guardam referência a estes Counters
+        self.stats.clear()
+        self.stats.update(stats)
+        self.errors.clear()
+        self.errors.update(errors)
+
+    def _count(self, name, amount=1):
+        # Também no Counter exposto, até o próximo retrato dos processos
+        self.local_stats[name] += amount
+        self.stats[name] += amount
+
+    def _notify_dropped(self, keys):
+        if self.on_dropped is None:
+            return
+        flat = []
+        for key in keys:
+            if isinstance(key, tuple):
+                flat.extend(k for k in key if k is not None)
+            elif key is not None:
+                flat.append(key)
+        if flat:
+            self.on_dropped(flat)
+
+    def submit(self, guild, channel, record, priority, key=None):
+        """Envia o evento ao processo do servidor sem bloquear; retorna False se foi descartado"""
+        message = (guild.id, channel.id, channel.name, priority, key, record)
+        staged = self._staged.get(guild.id)
+        if staged is None:
+            try:
+                self._inboxes[guild.id % self.process_count].put_nowait(message)
+            except queue.Full:
+                self._count('ipc_full')
+                staged = self._staged[guild.id] = GuildQueue()
+            else:
+                self._count('ipc_sent')
+                return True
+
+        # Fila do processo cheia (ou eventos do servidor já esperando): aguardar aqui
+        if len(staged) >= self.staged_size:
+            normal = staged.lanes[PRIORITY_NORMAL]
+            if priority == PRIORITY_NORMAL:
+                self._count('dropped')
+                self._notify_dropped([key])
+                return False
+            if normal:
+                # Ban toma o lugar do evento de voz mais antigo
+                self._count('dropped')
+                self._notify_dropped([normal.popleft()[4]])
+        staged.lanes[priority].append(message)
+        self._count('ipc_staged')
+        self._staged_event.set()
+        return True
+
+    async def _drain_staged(self):
+        """Passa os eventos em espera às filas dos processos, bans antes de voz"""
+        while True:
+            await self._staged_event.wait()
+            for guild_id in list(self._staged):
+                staged = self._staged[guild_id]
+                inbox = self._inboxes[guild_id % self.process_count]
+                try:
+                    for lane in staged.lanes:
+                        while lane:
+                            inbox.put_nowait(lane[0])
+                            lane.popleft()
+                            self._count('ipc_sent')
+                except queue.Full:
+                    continue
+                del self._staged[guild_id]
+            if self._staged:
+                await asyncio.sleep(STAGE_RETRY_INTERVAL)
+            else:
+                self._staged_event.clear()
+
+    def reset_guild(self, guild_id):
+        """Fecha os circuitos do servidor aqui e no processo dele"""
+        removed = self.breaker.reset_guild(guild_id)
+        if removed:
+            try:
+                self._inboxes[guild_id % self.process_count].put_nowait((MSG_RESET, guild_id))
+            except queue.Full:
+                pass
+        return removed
+
+    def sweep(self):
+        return self.breaker.sweep()
+
+    def caches(self):
+        return {'delivery.staged': self._staged, **self.breaker.caches()}
+
+    async def close(self, timeout=CLOSE_TIMEOUT):
+        """Pede aos processos que esvaziem as filas, espera e recolhe as últimas confirmações"""
+        self._closing = True
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + timeout
+        # Eventos ainda em espera continuam pendentes no journal
+        if self._stager is not None:
+            self._stager.cancel()
+        waiting = sum(len(staged) for staged in self._staged.values())
+        if waiting:
+            logger.warning("%s evento(s) aguardando espaço nas filas dos processos ficam pendentes no journal", waiting)
+        self._staged.clear()
+        for worker_id, inbox in enumerate(self._inboxes):
+            process = self._processes[worker_id]
+            if process is None or not process.is_alive():
+                continue
+            try:
+                inbox.put_nowait(None)
+            except queue.Full:
+                # Processo lento ou travado: esperar espaço fora do event loop, até o prazo
+                try:
+                    await loop.run_in_executor(None, inbox.put, None, True, max(0.0, deadline - time.monotonic()))
+                except queue.Full:
+                    logger.warning("Fila do processo de entrega %s cheia no encerramento", process.name)
+        for worker_id, process in enumerate(self._processes):
+            if process is not None:
+                await loop.run_in_executor(None, process.join, max(0.0, deadline - time.monotonic()))
+                if process.is_alive():
+                    logger.warning("Processo de entrega %s não encerrou a tempo", process.name)
+                    process.terminate()
+                if process.exitcode != 0:
+                    # Sem leitor, o que ficou na fila não deve segurar o encerramento deste processo
+                    self._inboxes[worker_id].cancel_join_thread()
+        if self._reader is not None:
+            self._outbox.put(None)
+            await loop.run_in_executor(None, self._reader.join)
+            self._reader = None
+        # Processar as confirmações repassadas pela thread antes de o journal fechar
+        await asyncio.sleep(0)
+
+    def _snapshot_for(self, guild_id):
+        return self._snapshots[guild_id % self.process_count]
+
+    def depth(self, guild_id):
+        staged = self._staged.get(guild_id)
+        return self._snapshot_for(guild_id).get('depths', {}).get(guild_id, 0) + (len(staged) if staged else 0)
+
+    def total_depth(self):
+        return (sum(sum(snapshot.get('depths', {}).values()) for snapshot in self._snapshots)
+                + sum(len(staged) for staged in self._staged.values()))
+
+    def depths(self):
+        depths = {}
+        for snapshot in self._snapshots:
+            depths.update(snapshot.get('depths', {}))
+        for guild_id, staged in self._staged.items():
+            depths[guild_id] = depths.get(guild_id, 0) + len(staged)
+        return depths
+
+    def oldest_wait(self):
+        return max((snapshot.get('oldest', 0.0) for snapshot in self._snapshots), default=0.0)
+
+    def wait_percentile(self, percentile):
+        """Maior percentil entre os processos (só 50 e 99 são enviados)"""
+        return max((snapshot.get('wait', {}).get(int(percentile), 0.0) for snapshot in self._snapshots), default=0.0)
@@ -0,0 +1,329 @@
+"""Registros compactos dos eventos de auditoria e sua renderização em embeds
+
+Os handlers guardam apenas IDs, nomes e o horário de cada evento em uma
+tupla de formato fixo. O embed só é montado pelo agendador de entrega no
+momento do envio; eventos descartados na fila nunca chegam a virar embed.
+"""
+import csv
+import io
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional
+
+import discord
+
+# Marcações de um registro (campo flags)
+FLAG_REPLAYED = 1  # reenviado do journal depois de uma reinicialização
+FLAG_FALLBACK = 2  # entregue em um canal alternativo
+FLAG_BACKFILL = 4  # recuperado do audit log depois de um período fora do ar
+
+# Partes fixas dos embeds de voz
+VOICE_TITLE = "🔍 Log de Auditoria - Movimentação de Voz"
+VOICE_COLOR = 0x00ff00  # Verde para barra lateral
+VOICE_EMOJI = "💬"
+VOICE_JOINED = "entrou no canal de voz"
+VOICE_LEFT = "saiu do canal de voz"
+VOICE_MOVED_IN = "foi movido para o canal de voz"
+VOICE_REMOVED = "foi removido do canal de voz"
+VOICE_CHAIN = "passou por"
+VOICE_OUTSIDE = "fora da voz"
+
+# Partes fixas dos embeds de auditoria (bans e unbans)
+AUDIT_COLOR = 0xff6b6b
+AUDIT_TITLES = {
+    'ban': "🔍 Log de Auditoria - Usuário Banido",
+    'unban': "🔍 Log de Auditoria - Usuário Desbanido",
+}
+
+# Campos fixos, montados uma única vez
+OWN_MOVE_FIELDS = (("📝 Ação", "Movimentação própria"),)
+SYSTEM_MODERATOR_FIELDS = (("👮 Moderador", "Sistema/Moderador"), ("📝 Ação", "Movido por moderador"))
+REPLAYED_FIELD = ("♻️ Reenviado", "Evento registrado antes de uma reinicialização do bot")
+FALLBACK_FIELD = ("⚠️ Aviso", "Canal de auditoria não disponível - enviado para canal alternativo")
+BACKFILL_FIELD = ("🕒 Recuperado", "Ocorreu enquanto o bot estava fora do ar (lido do audit log)")
+
+# Resumos de bans/unbans em massa
+BURST_TITLES = {
+    'ban': "🔍 Log de Auditoria - Banimento em Massa",
+    'unban': "🔍 Log de Auditoria - Desbanimento em Massa",
+}
+BURST_LINES_PER_EMBED = 15
+BURST_MAX_EMBEDS = 3
+
+
+class VoiceEvent(NamedTuple):
+    """Entrada, saída ou troca de canal de voz de um membro"""
+
+    guild_id: int
+    user_id: int
+    user_name: str
+    display_name: str
+    before_id: Optional[int]
+    before_name: Optional[str]
+    after_id: Optional[int]
+    after_name: Optional[str]
+    moderator_id: Optional[int] = None
+    moderator_name: Optional[str] = None
+    created_at: float = 0.0
+    flags: int = 0
+    # Sequência agrupada de canais (None = fora da voz) e sua duração em segundos
+    path: tuple = ()
+    duration: float = 0.0
+
+    kind = 'voice'
+
+    @property
+    def target_id(self):
+        return self.user_id
+
+
+class AuditEvent(NamedTuple):
+    """Ban ou unban de um usuário"""
+
+    guild_id: int
+    kind: str
+    target_id: int
+    moderator_id: Optional[int]
+    reason: Optional[str] = None
+    created_at: float = 0.0
+    flags: int = 0
+
+
+class BanBurst(NamedTuple):
+    """Bans ou unbans em sequência de um servidor, enviados como resumo"""
+
+    guild_id: int
+    action: str
+    # (target_id, nome, moderator_id, motivo, horário) de cada usuário
+    entries: tuple
+    started_at: float
+    ended_at: float
+    flags: int = 0
+
+    kind = 'burst'
+    target_id = None
+    moderator_id = None
+
+
+def burst_events(record):
+    """Um AuditEvent por usuário do resumo (para o journal e o !historico)"""
+    return [
+        AuditEvent(record.guild_id, record.action, target_id, moderator_id, reason, created_at, record.flags)
+        for target_id, _, moderator_id, reason, created_at in record.entries
+    ]
+
+
+def voice_event(member, before_channel, after_channel, moderator=None, created_at=None):
+    """Captura um evento de voz sem montar o embed"""
+    return VoiceEvent(
+        member.guild.id, member.id, member.name, member.display_name,
+        before_channel.id if before_channel else None,
+        before_channel.name if before_channel else None,
+        after_channel.id if after_channel else None,
+        after_channel.name if after_channel else None,
+        moderator.id if moderator else None,
+        moderator.name if moderator else None,
+        created_at or time.time(),
+    )
+
+
+def audit_event(guild, kind, target, moderator=None, reason=None):
+    """Captura um ban/unban sem montar o embed"""
+    return AuditEvent(
+        guild.id, kind, target.id,
+        moderator.id if moderator else None,
+        reason, time.time(),
+    )
+
+
+def to_payload(record):
+    """Campos do registro para o journal"""
+    return record._asdict()
+
+
+def from_payload(kind, payload):
+    """Reconstrói o registro gravado no journal (None se o formato não for reconhecido)"""
+    cls = VoiceEvent if kind == 'voice' else AuditEvent
+    if not isinstance(payload, dict):
+        return None
+    try:
+        fields = {name: payload[name] for name in cls._fields if name in payload}
+        if 'path' in fields:
+            fields['path'] = tuple(fields['path'])
+        return cls(**fields)
+    except TypeError:
+        return None
+
+
+class EmbedRenderer:
+    """Monta os embeds dos registros no momento do envio
+
+    Títulos, cores e campos fixos de cada tipo de evento são constantes do
+    módulo; o horário do rodapé é formatado uma vez por minuto.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._footer_minute = None
+        self._footer_time = ''
+
+    def __call__(self, record):
+        """Retorna a lista de embeds do registro (a troca de canal gera dois)"""
+        if record.kind == 'voice':
+            return self.render_voice(record)
+        if record.kind == 'burst':
+            return self.render_burst(record)
+        return [self.render_audit(record)]
+
+    def attachments(self, record):
+        """Arquivos (nome, conteúdo) enviados junto com os embeds do registro (só resumos em massa)"""
+        if record.kind != 'burst':
+            return None
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(('user_id', 'nome', 'moderador_id', 'motivo', 'horario_utc'))
+        for target_id, name, moderator_id, reason, created_at in record.entries:
+            writer.writerow((
+                target_id, name, moderator_id or '', reason or '',
+                datetime.fromtimestamp(created_at, timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+            ))
+        filename = f"{record.action}s-{record.guild_id}-{int(record.started_at)}.csv"
+        return [(filename, buffer.getvalue().encode('utf-8'))]
+
+    def _clock(self, created_at):
+        """Horário local do rodapé, em cache por minuto"""
+        minute = int(created_at // 60)
+        if minute != self._footer_minute:
+            self._footer_minute = minute
+            self._footer_time = datetime.fromtimestamp(created_at).strftime("%d/%m/%Y às %H:%M")
+        return self._footer_time
+
+    def _moderator_fields(self, record):
+        if record.moderator_id is None:
+            return OWN_MOVE_FIELDS
+        me = self.bot.user
+        if me is not None and record.moderator_id == me.id:
+            return SYSTEM_MODERATOR_FIELDS
+        return (
+            ("👮 Moderador", f"<@{record.moderator_id}> ({record.moderator_id})"),
+            ("📝 Ação", f"Movido por {record.moderator_name}"),
+        )
+
+    @staticmethod
+    def _add_flag_fields(embed, flags):
+        if flags & FLAG_FALLBACK:
+            embed.add_field(name=FALLBACK_FIELD[0], value=FALLBACK_FIELD[1], inline=False)
+        if flags & FLAG_REPLAYED:
+            embed.add_field(name=REPLAYED_FIELD[0], value=REPLAYED_FIELD[1], inline=False)
+        if flags & FLAG_BACKFILL:
+            embed.add_field(name=BACKFILL_FIELD[0], value=BACKFILL_FIELD[1], inline=False)
+
+    def render_voice(self, record):
+        if record.path:
+            return [self.render_voice_chain(record)]
+        moderated = record.moderator_id is not None
+        if record.before_id is not None and record.after_id is not None:
+            # Troca de canal: uma mensagem de saída e outra de entrada
+            parts = ((VOICE_LEFT, record.before_name), (VOICE_JOINED, record.after_name))
+        elif record.after_id is not None:
+            parts = ((VOICE_MOVED_IN if moderated else VOICE_JOINED, record.after_name),)
+        else:
+            parts = ((VOICE_REMOVED if moderated else VOICE_LEFT, record.before_name),)
+
+        user_display = f"@{record.display_name} <{record.user_name}>"
+        user_field = f"<@{record.user_id}> ({record.user_id})"
+        moderator_fields = self._moderator_fields(record)
+        timestamp = datetime.fromtimestamp(record.created_at, timezone.utc)
+        footer = f"ID do usuário: {record.user_id} • {self._clock(record.created_at)}"
+
+        embeds = []
+        for action, channel_name in parts:
+            embed = discord.Embed(
+                title=VOICE_TITLE,
+                description=f"👉🎶 {user_display} {action} {VOICE_EMOJI} • {channel_name}",
+                color=VOICE_COLOR,
+                timestamp=timestamp,
+            )
+            embed.add_field(name="👤 Usuário", value=user_field, inline=True)
+            embed.add_field(name="📺 Canal", value=channel_name, inline=True)
+            for name, value in moderator_fields:
+                embed.add_field(name=name, value=value, inline=True)
+            self._add_flag_fields(embed, record.flags)
+            embed.set_footer(text=footer)
+            embeds.append(embed)
+        return embeds
+
+    def render_voice_chain(self, record):
+        """Sequência de movimentações agrupadas em um único embed"""
+        route = " → ".join(name if name is not None else VOICE_OUTSIDE for name in record.path)
+        embed = discord.Embed(
+            title=VOICE_TITLE,
+            description=(
+                f"👉🎶 @{record.display_name} <{record.user_name}> {VOICE_CHAIN} "
+                f"{VOICE_EMOJI} {route} em {record.duration:.0f}s"
+            ),
+            color=VOICE_COLOR,
+            timestamp=datetime.fromtimestamp(record.created_at, timezone.utc),
+        )
+        embed.add_field(name="👤 Usuário", value=f"<@{record.user_id}> ({record.user_id})", inline=True)
+        embed.add_field(name="🔀 Movimentações", value=str(len(record.path) - 1), inline=True)
+        for name, value in OWN_MOVE_FIELDS:
+            embed.add_field(name=name, value=value, inline=True)
+        self._add_flag_fields(embed, record.flags)
+        embed.set_footer(text=f"ID do usuário: {record.user_id} • {self._clock(record.created_at)}")
+        return embed
+
+    def render_audit(self, record):
+        embed = discord.Embed(
+            title=AUDIT_TITLES.get(record.kind) or f"🔍 Log de Auditoria - {record.kind}",
+            color=AUDIT_COLOR,
+            timestamp=datetime.fromtimestamp(record.created_at, timezone.utc),
+        )
+        if record.moderator_id is not None:
+            embed.add_field(name="👮 Moderador", value=f"<@{record.moderator_id}> ({record.moderator_id})", inline=True)
+        embed.add_field(name="🎯 Alvo", value=f"<@{record.target_id}> ({record.target_id})", inline=True)
+        if record.reason:
+            embed.add_field(name="📝 Motivo", value=record.reason, inline=False)
+        self._add_flag_fields(embed, record.flags)
+        embed.set_footer(text=f"ID do Servidor: {record.guild_id}")
+        return embed
+
+    def render_burst(self, record):
+        """Resumo de bans/unbans em massa: até BURST_MAX_EMBEDS embeds, lista completa no CSV anexo"""
+        total = len(record.entries)
+        action = "banido(s)" if record.action == 'ban' else "desbanido(s)"
+        start = datetime.fromtimestamp(record.started_at).strftime("%H:%M:%S")
+        end = datetime.fromtimestamp(record.ended_at).strftime("%H:%M:%S")
+        title = BURST_TITLES.get(record.action) or f"🔍 Log de Auditoria - {record.action} em massa"
+        shown = record.entries[:BURST_LINES_PER_EMBED * BURST_MAX_EMBEDS]
+
+        embeds = []
+        for index in range(0, len(shown), BURST_LINES_PER_EMBED):
+            lines = [
+                f"<@{target_id}> `{name[:32]}`" + (f" - {reason[:40]}" if reason else "")
+                for target_id, name, _, reason, _ in shown[index:index + BURST_LINES_PER_EMBED]
+            ]
+            embeds.append(discord.Embed(
+                title=title if index == 0 else None,
+                description="\n".join(lines),
+                color=AUDIT_COLOR,
+            ))
+
+        first = embeds[0]
+        first.description = f"**{total}** usuário(s) {action} entre {start} e {end}\n\n" + first.description
+        moderators = Counter(moderator_id for _, _, moderator_id, _, _ in record.entries if moderator_id is not None)
+        if moderators:
+            first.add_field(
+                name="👮 Moderadores",
+                value="\n".join(f"<@{moderator_id}>: {count}" for moderator_id, count in moderators.most_common(5)),
+                inline=False,
+            )
+
+        last = embeds[-1]
+        if total > len(shown):
+            last.add_field(name="📎 Lista completa", value=f"Mais {total - len(shown)} usuário(s) no arquivo anexo", inline=False)
+        self._add_flag_fields(last, record.flags)
+        last.timestamp = datetime.fromtimestamp(record.ended_at, timezone.utc)
+        last.set_footer(text=f"ID do Servidor: {record.guild_id} • lista completa em CSV anexo")
+        return embeds
@@ -0,0 +1,367 @@
+"""Exportação completa do audit log de um servidor para JSONL ou CSV compactados
+
+As entradas são lidas página a página (guild.audit_logs, 100 por chamada,
+da mais nova para a mais antiga) e gravadas em gzip conforme chegam, então
+a memória usada não depende do tamanho do audit log. A cada
+EXPORT_CHECKPOINT_ENTRIES entradas o membro gzip atual é fechado e um
+cursor (ID da última entrada gravada e tamanho do arquivo) é salvo ao lado
+do arquivo; uma exportação interrompida continua dali, sem duplicar linhas.
+Rate limits longos demais para o discord.py esperar sozinho pausam a
+exportação até o bucket liberar.
+
+Uso pela linha de comando (só API REST, sem conectar ao gateway):
+    python export.py 123456789012345678
+    python export.py 123456789012345678 --acoes ban,unban --formato csv --dias 30
+    python export.py 123456789012345678 --saida auditoria.jsonl.gz
+"""
+import argparse
+import asyncio
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from typing import NamedTuple
+
+import discord
+
+from config import DISCORD_TOKEN, DISCORD_API_BASE, RATELIMIT_MAX_WAIT, EXPORT_DIR, EXPORT_CHECKPOINT_ENTRIES
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ('jsonl', 'csv')
+
+CSV_COLUMNS = ('id', 'created_at', 'action', 'user_id', 'target_id', 'target_type', 'reason', 'changes', 'extra')
+
+# Sufixo do arquivo de cursor, gravado ao lado da exportação
+CURSOR_SUFFIX = '.cursor'
+
+
+class ExportResult(NamedTuple):
+    path: str
+    entries: int
+    # Entradas que já estavam no arquivo de uma exportação interrompida
+    resumed: int
+    size: int
+
+
+def parse_actions(text):
+    """Nomes de AuditLogAction separados por vírgula ('todas' ou vazio = sem filtro)"""
+    if not text or text.strip().lower() in ('todas', 'all'):
+        return []
+    actions = []
+    for name in text.split(','):
+        name = name.strip().lower()
+        if not name:
+            continue
+        try:
+            actions.append(discord.AuditLogAction[name])
+        except KeyError:
+            raise ValueError(f"ação desconhecida: {name}") from None
+    return actions
+
+
+def default_path(guild_id, actions, fmt, days=0, directory=EXPORT_DIR):
+    """Caminho fixo por servidor, ações, formato e dias (repetir a exportação retoma a interrompida)"""
+    label = '+'.join(action.name for action in actions) or 'todas'
+    if days:
+        label += f"-{days}d"
+    return os.path.join(directory, f"audit-{guild_id}-{label}.{fmt}.gz")
+
+
+def _plain(value):
+    """Converte valores do discord.py (canais, cargos, enums, flags) em tipos do JSON"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (list, tuple, set)):
+        return [_plain(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): _plain(item) for key, item in value.items()}
+    if isinstance(value, discord.abc.Snowflake):
+        return value.id
+    # Permissions, Colour e flags
+    if isinstance(getattr(value, 'value', None), int):
+        return value.value
+    if hasattr(value, '__dict__'):
+        return {key: _plain(item) for key, item in vars(value).items() if not key.startswith('_')}
+    return str(value)
+
+
+def entry_to_dict(entry):
+    """Entrada do audit log como dicionário serializável"""
+    try:
+        changes = {
+            'before': {key: _plain(value) for key, value in entry.changes.before},
+            'after': {key: _plain(value) for key, value in entry.changes.after},
+        }
+    except Exception as e:
+        # Mudanças que o discord.py não sabe converter não impedem a exportação da entrada
+        logger.debug("Mudanças da entrada %s não convertidas: %s", entry.id, e)
+        changes = None
+    target = entry.target
+    return {
+        'id': entry.id,
+        'created_at': entry.created_at.isoformat(),
+        'action': entry.action.name,
+        'user_id': entry.user_id,
+        'target_id': getattr(target, 'id', None),
+        'target_type': type(target).__name__ if target is not None else None,
+        'reason': entry.reason,
+        'changes': changes,
+        'extra': _plain(entry.extra),
+    }
+
+
+def encode_rows(rows, fmt):
+    """Linhas de uma página já codificadas (JSONL ou CSV)"""
+    if fmt == 'jsonl':
+        return ''.join(json.dumps(row, ensure_ascii=False, separators=(',', ':')) + '\n' for row in rows).encode('utf-8')
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([
+            json.dumps(row[column], ensure_ascii=False) if column in ('changes', 'extra') and row[column] is not None
+            else '' if row[column] is None else row[column]
+            for column in CSV_COLUMNS
+        ])
+    return buffer.getvalue().encode('utf-8')
+
+
+class GzipAppender:
+    """Arquivo gzip gravado em membros: cada checkpoint fecha um membro completo
+
+    Um arquivo com vários membros é um gzip válido (gzip -d, zcat e o módulo
+    gzip leem todos em sequência). Ao retomar, o que foi escrito depois do
+    último checkpoint é cortado antes de continuar.
+    """
+
+    def __init__(self, path, offset=0):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if offset:
+            self._raw = open(path, 'r+b')
+            self._raw.truncate(offset)
+            self._raw.seek(offset)
+        else:
+            self._raw = open(path, 'wb')
+        self._member = None
+
+    def write(self, data):
+        if self._member is None:
+            self._member = gzip.GzipFile(filename='', mode='wb', fileobj=self._raw)
+        self._member.write(data)
+
+    def checkpoint(self):
+        """Fecha o membro atual, força a gravação em disco e retorna o tamanho do arquivo"""
+        if self._member is not None:
+            self._member.close()
+            self._member = None
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        return self._raw.tell()
+
+    def close(self):
+        offset = self.checkpoint()
+        self._raw.close()
+        return offset
+
+
+def _read_cursor(path):
+    try:
+        with open(path + CURSOR_SUFFIX, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning("Cursor de exportação ilegível em %s: %s", path + CURSOR_SUFFIX, e)
+        return None
+
+
+def _write_cursor(path, cursor):
+    tmp_path = f"{path}{CURSOR_SUFFIX}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(cursor, f)
+    os.replace(tmp_path, path + CURSOR_SUFFIX)
+
+
+class AuditLogExporter:
+    """Exporta o audit log de servidores em streaming, com retomada pelo cursor"""
+
+    def __init__(self, checkpoint_entries=EXPORT_CHECKPOINT_ENTRIES):
+        self.checkpoint_entries = checkpoint_entries
+        # guild_id -> caminho da exportação em andamento (uma por servidor)
+        self.running = {}
+        self.stats = Counter()
+
+    async def export(self, guild, path, actions=(), fmt='jsonl', days=0, progress=None):
+        """Grava o audit log do servidor em `path` e retorna um ExportResult
+
+        actions: AuditLogAction exportadas (vazio = todas), uma passada por ação.
+        days: apenas os últimos N dias, contados a partir do início da exportação
+            (0 = tudo que o Discord guarda). Ao retomar, vale o limite salvo no cursor.
+        progress: corrotina opcional chamada com o total de entradas a cada checkpoint.
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"formato desconhecido: {fmt}")
+        if guild.id in self.running:
+            raise RuntimeError(f"já existe uma exportação em andamento para {self.running[guild.id]}")
+        self.running[guild.id] = path
+        try:
+            return await self._export(guild, path, list(actions), fmt, days, progress)
+        finally:
+            del self.running[guild.id]
+
+    async def _export(self, guild, path, actions, fmt, days, progress):
+        loop = asyncio.get_running_loop()
+        identity = {
+            'guild_id': guild.id,
+            'format': fmt,
+            'actions': [action.name for action in actions],
+            'days': days,
+        }
+        cursor = _read_cursor(path)
+        if cursor is None or not os.path.exists(path):
+            # O limite é fixado no início: retomar no dia seguinte não pode mudar o recorte
+            since = datetime.now(timezone.utc) - timedelta(days=days) if days else None
+            cursor = dict(identity, since=since.isoformat() if since else None,
+                          pass_index=0, before=None, entries=0, offset=0)
+        elif any(cursor.get(key) != value for key, value in identity.items()):
+            # Nunca sobrescrever uma exportação parcial de outros parâmetros
+            raise ValueError(f"{path} é uma exportação interrompida com outros parâmetros "
+                             f"(ações {'+'.join(cursor.get('actions') or []) or 'todas'}, "
+                             f"{cursor.get('format')}, {cursor.get('days') or 0} dias)")
+        since = datetime.fromisoformat(cursor['since']) if cursor.get('since') else None
+        resumed = cursor['entries']
+        if resumed:
+            self.stats['resumed'] += 1
+            logger.info("Retomando exportação de %s em %s (%s entradas já gravadas)", guild.name, path, resumed)
+
+        writer = await loop.run_in_executor(None, GzipAppender, path, cursor['offset'])
+        if fmt == 'csv' and not cursor['offset']:
+            buffer = io.StringIO()
+            csv.writer(buffer).writerow(CSV_COLUMNS)
+            writer.write(buffer.getvalue().encode('utf-8'))
+        passes = actions or [None]
+        unsaved = 0
+        try:
+            while cursor['pass_index'] < len(passes):
+                action = passes[cursor['pass_index']]
+                try:
+                    async for rows in self._pages(guild, action, cursor['before'], since):
+                        data = encode_rows(rows, fmt)
+                        await loop.run_in_executor(None, writer.write, data)
+                        unsaved += len(rows)
+                        cursor['before'] = rows[-1]['id']
+                        self.stats['entries'] += len(rows)
+                        self.stats['pages'] += 1
+                        if unsaved >= self.checkpoint_entries:
+                            await self._checkpoint(loop, writer, path, cursor, unsaved)
+                            unsaved = 0
+                            if progress is not None:
+                                await progress(cursor['entries'])
+                except discord.RateLimited as e:
+                    # O discord.py desistiu de esperar (max_ratelimit_timeout): pausar e continuar do cursor
+                    self.stats['rate_limited'] += 1
+                    logger.warning("Rate limit no audit log de %s, exportação pausada por %.0fs", guild.name, e.retry_after)
+                    await self._checkpoint(loop, writer, path, cursor, unsaved)
+                    unsaved = 0
+                    await asyncio.sleep(e.retry_after)
+                    continue
+                cursor['pass_index'] += 1
+                cursor['before'] = None
+            await self._checkpoint(loop, writer, path, cursor, unsaved)
+        finally:
+            size = await loop.run_in_executor(None, writer.close)
+
+        # Concluída: sem cursor, a próxima exportação com os mesmos parâmetros começa do zero
+        try:
+            os.remove(path + CURSOR_SUFFIX)
+        except FileNotFoundError:
+            pass
+        self.stats['exports'] += 1
+        logger.info("Exportação de %s concluída: %s entradas em %s (%.1f KB)",
+                    guild.name, cursor['entries'], path, size / 1024)
+        return ExportResult(path, cursor['entries'], resumed, size)
+
+    async def _pages(self, guild, action, before, since):
+        """Páginas (listas de dicionários) do audit log, da entrada mais nova para a mais antiga"""
+        options = {'limit': None}
+        if action is not None:
+            options['action'] = action
+        if before is not None:
+            options['before'] = discord.Object(id=before)
+        page = []
+        async for entry in guild.audit_logs(**options):
+            if since is not None and entry.created_at < since:
+                break
+            page.append(entry_to_dict(entry))
+            # O discord.py busca 100 por chamada: gravar no mesmo ritmo
+            if len(page) == 100:
+                yield page
+                page = []
+        if page:
+            yield page
+
+    async def _checkpoint(self, loop, writer, path, cursor, unsaved):
+        cursor['offset'] = await loop.run_in_executor(None, writer.checkpoint)
+        cursor['entries'] += unsaved
+        cursor['updated_at'] = time.time()
+        await loop.run_in_executor(None, _write_cursor, path, dict(cursor))
+
+
+async def run_cli(args):
+    actions = parse_actions(args.acoes)
+    path = args.saida or default_path(args.guild_id, actions, args.formato, args.dias)
+
+    if DISCORD_API_BASE:
+        discord.http.Route.BASE = DISCORD_API_BASE.rstrip('/')
+    client = discord.Client(intents=discord.Intents.none(), max_ratelimit_timeout=RATELIMIT_MAX_WAIT)
+    # Só REST: o audit log não depende do cache do gateway
+    await client.login(DISCORD_TOKEN)
+    try:
+        guild = await client.fetch_guild(args.guild_id)
+
+        async def progress(entries):
+            logger.info("%s entradas exportadas", entries)
+
+        result = await AuditLogExporter().export(guild, path, actions, args.formato, args.dias, progress)
+    finally:
+        await client.close()
+    print(f"{result.entries} entradas em {result.path} ({result.size / 1024:.1f} KB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta o audit log de um servidor para JSONL ou CSV compactados")
+    parser.add_argument('guild_id', type=int, help="ID do servidor")
+    parser.add_argument('--acoes', default='', help="ações separadas por vírgula, ex.: ban,unban,member_move (padrão: todas)")
+    parser.add_argument('--formato', choices=EXPORT_FORMATS, default='jsonl')
+    parser.add_argument('--dias', type=int, default=0, help="apenas os últimos N dias (padrão: tudo)")
+    parser.add_argument('--saida', help=f"arquivo de saída (padrão: {EXPORT_DIR}/audit-<servidor>-<ações>.<formato>.gz)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if not DISCORD_TOKEN:
+        logger.error("Token do Discord não encontrado!")
+        sys.exit(1)
+    try:
+        parse_actions(args.acoes)
+    except ValueError as e:
+        parser.error(str(e))
+
+    asyncio.run(run_cli(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+"""Regras por servidor que descartam eventos antes de qualquer trabalho REST
+
+As regras ficam em um arquivo JSON (FILTER_RULES_PATH), com uma seção
+padrão e sobrescritas por servidor:
+
+    {
+      "default": {"ignore_bots": true, "ignore_afk": true},
+      "guilds": {
+        "123456789012345678": {
+          "ignore_channels": [234567890123456789],
+          "ignore_categories": [345678901234567890],
+          "ignore_roles": [456789012345678901],
+          "ignore_users": [567890123456789012],
+          "moderator_only": true,
+          "events": ["voice_move", "voice_leave", "ban", "unban"]
+        }
+      }
+    }
+
+Cada servidor é compilado uma vez em conjuntos de IDs e máscaras de bits
+(tipos de evento e opções), então a verificação nos handlers é só consulta
+em set e operações com inteiros. O arquivo é relido quando muda (mtime),
+sem reiniciar o bot; um arquivo inválido mantém as regras anteriores.
+"""
+import asyncio
+import json
+import logging
+import os
+from collections import Counter
+
+from config import FILTER_RULES_PATH, FILTER_RELOAD_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Tipos de evento (bits da máscara 'events')
+EVENT_VOICE_JOIN = 1 << 0
+EVENT_VOICE_LEAVE = 1 << 1
+EVENT_VOICE_MOVE = 1 << 2
+EVENT_BAN = 1 << 3
+EVENT_UNBAN = 1 << 4
+EVENT_ALL = EVENT_VOICE_JOIN | EVENT_VOICE_LEAVE | EVENT_VOICE_MOVE | EVENT_BAN | EVENT_UNBAN
+
+EVENT_NAMES = {
+    'voice_join': EVENT_VOICE_JOIN,
+    'voice_leave': EVENT_VOICE_LEAVE,
+    'voice_move': EVENT_VOICE_MOVE,
+    'ban': EVENT_BAN,
+    'unban': EVENT_UNBAN,
+}
+
+# Opções (bits da máscara 'options')
+OPTION_IGNORE_BOTS = 1 << 0
+OPTION_IGNORE_AFK = 1 << 1
+OPTION_MODERATOR_ONLY = 1 << 2
+
+OPTION_NAMES = {
+    'ignore_bots': OPTION_IGNORE_BOTS,
+    'ignore_afk': OPTION_IGNORE_AFK,
+    'moderator_only': OPTION_MODERATOR_ONLY,
+}
+
+ID_LISTS = ('ignore_channels', 'ignore_categories', 'ignore_roles', 'ignore_users')
+
+# Nome da regra contada quando o tipo de evento está desativado
+RULE_EVENTS = 'events'
+
+
+class GuildRules:
+    """Regras compiladas de um servidor"""
+
+    __slots__ = ('events', 'options', 'channels', 'categories', 'roles', 'users')
+
+    def __init__(self, events=EVENT_ALL, options=0, channels=frozenset(), categories=frozenset(),
+                 roles=(), users=frozenset()):
+        self.events = events
+        self.options = options
+        self.channels = channels
+        self.categories = categories
+        # Poucos cargos: verificados um a um com member.get_role (sem montar member.roles)
+        self.roles = roles
+        self.users = users
+
+    @classmethod
+    def compile(cls, spec):
+        unknown = set(spec) - set(OPTION_NAMES) - set(ID_LISTS) - {'events'}
+        if unknown:
+            raise ValueError(f"regras desconhecidas: {', '.join(sorted(unknown))}")
+        events = EVENT_ALL
+        if 'events' in spec:
+            events = 0
+            for name in spec['events']:
+                if name not in EVENT_NAMES:
+                    raise ValueError(f"tipo de evento desconhecido: {name}")
+                events |= EVENT_NAMES[name]
+        options = 0
+        for name, bit in OPTION_NAMES.items():
+            if spec.get(name):
+                options |= bit
+        ids = {name: [int(value) for value in spec.get(name, ())] for name in ID_LISTS}
+        return cls(
+            events=events,
+            options=options,
+            channels=frozenset(ids['ignore_channels']),
+            categories=frozenset(ids['ignore_categories']),
+            roles=tuple(ids['ignore_roles']),
+            users=frozenset(ids['ignore_users']),
+        )
+
+
+def compile_rules(data):
+    """(regras padrão, {guild_id: GuildRules}) a partir do JSON; seções de servidor sobrescrevem a padrão"""
+    if not isinstance(data, dict):
+        raise ValueError("o arquivo de regras deve ser um objeto JSON")
+    default_spec = data.get('default') or {}
+    default = GuildRules.compile(default_spec)
+    guilds = {}
+    for guild_id, spec in (data.get('guilds') or {}).items():
+        guilds[int(guild_id)] = GuildRules.compile({**default_spec, **spec})
+    return default, guilds
+
+
+class EventFilter:
+    """Decide, antes da atribuição e das chamadas REST, se um evento deve ser registrado
+
+    Os métodos de verificação retornam o nome da regra que descartou o
+    evento (contado em stats) ou None para seguir com o evento.
+    """
+
+    def __init__(self, path=FILTER_RULES_PATH, interval=FILTER_RELOAD_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.default = GuildRules()
+        # guild_id -> GuildRules (servidores sem seção própria usam as padrão)
+        self.guilds = {}
+        # Sem regras carregadas as verificações retornam na hora
+        self.active = False
+        self._mtime = None
+        self._task = None
+        # Eventos descartados por regra, recargas e erros de leitura
+        self.stats = Counter()
+
+    def _drop(self, rule):
+        self.stats[rule] += 1
+        return rule
+
+    def check_voice(self, member, before, after):
+        """Troca de canal de voz (antes de identificar o moderador)"""
+        if not self.active:
+            return None
+        rules = self.guilds.get(member.guild.id, self.default)
+        if before is None:
+            event = EVENT_VOICE_JOIN
+        elif after is None:
+            event = EVENT_VOICE_LEAVE
+        else:
+            event = EVENT_VOICE_MOVE
+        if not rules.events & event:
+            return self._drop(RULE_EVENTS)
+        # Entradas nunca são feitas por moderadores
+        if rules.options & OPTION_MODERATOR_ONLY and event == EVENT_VOICE_JOIN:
+            return self._drop('moderator_only')
+        if rules.options & OPTION_IGNORE_BOTS and member.bot:
+            return self._drop('ignore_bots')
+        if member.id in rules.users:
+            return self._drop('ignore_users')
+        for channel in (before, after):
+            if channel is None:
+                continue
+            if channel.id in rules.channels:
+                return self._drop('ignore_channels')
+            if channel.category_id in rules.categories:
+                return self._drop('ignore_categories')
+        if rules.options & OPTION_IGNORE_AFK:
+            afk = member.guild.afk_channel
+            if afk is not None and (before == afk or after == afk):
+                return self._drop('ignore_afk')
+        if rules.roles and any(member.get_role(role_id) is not None for role_id in rules.roles):
+            return self._drop('ignore_roles')
+        return None
+
+    def check_moderator(self, guild, moderator):
+        """Depois da atribuição: com moderator_only, descarta movimentações sem moderador"""
+        if not self.active or moderator is not None:
+            return None
+        if self.guilds.get(guild.id, self.default).options & OPTION_MODERATOR_ONLY:
+            return self._drop('moderator_only')
+        return None
+
+    def check_ban(self, guild, user, kind):
+        """Ban ou unban (antes do fetch_ban)"""
+        if not self.active:
+            return None
+        rules = self.guilds.get(guild.id, self.default)
+        if not rules.events & (EVENT_BAN if kind == 'ban' else EVENT_UNBAN):
+            return self._drop(RULE_EVENTS)
+        # No backfill o alvo pode ser só um discord.Object
+        if rules.options & OPTION_IGNORE_BOTS and getattr(user, 'bot', False):
+            return self._drop('ignore_bots')
+        if user.id in rules.users:
+            return self._drop('ignore_users')
+        # O usuário banido normalmente já saiu do servidor; cargos só valem para membros
+        if rules.roles and hasattr(user, 'get_role') and any(user.get_role(role_id) is not None for role_id in rules.roles):
+            return self._drop('ignore_roles')
+        return None
+
+    # Carga e recarga do arquivo
+
+    def _read(self):
+        """(mtime, dados) do arquivo de regras; None se ele não existir"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        with open(self.path, encoding='utf-8') as f:
+            return mtime, json.load(f)
+
+    def _apply(self, loaded):
+        if loaded is None:
+            if self.active:
+                logger.info("Arquivo de regras %s removido, filtros desativados", self.path)
+            self.default, self.guilds, self.active, self._mtime = GuildRules(), {}, False, None
+            return
+        mtime, data = loaded
+        self.default, self.guilds = compile_rules(data)
+        self.active = True
+        self._mtime = mtime
+        self.stats['reloads'] += 1
+        logger.info("Regras de filtro carregadas de %s (%s servidor(es) com regras próprias)", self.path, len(self.guilds))
+
+    def _current_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _failed(self, error):
+        self.stats['reload_errors'] += 1
+        # Não tentar de novo até o arquivo mudar outra vez
+        self._mtime = self._current_mtime()
+        logger.error("Regras de filtro inválidas em %s, mantendo as anteriores: %s", self.path, error)
+
+    def load(self):
+        """Carrega as regras (síncrono, usado na inicialização)"""
+        try:
+            self._apply(self._read())
+        except (OSError, ValueError, TypeError) as e:
+            self._failed(e)
+
+    async def reload(self):
+        """Relê o arquivo se ele mudou; mantém as regras atuais se o novo conteúdo for inválido"""
+        if self._current_mtime() == self._mtime:
+            return False
+        loop = asyncio.get_running_loop()
+        try:
+            loaded = await loop.run_in_executor(None, self._read)
+            self._apply(loaded)
+        except (OSError, ValueError, TypeError) as e:
+            self._failed(e)
+        return True
+
+    async def start(self):
+        self.load()
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.ensure_future(self._watch())
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.reload()
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def caches(self):
+        return {'filters.guilds': self.guilds}
+
+    def dropped(self):
+        """Eventos descartados por regra (sem os contadores de recarga)"""
+        return Counter({rule: count for rule, count in self.stats.items() if rule not in ('reloads', 'reload_errors')})
@@ -0,0 +1,139 @@
+"""Consulta paginada do histórico de auditoria gravado no journal
+
+O !historico lê o journal (SQLite) com filtros por usuário, moderador, tipo
+e período. Cada página é buscada sob demanda pelo cursor (created_at, id) do
+último evento da página anterior, então o tempo de resposta não depende do
+tamanho do histórico.
+"""
+import logging
+import time
+
+import discord
+from discord.ext import commands
+
+from config import HISTORY_PAGE_SIZE, HISTORY_VIEW_TIMEOUT
+from events import VOICE_OUTSIDE, from_payload
+
+logger = logging.getLogger(__name__)
+
+# Nome do tipo no comando -> kind gravado no journal
+HISTORY_KINDS = {'voz': 'voice', 'ban': 'ban', 'unban': 'unban'}
+
+HISTORY_TITLE = "📜 Histórico de Auditoria"
+HISTORY_COLOR = 0x5865f2
+
+
+class HistoryFlags(commands.FlagConverter):
+    """Filtros do !historico (ex.: `!historico usuario: @Fulano tipo: ban dias: 30`)"""
+
+    usuario: discord.User = commands.flag(default=None, description="Alvo dos eventos")
+    moderador: discord.User = commands.flag(default=None, description="Moderador responsável")
+    tipo: str = commands.flag(default=None, description="voz, ban ou unban")
+    dias: int = commands.flag(default=7, description="Período em dias")
+
+
+def describe(record):
+    """Linha do histórico para um registro do journal"""
+    when = f"<t:{int(record.created_at)}:f>"
+    moderator = f" por <@{record.moderator_id}>" if record.moderator_id is not None else ""
+    if record.kind == 'voice':
+        if record.path:
+            route = " → ".join(name if name is not None else VOICE_OUTSIDE for name in record.path)
+            action = f"passou por {route} em {record.duration:.0f}s"
+        elif record.before_id is not None and record.after_id is not None:
+            action = f"trocou de {record.before_name} para {record.after_name}"
+        elif record.after_id is not None:
+            action = f"entrou em {record.after_name}"
+        else:
+            action = f"saiu de {record.before_name}"
+        return f"🎧 {when} <@{record.user_id}> {action}{moderator}"
+
+    icon = "🔨" if record.kind == 'ban' else "🔓"
+    action = "banido" if record.kind == 'ban' else "desbanido" if record.kind == 'unban' else record.kind
+    line = f"{icon} {when} <@{record.target_id}> {action}{moderator}"
+    if record.reason:
+        line += f" - {record.reason[:100]}"
+    return line
+
+
+class HistoryView(discord.ui.View):
+    """Botões de página do !historico (apenas quem executou o comando pode usar)"""
+
+    def __init__(self, journal, guild_id, author_id, filters, page_size=HISTORY_PAGE_SIZE,
+                 timeout=HISTORY_VIEW_TIMEOUT):
+        super().__init__(timeout=timeout)
+        self.journal = journal
+        self.guild_id = guild_id
+        self.author_id = author_id
+        # Argumentos de AuditJournal.search: target_id, moderator_id, kind e since
+        self.filters = filters
+        self.page_size = page_size
+        # Cursor de início de cada página já visitada (a primeira começa do mais novo)
+        self.cursors = [None]
+        self.page = 0
+        self.next_cursor = None
+        self.message = None
+
+    async def render(self):
+        """Busca a página atual e monta o embed"""
+        rows, self.next_cursor = await self.journal.search(
+            self.guild_id, before=self.cursors[self.page], limit=self.page_size, **self.filters
+        )
+        lines = []
+        for _, kind, payload, _ in rows:
+            record = from_payload(kind, payload)
+            if record is not None:
+                lines.append(describe(record))
+
+        embed = discord.Embed(
+            title=HISTORY_TITLE,
+            description="\n".join(lines)[:4000] or "Nenhum evento encontrado com esses filtros.",
+            color=HISTORY_COLOR,
+        )
+        embed.set_footer(text=f"Página {self.page + 1} • {self.describe_filters()}")
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.next_cursor is None
+        return embed
+
+    def describe_filters(self):
+        parts = []
+        if self.filters.get('target_id') is not None:
+            parts.append(f"usuário {self.filters['target_id']}")
+        if self.filters.get('moderator_id') is not None:
+            parts.append(f"moderador {self.filters['moderator_id']}")
+        if self.filters.get('kind') is not None:
+            parts.append(f"tipo {self.filters['kind']}")
+        if self.filters.get('since') is not None:
+            days = (time.time() - self.filters['since']) / 86400
+            parts.append(f"últimos {days:.0f} dia(s)")
+        return ', '.join(parts) or "sem filtros"
+
+    async def interaction_check(self, interaction):
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message("Apenas quem executou o comando pode mudar de página.", ephemeral=True)
+            return False
+        return True
+
+    @discord.ui.button(label="◀ Mais recentes", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction, button):
+        self.page = max(0, self.page - 1)
+        await interaction.response.edit_message(embed=await self.render(), view=self)
+
+    @discord.ui.button(label="Mais antigos ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction, button):
+        if self.next_cursor is not None:
+            if self.page + 1 == len(self.cursors):
+                self.cursors.append(self.next_cursor)
+            else:
+                self.cursors[self.page + 1] = self.next_cursor
+            self.page += 1
+        await interaction.response.edit_message(embed=await self.render(), view=self)
+
+    async def on_timeout(self):
+        for item in self.children:
+            item.disabled = True
+        if self.message is not None:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException as e:
+                logger.debug("Não foi possível desativar os botões do histórico: %s", e)
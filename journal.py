@@ -0,0 +1,261 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from config import JOURNAL_PATH, JOURNAL_FLUSH_INTERVAL, JOURNAL_RETENTION_DAYS
+
+logger = logging.getLogger(__name__)
+
+# Quantidade de eventos pendentes que força uma escrita antes do intervalo
+JOURNAL_BATCH_SIZE = 200
+# Linhas removidas por transação na limpeza da retenção (não segura o banco por muito tempo)
+JOURNAL_PRUNE_BATCH = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL UNIQUE,
+    guild_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    target_id INTEGER,
+    moderator_id INTEGER,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    delivered_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_events_pending ON events (created_at) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_events_target ON events (guild_id, target_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_events_guild ON events (guild_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_events_moderator ON events (guild_id, moderator_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_events_kind ON events (guild_id, kind, created_at);
+CREATE INDEX IF NOT EXISTS idx_events_created ON events (created_at);
+"""
+
+# Estados de um evento no journal
+STATUS_PENDING = 'pending'
+STATUS_DELIVERED = 'delivered'
+STATUS_DROPPED = 'dropped'
+
+
+class AuditJournal:
+    """Journal local (SQLite em modo WAL) com os eventos de auditoria
+
+    Os eventos são gravados em lotes por uma task em segundo plano; o acesso
+    ao SQLite acontece em uma thread dedicada para não bloquear o event loop.
+    A chave de idempotência de cada evento impede gravações duplicadas e
+    permite reenviar no próximo início apenas o que ficou pendente. Um evento
+    entregue nos últimos JOURNAL_FLUSH_INTERVAL segundos antes de uma queda
+    ainda pode ser reenviado.
+    """
+
+    def __init__(self, path=JOURNAL_PATH, flush_interval=JOURNAL_FLUSH_INTERVAL,
+                 retention_days=JOURNAL_RETENTION_DAYS):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        # Uma única thread: a conexão SQLite só é usada por ela
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='journal')
+        self._conn = None
+        # Maior id gravado antes da abertura: só esses eventos são de execuções anteriores
+        self._opened_id = 0
+        self._rows = []
+        self._status_updates = []
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self.stats = Counter()
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def open(self):
+        """Abre o banco e inicia a task de escrita"""
+        await self._run(self._open)
+        self._task = asyncio.ensure_future(self._writer())
+        logger.info("Journal de auditoria aberto em %s", self.path)
+
+    def _open(self):
+        self._conn = sqlite3.connect(self.path)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        self._opened_id = self._conn.execute('SELECT COALESCE(MAX(id), 0) FROM events').fetchone()[0]
+        self._optimize()
+
+    def _optimize(self):
+        """Atualiza as estatísticas dos índices usadas pelo planejador nas buscas do histórico"""
+        self._conn.execute('PRAGMA analysis_limit=1000')
+        self._conn.execute('PRAGMA optimize')
+
+    async def close(self):
+        """Grava o que estiver pendente e fecha o banco"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
+        self._executor.shutdown(wait=False)
+
+    def record(self, key, guild_id, kind, payload, target_id=None, moderator_id=None, created_at=None):
+        """Adiciona um evento ao próximo lote de escrita (não bloqueia)"""
+        self._rows.append((
+            key, guild_id, kind, target_id, moderator_id,
+            json.dumps(payload, ensure_ascii=False, separators=(',', ':')),
+            created_at or time.time(),
+        ))
+        self.stats['recorded'] += 1
+        if len(self._rows) >= JOURNAL_BATCH_SIZE:
+            self._wakeup.set()
+
+    def mark_delivered(self, keys):
+        now = time.time()
+        self._status_updates.extend((STATUS_DELIVERED, now, key) for key in keys)
+
+    def mark_dropped(self, keys):
+        """Eventos descartados por sobrecarga (já contados no resumo enviado)"""
+        now = time.time()
+        self._status_updates.extend((STATUS_DROPPED, now, key) for key in keys)
+
+    async def _writer(self):
+        last_prune = 0.0
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+                if time.monotonic() - last_prune > 3600:
+                    last_prune = time.monotonic()
+                    await self._run(self._prune)
+            except Exception as e:
+                self.stats['write_errors'] += 1
+                logger.error("Erro ao gravar journal de auditoria: %s", e)
+
+    async def flush(self):
+        """Grava o lote atual em uma única transação"""
+        if not self._rows and not self._status_updates:
+            return
+        rows, self._rows = self._rows, []
+        updates, self._status_updates = self._status_updates, []
+        await self._run(self._write, rows, updates)
+        self.stats['batches'] += 1
+
+    def _write(self, rows, updates):
+        with self._conn:
+            # Inserções primeiro: um evento pode ser entregue no mesmo lote em que foi gravado
+            # Uma chave gravada de novo atualiza o conteúdo (bans em massa completados no resumo)
+            self._conn.executemany(
+                'INSERT INTO events (key, guild_id, kind, target_id, moderator_id, payload, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (key) DO UPDATE SET moderator_id = excluded.moderator_id, payload = excluded.payload',
+                rows,
+            )
+            self._conn.executemany('UPDATE events SET status = ?, delivered_at = ? WHERE key = ?', updates)
+
+    def _prune(self):
+        """Remove eventos já resolvidos mais antigos que a retenção, em lotes"""
+        cutoff = time.time() - self.retention_days * 86400
+        removed = 0
+        while True:
+            with self._conn:
+                cursor = self._conn.execute(
+                    "DELETE FROM events WHERE id IN ("
+                    "SELECT id FROM events WHERE created_at < ? AND status != 'pending' LIMIT ?)",
+                    (cutoff, JOURNAL_PRUNE_BATCH),
+                )
+            removed += cursor.rowcount
+            if cursor.rowcount < JOURNAL_PRUNE_BATCH:
+                break
+        self._optimize()
+        if removed:
+            self.stats['pruned'] += removed
+            logger.info("%s evento(s) removido(s) do journal pela retenção de %s dia(s)", removed, self.retention_days)
+
+    async def has_event(self, guild_id, kind, target_id, since):
+        """Indica se já existe um evento do alvo no servidor desde o momento informado"""
+        await self.flush()
+        return await self._run(self._has_event, guild_id, kind, target_id, since)
+
+    def _has_event(self, guild_id, kind, target_id, since):
+        cursor = self._conn.execute(
+            "SELECT 1 FROM events WHERE guild_id = ? AND target_id = ? AND created_at >= ? AND kind = ? LIMIT 1",
+            (guild_id, target_id, since, kind),
+        )
+        return cursor.fetchone() is not None
+
+    async def pending(self, max_age, limit):
+        """Eventos gravados antes da abertura do journal e nunca entregues, do mais antigo ao mais novo
+
+        Os gravados por este processo ainda estão nas filas de entrega e não
+        entram no reenvio.
+        """
+        await self.flush()
+        return await self._run(self._pending, time.time() - max_age, limit)
+
+    def _pending(self, since, limit):
+        with self._conn:
+            # Eventos antigos demais para reenviar deixam de ser pendentes
+            self._conn.execute(
+                "UPDATE events SET status = 'dropped' WHERE status = 'pending' AND created_at < ? AND id <= ?",
+                (since, self._opened_id),
+            )
+        cursor = self._conn.execute(
+            "SELECT key, guild_id, kind, payload FROM events "
+            "WHERE status = 'pending' AND created_at >= ? AND id <= ? ORDER BY created_at LIMIT ?",
+            (since, self._opened_id, limit),
+        )
+        return [(key, guild_id, kind, json.loads(payload)) for key, guild_id, kind, payload in cursor]
+
+    async def search(self, guild_id, target_id=None, moderator_id=None, kind=None,
+                     since=None, before=None, limit=10):
+        """Página do histórico do servidor, do evento mais novo ao mais antigo
+
+        `before` é o cursor (created_at, id) do último evento da página
+        anterior: cada página é uma leitura de até `limit` linhas em um dos
+        índices, qualquer que seja o tamanho do histórico. Retorna a lista de
+        (id, kind, payload, created_at) e o cursor da próxima página (ou None).
+        """
+        await self.flush()
+        return await self._run(self._search, guild_id, target_id, moderator_id, kind, since, before, limit)
+
+    def _search(self, guild_id, target_id, moderator_id, kind, since, before, limit):
+        conditions = ['guild_id = ?']
+        params = [guild_id]
+        if target_id is not None:
+            conditions.append('target_id = ?')
+            params.append(target_id)
+        if moderator_id is not None:
+            conditions.append('moderator_id = ?')
+            params.append(moderator_id)
+        if kind is not None:
+            conditions.append('kind = ?')
+            params.append(kind)
+        if since is not None:
+            conditions.append('created_at >= ?')
+            params.append(since)
+        if before is not None:
+            conditions.append('(created_at, id) < (?, ?)')
+            params.extend(before)
+        params.append(limit + 1)
+        cursor = self._conn.execute(
+            f"SELECT id, kind, payload, created_at FROM events WHERE {' AND '.join(conditions)} "
+            "ORDER BY created_at DESC, id DESC LIMIT ?",
+            params,
+        )
+        rows = [(event_id, kind, json.loads(payload), created_at) for event_id, kind, payload, created_at in cursor]
+        self.stats['searches'] += 1
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last_id, _, _, last_created_at = rows[-1]
+            return rows, (last_created_at, last_id)
+        return rows, None
@@ -0,0 +1,74 @@
+import atexit
+import json
+import logging
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from config import LOG_LEVEL, LOG_FILE, LOG_FORMAT, LOG_MAX_BYTES, LOG_BACKUP_COUNT
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Atributos padrão de um LogRecord (o resto veio de extra= e vai para o JSON)
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formata cada registro como uma linha JSON"""
+
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                data[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """QueueHandler que deixa a formatação para a thread de escrita
+
+    O QueueHandler padrão formata a mensagem na thread que chamou o logger
+    (o event loop). Aqui só a traceback é resolvida antes de enfileirar;
+    os argumentos são formatados pelo listener.
+    """
+
+    def prepare(self, record):
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(level=LOG_LEVEL, path=LOG_FILE, fmt=LOG_FORMAT,
+                  max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT):
+    """Configura o logging com escrita em segundo plano e rotação do arquivo"""
+    formatter = JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT)
+
+    handlers = [logging.StreamHandler()]
+    if path:
+        handlers.append(RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True,
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(DeferredQueueHandler(log_queue))
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    return listener
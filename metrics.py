@@ -0,0 +1,298 @@
+"""Métricas no formato de texto do Prometheus e servidor HTTP de saúde
+
+O servidor roda no mesmo event loop do bot e expõe:
+    /healthz  - vivo enquanto o gateway não ficar desconectado por mais de HEALTH_GRACE
+    /readyz   - pronto quando todos os shards estão conectados
+    /metrics  - contadores, histogramas e filas em texto do Prometheus
+
+Contadores que já existem nos outros módulos (stats do agendador, do
+índice de moderadores etc.) são lidos no momento da coleta.
+"""
+import functools
+import logging
+import math
+import time
+from bisect import bisect_left
+from collections import Counter
+
+import aiohttp
+from aiohttp import web
+
+from config import HEALTH_HOST, HEALTH_PORT, HEALTH_GRACE, METRICS_PER_GUILD
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'botrevenge'
+
+# Limites (segundos) dos histogramas de latência
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Histograma cumulativo com limites fixos"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        # Uma posição por limite e uma para +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name, labels=()):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            cumulative += count
+            le = '+Inf' if bound == math.inf else repr(bound)
+            yield f'{name}_bucket', labels + (('le', le),), cumulative
+        yield f'{name}_sum', labels, self.sum
+        yield f'{name}_count', labels, self.count
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_sample(name, labels, value):
+    if labels:
+        rendered = ','.join(f'{key}="{_escape(label)}"' for key, label in labels)
+        return f'{name}{{{rendered}}} {value}'
+    return f'{name} {value}'
+
+
+class Metrics:
+    """Registro das métricas do processo"""
+
+    def __init__(self, per_guild=METRICS_PER_GUILD):
+        self.per_guild = per_guild
+        # (método, status) -> chamadas REST feitas pelo bot e pelos webhooks
+        self.rest_calls = Counter()
+        self.rest_errors = Counter()
+        # handler -> Histogram da duração em segundos
+        self.handler_latency = {}
+        # Funções que retornam famílias (nome, tipo, ajuda, amostras) na coleta
+        self._collectors = []
+
+    def guild_label(self, guild_id):
+        return str(guild_id) if self.per_guild else 'all'
+
+    def trace_config(self):
+        """TraceConfig do aiohttp que conta as requisições REST e os 429"""
+        trace = aiohttp.TraceConfig()
+
+        async def on_request_end(session, context, params):
+            self.rest_calls[params.method, params.response.status] += 1
+
+        async def on_request_exception(session, context, params):
+            self.rest_errors[params.method, type(params.exception).__name__] += 1
+
+        trace.on_request_end.append(on_request_end)
+        trace.on_request_exception.append(on_request_exception)
+        return trace
+
+    def timed(self, name):
+        """Decorator que mede a duração de um handler de eventos"""
+        histogram = self.handler_latency.setdefault(name, Histogram())
+
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def register(self, collector):
+        self._collectors.append(collector)
+
+    def families(self):
+        yield (
+            f'{PREFIX}_rest_requests_total', 'counter', "Requisições REST ao Discord por método e status",
+            [((('method', method), ('status', status)), count) for (method, status), count in self.rest_calls.items()],
+        )
+        yield (
+            f'{PREFIX}_rest_ratelimit_hits_total', 'counter', "Respostas 429 (rate limit) recebidas do Discord",
+            [((), sum(count for (_, status), count in self.rest_calls.items() if status == 429))],
+        )
+        yield (
+            f'{PREFIX}_rest_errors_total', 'counter', "Requisições REST que falharam sem resposta",
+            [((('method', method), ('error', error)), count) for (method, error), count in self.rest_errors.items()],
+        )
+        handler_samples = []
+        for handler, histogram in self.handler_latency.items():
+            handler_samples.extend(histogram.samples(f'{PREFIX}_handler_seconds', (('handler', handler),)))
+        yield (f'{PREFIX}_handler_seconds', 'histogram', "Duração dos handlers de eventos", handler_samples)
+
+        for collector in self._collectors:
+            try:
+                yield from collector(self)
+            except Exception as e:
+                logger.error("Erro ao coletar métricas: %s", e)
+
+    def render(self):
+        lines = []
+        for name, kind, help_text, samples in self.families():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for sample in samples:
+                if len(sample) == 3:
+                    lines.append(_format_sample(*sample))
+                else:
+                    labels, value = sample
+                    lines.append(_format_sample(name, labels, value))
+        lines.append('')
+        return '\n'.join(lines)
+
+
+def collect_shards(shard_monitor):
+    def collector(metrics):
+        events = Counter()
+        for guild_id, counts in shard_monitor.events.items():
+            guild = metrics.guild_label(guild_id)
+            for event_type, count in counts.items():
+                events[event_type, guild] += count
+        yield (
+            f'{PREFIX}_events_total', 'counter', "Eventos tratados por tipo e servidor",
+            [((('type', event_type), ('guild', guild)), count) for (event_type, guild), count in events.items()],
+        )
+        yield (
+            f'{PREFIX}_gateway_events_total', 'counter', "Eventos recebidos do gateway por tipo",
+            [((('type', event_type),), count) for event_type, count in shard_monitor.gateway_events.items()],
+        )
+        yield (
+            f'{PREFIX}_gateway_latency_seconds', 'gauge', "Latência do heartbeat por shard",
+            [((('shard', shard_id),), latency) for shard_id, latency in shard_monitor.latencies().items()
+             if latency is not None and math.isfinite(latency)],
+        )
+    return collector
+
+
+def collect_delivery(scheduler):
+    def collector(metrics):
+        depths = Counter()
+        for guild_id, depth in scheduler.depths().items():
+            depths[metrics.guild_label(guild_id)] += depth
+        yield (
+            f'{PREFIX}_delivery_queue_depth', 'gauge', "Eventos aguardando envio por servidor",
+            [((('guild', guild),), depth) for guild, depth in depths.items()],
+        )
+        yield (
+            f'{PREFIX}_delivery_oldest_seconds', 'gauge', "Espera do evento mais antigo na fila de entrega",
+            [((), scheduler.oldest_wait())],
+        )
+        yield (
+            f'{PREFIX}_delivery_wait_seconds', 'gauge', "Percentis recentes da espera na fila de entrega",
+            [((('quantile', q),), scheduler.wait_percentile(q * 100)) for q in (0.5, 0.99)],
+        )
+        for stat, help_text in (
+            ('events', "Eventos enfileirados para envio"),
+            ('messages', "Mensagens enviadas"),
+            ('dropped', "Eventos de voz descartados por sobrecarga"),
+            ('rate_limited', "Lotes devolvidos à fila por rate limit"),
+            ('failures', "Envios que falharam"),
+        ):
+            yield (f'{PREFIX}_delivery_{stat}_total', 'counter', help_text, [((), scheduler.stats[stat])])
+    return collector
+
+
+def collect_startup(startup):
+    def collector(metrics):
+        yield (
+            f'{PREFIX}_startup_seconds', 'gauge', "Tempo até cada fase da inicialização",
+            [((('phase', phase),), seconds) for phase, seconds in startup.marks.items()],
+        )
+    return collector
+
+
+def collect_memory(report):
+    """Entradas e bytes aproximados por cache (report() devolve a lista de CacheUsage)"""
+    def collector(metrics):
+        usage = report()
+        yield (
+            f'{PREFIX}_cache_entries', 'gauge', "Itens guardados por cache",
+            [((('cache', item.name),), item.entries) for item in usage],
+        )
+        yield (
+            f'{PREFIX}_cache_bytes', 'gauge', "Bytes aproximados por cache (por amostragem)",
+            [((('cache', item.name),), item.bytes) for item in usage],
+        )
+    return collector
+
+
+def collect_stats(name, stats, help_text):
+    """Expõe um Counter de estatísticas como contador com o label 'kind'"""
+    def collector(metrics):
+        yield (
+            f'{PREFIX}_{name}_total', 'counter', help_text,
+            [((('kind', kind),), count) for kind, count in stats.items()],
+        )
+    return collector
+
+
+class HealthServer:
+    """Servidor HTTP de saúde e métricas no event loop do bot"""
+
+    def __init__(self, bot, metrics, shard_monitor, host=HEALTH_HOST, port=HEALTH_PORT, grace=HEALTH_GRACE):
+        self.bot = bot
+        self.metrics = metrics
+        self.shard_monitor = shard_monitor
+        self.host = host
+        self.port = port
+        self.grace = grace
+        # Última vez em que todos os shards estavam conectados (começa na inicialização)
+        self._last_connected = time.monotonic()
+        self._runner = None
+
+    def is_connected(self):
+        """Bot pronto e com heartbeat em todos os shards"""
+        if self.bot.is_closed() or not self.bot.is_ready():
+            return False
+        latencies = self.shard_monitor.latencies().values()
+        connected = bool(latencies) and all(latency is not None and math.isfinite(latency) for latency in latencies)
+        if connected:
+            self._last_connected = time.monotonic()
+        return connected
+
+    async def healthz(self, request):
+        if self.is_connected() or time.monotonic() - self._last_connected < self.grace:
+            return web.Response(text='ok')
+        return web.Response(status=503, text='gateway desconectado')
+
+    async def readyz(self, request):
+        ready = self.is_connected()
+        body = {
+            'ready': ready,
+            'guilds': len(self.bot.guilds),
+            'shards': {str(shard_id): latency if latency is not None and math.isfinite(latency) else None
+                       for shard_id, latency in self.shard_monitor.latencies().items()},
+        }
+        return web.json_response(body, status=200 if ready else 503)
+
+    async def metrics_handler(self, request):
+        return web.Response(body=self.metrics.render().encode('utf-8'),
+                            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/healthz', self.healthz)
+        app.router.add_get('/readyz', self.readyz)
+        app.router.add_get('/metrics', self.metrics_handler)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        logger.info("Servidor de saúde e métricas em http://%s:%s", self.host, self.port)
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
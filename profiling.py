@@ -0,0 +1,244 @@
+"""Tempos por fase dos handlers e profiler por amostragem
+
+Cada handler de evento abre um rastro (EventTrace) no contexto da task;
+as fases medidas dentro dele (atribuição, envio, métodos do AuditLogger...)
+entram no rastro e no histórico da fase. O !stats mostra os percentis de
+cada fase e os eventos recentes mais lentos.
+
+O profiler por amostragem é uma thread que lê a pilha do event loop a cada
+PROFILE_SAMPLE_INTERVAL segundos e grava as pilhas no formato "collapsed"
+(uma linha "a;b;c N" por pilha), aceito pelo flamegraph.pl e pelo speedscope.
+"""
+import contextvars
+import functools
+import heapq
+import inspect
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+from config import (
+    PROFILE_ENABLED,
+    PROFILE_SAMPLES,
+    PROFILE_RECENT,
+    PROFILE_DIR,
+    PROFILE_SAMPLE_INTERVAL,
+    PROFILE_MAX_DURATION,
+)
+
+logger = logging.getLogger(__name__)
+
+# Rastro do evento tratado pela task atual
+_current_trace = contextvars.ContextVar('profile_trace', default=None)
+
+
+class EventTrace:
+    """Duração total e fases de um evento tratado"""
+
+    __slots__ = ('handler', 'guild_id', 'started_at', 'total', 'phases')
+
+    def __init__(self, handler, guild_id):
+        self.handler = handler
+        self.guild_id = guild_id
+        self.started_at = time.time()
+        # Preenchido ao fim do handler; fases de tasks filhas depois disso são ignoradas
+        self.total = None
+        self.phases = []
+
+
+class _Phase:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+def _guild_id(args):
+    """Servidor do evento a partir dos argumentos do handler"""
+    for arg in args:
+        guild = getattr(arg, 'guild', None) or (arg if hasattr(arg, 'voice_channels') else None)
+        if guild is not None:
+            return guild.id
+    return None
+
+
+class Profiler:
+    """Histórico em memória dos tempos de cada fase"""
+
+    def __init__(self, enabled=PROFILE_ENABLED, samples=PROFILE_SAMPLES, recent=PROFILE_RECENT):
+        self.enabled = enabled
+        self.samples = samples
+        # fase -> deque com as durações mais recentes (segundos)
+        self.phases = {}
+        self.counts = Counter()
+        self.recent = deque(maxlen=recent)
+        self._sampler = None
+
+    def record(self, name, duration):
+        samples = self.phases.get(name)
+        if samples is None:
+            samples = self.phases[name] = deque(maxlen=self.samples)
+        samples.append(duration)
+        self.counts[name] += 1
+        trace = _current_trace.get()
+        if trace is not None and trace.total is None:
+            trace.phases.append((name, duration))
+
+    def phase(self, name):
+        """Context manager que mede um trecho do handler"""
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name)
+
+    def timed(self, name):
+        """Decorator que mede uma função ou corrotina como uma fase"""
+        def decorator(func):
+            if not self.enabled:
+                return func
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    start = time.perf_counter()
+                    try:
+                        return await func(*args, **kwargs)
+                    finally:
+                        self.record(name, time.perf_counter() - start)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def handler(self, name):
+        """Decorator dos handlers de eventos: abre o rastro do evento"""
+        def decorator(func):
+            if not self.enabled:
+                return func
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                trace = EventTrace(name, _guild_id(args))
+                token = _current_trace.set(trace)
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    duration = time.perf_counter() - start
+                    _current_trace.reset(token)
+                    self.record(name, duration)
+                    trace.total = duration
+                    self.recent.append(trace)
+            return wrapper
+        return decorator
+
+    def percentiles(self, name, percentiles=(50, 95, 99)):
+        samples = sorted(self.phases.get(name, ()))
+        if not samples:
+            return tuple(0.0 for _ in percentiles)
+        last = len(samples) - 1
+        return tuple(samples[min(last, int(len(samples) * p / 100))] for p in percentiles)
+
+    def summary(self):
+        """(fase, total de chamadas, p50, p95, p99), das fases mais lentas para as mais rápidas"""
+        rows = [(name, self.counts[name], *self.percentiles(name)) for name in self.phases]
+        rows.sort(key=lambda row: row[4], reverse=True)
+        return rows
+
+    def slowest(self, count=5):
+        return heapq.nlargest(count, self.recent, key=lambda trace: trace.total)
+
+    @property
+    def sampling(self):
+        return self._sampler is not None and self._sampler.is_alive()
+
+    def start_sampling(self, duration, interval=PROFILE_SAMPLE_INTERVAL, directory=PROFILE_DIR):
+        """Inicia o profiler por amostragem da thread atual (a do event loop)"""
+        if self.sampling:
+            return None
+        duration = min(duration, PROFILE_MAX_DURATION)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"profile-{time.strftime('%Y%m%d-%H%M%S')}.folded")
+        self._sampler = StackSampler(threading.get_ident(), interval, duration, path)
+        self._sampler.start()
+        return self._sampler
+
+    def stop_sampling(self):
+        sampler = self._sampler
+        if sampler is not None and sampler.is_alive():
+            sampler.stop()
+            return sampler
+        return None
+
+
+class StackSampler(threading.Thread):
+    """Thread que amostra a pilha de outra thread e grava as pilhas agregadas"""
+
+    def __init__(self, thread_id, interval, duration, path):
+        super().__init__(name='botrevenge-profiler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.duration = duration
+        self.path = path
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    @staticmethod
+    def _collapse(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        names.reverse()
+        return ';'.join(names)
+
+    def run(self):
+        stacks = Counter()
+        deadline = time.monotonic() + self.duration
+        while not self._stop_event.is_set() and time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                stacks[self._collapse(frame)] += 1
+                self.samples += 1
+            del frame
+            self._stop_event.wait(self.interval)
+
+        try:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            logger.info("Perfil com %s amostras gravado em %s", self.samples, self.path)
+        except OSError as e:
+            logger.error("Não foi possível gravar o perfil em %s: %s", self.path, e)
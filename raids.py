@@ -0,0 +1,245 @@
+"""Modo raid: bans e unbans em massa viram resumos
+
+Enquanto os bans de um servidor chegam devagar, cada um segue o caminho
+normal (fetch_ban e um embed por ban). Quando BAN_BURST_THRESHOLD bans (ou
+unbans) acontecem em BAN_BURST_WINDOW segundos, os próximos são acumulados
+sem chamadas REST. A sequência é encerrada após BAN_BURST_QUIET segundos sem
+novos bans; os motivos e moderadores vêm das entradas do audit log recebidas
+pelo gateway e, para quem faltar, de uma leitura paginada do audit log (ou da
+lista de bans, sem permissão de audit log). O resultado é um BanBurst: poucos
+embeds de resumo com a lista completa em CSV anexo.
+"""
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+
+import discord
+
+from config import BAN_BURST_THRESHOLD, BAN_BURST_WINDOW, BAN_BURST_QUIET, BAN_BURST_MAX_DURATION, BAN_BURST_MAX
+from events import AuditEvent, BanBurst
+
+logger = logging.getLogger(__name__)
+
+AUDIT_ACTIONS = {
+    discord.AuditLogAction.ban: 'ban',
+    discord.AuditLogAction.unban: 'unban',
+}
+
+# Margem (segundos) antes do início da sequência na leitura do audit log
+AUDIT_LOOKBACK = 30
+
+# Entradas extras lidas do audit log além das que faltam (outras ações do mesmo tipo)
+AUDIT_SLACK = 100
+
+# Bans lidos no máximo da lista do servidor (sem permissão de audit log)
+BAN_LIST_LIMIT = 5000
+
+# Motivo usado quando nenhuma fonte informa
+NO_REASON = {'ban': "Motivo não disponível", 'unban': "Desban detectado"}
+
+
+class _Burst:
+    """Sequência de bans/unbans de um servidor ainda não enviada"""
+
+    __slots__ = ('guild', 'action', 'entries', 'audit', 'keys', 'started_at', 'started_mono', 'last_at', 'timer')
+
+    def __init__(self, guild, action, now):
+        self.guild = guild
+        self.action = action
+        # target_id -> [nome, moderator_id, motivo, horário]
+        self.entries = {}
+        # target_id -> (moderator_id, motivo) vindos do gateway (podem chegar antes do ban)
+        self.audit = {}
+        # (target_id, chave do journal) de cada ban/unban gravado na chegada
+        self.keys = []
+        self.started_at = time.time()
+        self.started_mono = now
+        self.last_at = now
+        self.timer = None
+
+
+class BanBurstTracker:
+    """Detecta sequências de bans/unbans por servidor e as envia como resumo"""
+
+    def __init__(self, emit, threshold=BAN_BURST_THRESHOLD, window=BAN_BURST_WINDOW, quiet=BAN_BURST_QUIET,
+                 max_duration=BAN_BURST_MAX_DURATION, max_size=BAN_BURST_MAX, journal=None):
+        # Corrotina chamada com (guild, BanBurst, chaves do journal)
+        self.emit = emit
+        # Grava um AuditEvent no journal e retorna sua chave (None sem journal); cada ban é
+        # gravado na chegada para não se perder se o bot cair antes do resumo
+        self.journal = journal
+        self.threshold = threshold
+        self.window = window
+        self.quiet = quiet
+        self.max_duration = max_duration
+        self.max_size = max_size
+        # (guild_id, ação) -> horários (monotônicos) dos eventos recentes
+        self._recent = {}
+        # (guild_id, ação) -> _Burst em andamento
+        self._bursts = {}
+        self._pending = set()
+        self.stats = Counter()
+
+    @property
+    def enabled(self):
+        return self.threshold > 0
+
+    def active(self, guild_id):
+        return any(key[0] == guild_id for key in self._bursts)
+
+    def observe(self, guild, action, user):
+        """Registra um ban/unban; retorna True se ele entrou em uma sequência (não deve ser enviado sozinho)"""
+        if not self.enabled:
+            return False
+        key = (guild.id, action)
+        now = time.monotonic()
+        burst = self._bursts.get(key)
+        if burst is None:
+            recent = self._recent.get(key)
+            if recent is None:
+                recent = self._recent[key] = deque()
+            recent.append(now)
+            while recent and now - recent[0] > self.window:
+                recent.popleft()
+            if len(recent) < self.threshold:
+                return False
+            # Limite atingido: os próximos eventos deste servidor entram no resumo
+            del self._recent[key]
+            burst = self._bursts[key] = _Burst(guild, action, now)
+            self.stats['bursts'] += 1
+            logger.warning("Modo raid em %s: %s em sequência, enviando como resumo", guild.name, action)
+
+        burst.guild = guild
+        created_at = time.time()
+        burst.entries[user.id] = [user.name, None, None, created_at]
+        burst.last_at = now
+        if self.journal is not None:
+            journal_key = self.journal(AuditEvent(guild.id, action, user.id, None, None, created_at))
+            if journal_key is not None:
+                burst.keys.append((user.id, journal_key))
+        self.stats['absorbed'] += 1
+
+        if len(burst.entries) >= self.max_size or now - burst.started_mono >= self.max_duration:
+            self.flush(key)
+        elif burst.timer is None:
+            loop = asyncio.get_running_loop()
+            burst.timer = loop.call_later(self.quiet, self._expire, key)
+        return True
+
+    def ingest(self, entry):
+        """Guarda moderador e motivo das entradas de ban/unban recebidas pelo gateway durante uma sequência"""
+        action = AUDIT_ACTIONS.get(entry.action)
+        if action is None:
+            return
+        burst = self._bursts.get((entry.guild.id, action))
+        if burst is not None and entry.target is not None:
+            burst.audit[entry.target.id] = (entry.user_id, entry.reason)
+
+    def _expire(self, key):
+        burst = self._bursts.get(key)
+        if burst is None:
+            return
+        remaining = burst.last_at + self.quiet - time.monotonic()
+        if remaining > 0:
+            loop = asyncio.get_running_loop()
+            burst.timer = loop.call_later(remaining, self._expire, key)
+            return
+        burst.timer = None
+        self.flush(key)
+
+    def flush(self, key):
+        """Encerra a sequência e envia o resumo (a busca dos motivos acontece em segundo plano)"""
+        burst = self._bursts.pop(key, None)
+        if burst is None:
+            return
+        if burst.timer is not None:
+            burst.timer.cancel()
+        task = asyncio.ensure_future(self._emit(burst))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _emit(self, burst):
+        try:
+            await self._resolve(burst)
+        except Exception as e:
+            logger.warning("Não foi possível buscar os motivos da sequência em %s: %s", burst.guild.name, e)
+        default_reason = NO_REASON.get(burst.action)
+        entries = tuple(
+            (target_id, name, moderator_id, reason or default_reason, created_at)
+            for target_id, (name, moderator_id, reason, created_at) in burst.entries.items()
+        )
+        record = BanBurst(burst.guild.id, burst.action, entries, burst.started_at, time.time())
+        self.stats['summarized'] += len(entries)
+        await self.emit(burst.guild, record, tuple(burst.keys))
+        self.stats['summaries'] += 1
+
+    async def _resolve(self, burst):
+        """Completa moderador e motivo: gateway, depois audit log paginado, depois lista de bans"""
+        missing = set()
+        for target_id, entry in burst.entries.items():
+            known = burst.audit.get(target_id)
+            if known is not None:
+                entry[1], entry[2] = known
+            else:
+                missing.add(target_id)
+        if not missing:
+            return
+
+        me = burst.guild.me
+        permissions = me.guild_permissions if me is not None else None
+        if permissions is not None and permissions.view_audit_log:
+            self.stats['audit_lookups'] += 1
+            since = datetime.fromtimestamp(burst.started_at - AUDIT_LOOKBACK, timezone.utc)
+            action = discord.AuditLogAction.ban if burst.action == 'ban' else discord.AuditLogAction.unban
+            async for entry in burst.guild.audit_logs(
+                limit=len(missing) + AUDIT_SLACK, action=action,
+                after=discord.Object(id=discord.utils.time_snowflake(since)),
+            ):
+                if entry.target is not None and entry.target.id in missing:
+                    target = burst.entries[entry.target.id]
+                    target[1], target[2] = entry.user_id, entry.reason
+                    missing.discard(entry.target.id)
+                    if not missing:
+                        return
+        elif permissions is not None and permissions.ban_members and burst.action == 'ban':
+            # Sem audit log: a lista de bans tem o motivo (mas não o moderador)
+            self.stats['ban_list_lookups'] += 1
+            # A lista vem em ordem de ID de usuário: começar pelo menor que falta e parar depois do maior
+            last = max(missing)
+            async for ban in burst.guild.bans(limit=BAN_LIST_LIMIT, after=discord.Object(id=min(missing) - 1)):
+                if ban.user.id > last:
+                    return
+                if ban.user.id in missing:
+                    burst.entries[ban.user.id][2] = ban.reason
+                    missing.discard(ban.user.id)
+                    if not missing:
+                        return
+
+    def forget_guild(self, guild_id):
+        """Descarta as sequências de um servidor sem enviá-las"""
+        for key in [key for key in self._bursts if key[0] == guild_id]:
+            burst = self._bursts.pop(key)
+            if burst.timer is not None:
+                burst.timer.cancel()
+        for key in [key for key in self._recent if key[0] == guild_id]:
+            del self._recent[key]
+
+    def sweep(self):
+        """Descarta as janelas de servidores sem bans recentes; retorna quantas saíram"""
+        oldest = time.monotonic() - self.window
+        expired = [key for key, recent in self._recent.items() if not recent or recent[-1] < oldest]
+        for key in expired:
+            del self._recent[key]
+        return len(expired)
+
+    def caches(self):
+        return {'ban_bursts.recent': self._recent, 'ban_bursts.active': self._bursts}
+
+    async def close(self):
+        """Envia as sequências pendentes e aguarda os envios"""
+        for key in list(self._bursts):
+            self.flush(key)
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import time
+from collections import Counter, OrderedDict
+
+from config import VOICE_DEBOUNCE_WINDOW, VOICE_DEBOUNCE_MAX, VOICE_SESSIONS_MAX
+from events import voice_event
+
+logger = logging.getLogger(__name__)
+
+
+class VoiceSession:
+    """Sequência de movimentações de um membro ainda não enviada"""
+
+    __slots__ = ('member', 'moves', 'keys', 'started_at', 'last_at', 'timer')
+
+    def __init__(self, member, now):
+        self.member = member
+        # (horário do evento, canal anterior, canal novo), em ordem de horário
+        self.moves = []
+        # Chaves do journal de cada movimentação (marcadas quando a sessão é enviada)
+        self.keys = []
+        # Marcos em tempo monotônico (janela de agrupamento)
+        self.started_at = now
+        self.last_at = now
+        self.timer = None
+
+    def add(self, at, before, after):
+        """Insere a movimentação na posição do seu horário
+
+        Eventos com moderador esperam pela atribuição e podem chegar depois
+        de eventos mais novos do mesmo membro.
+        """
+        index = len(self.moves)
+        while index and self.moves[index - 1][0] > at:
+            index -= 1
+        self.moves.insert(index, (at, before, after))
+
+    @property
+    def path(self):
+        """Canais percorridos; None quando o membro estava fora da voz"""
+        return [self.moves[0][1]] + [after for _, _, after in self.moves]
+
+    @property
+    def events(self):
+        return len(self.moves)
+
+
+class VoiceSessionTracker:
+    """Agrupa movimentações de voz rápidas de um mesmo membro
+
+    Cada evento sem moderador abre (ou estende) a sessão do membro. Quando
+    ele fica VOICE_DEBOUNCE_WINDOW segundos sem se mover, a sessão vira um
+    único evento: o original, se foi só um, ou um resumo "A → B → C em 12s".
+    Reconexões ao mesmo canal (A → fora → A) são descartadas. Sessões antigas
+    são enviadas antes da hora quando o limite VOICE_SESSIONS_MAX é atingido.
+    """
+
+    def __init__(self, emit, window=VOICE_DEBOUNCE_WINDOW, max_duration=VOICE_DEBOUNCE_MAX,
+                 max_sessions=VOICE_SESSIONS_MAX, on_discarded=None):
+        # Corrotina chamada com (guild, record, key=chaves do journal) para cada evento resultante
+        self.emit = emit
+        # Chamado com as chaves do journal das reconexões descartadas
+        self.on_discarded = on_discarded
+        self.window = window
+        self.max_duration = max_duration
+        self.max_sessions = max_sessions
+        # (guild_id, member_id) -> VoiceSession, da menos para a mais recente
+        self._sessions = OrderedDict()
+        self._pending = set()
+        self.stats = Counter()
+
+    @property
+    def enabled(self):
+        return self.window > 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def caches(self):
+        return {'voice_sessions': self._sessions}
+
+    def observe(self, member, before, after, at=None, journal_key=None):
+        """Registra a movimentação própria de um membro
+
+        `at` é o horário do evento e `journal_key` a chave com que ele já foi
+        gravado no journal (a sessão pode levar até VOICE_DEBOUNCE_MAX
+        segundos para ser enviada).
+        """
+        key = (member.guild.id, member.id)
+        now = time.monotonic()
+        session = self._sessions.get(key)
+        if session is None:
+            session = self._sessions[key] = VoiceSession(member, now)
+            if len(self._sessions) > self.max_sessions:
+                self.stats['evicted'] += 1
+                self.flush(next(iter(self._sessions)))
+        else:
+            self._sessions.move_to_end(key)
+            session.member = member
+            session.last_at = now
+            self.stats['debounced'] += 1
+        session.add(at or time.time(), before, after)
+        if journal_key is not None:
+            session.keys.append(journal_key)
+
+        if now - session.started_at >= self.max_duration:
+            self.flush(key)
+            return
+        if session.timer is None:
+            loop = asyncio.get_running_loop()
+            session.timer = loop.call_later(self.window, self._expire, key)
+
+    def _expire(self, key):
+        """Envia a sessão se o membro ficou parado durante a janela"""
+        session = self._sessions.get(key)
+        if session is None:
+            return
+        remaining = session.last_at + self.window - time.monotonic()
+        if remaining > 0:
+            # Houve movimentação depois do agendamento: esperar o restante
+            loop = asyncio.get_running_loop()
+            session.timer = loop.call_later(remaining, self._expire, key)
+            return
+        session.timer = None
+        self.flush(key)
+
+    def flush(self, key):
+        """Encerra a sessão e envia o evento resultante"""
+        session = self._sessions.pop(key, None)
+        if session is None:
+            return
+        if session.timer is not None:
+            session.timer.cancel()
+
+        record = self._summarize(session)
+        if record is None:
+            self.stats['reconnects'] += 1
+            if session.keys and self.on_discarded is not None:
+                self.on_discarded(session.keys)
+            return
+        task = asyncio.ensure_future(self.emit(session.member.guild, record, key=tuple(session.keys) or None))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    def flush_member(self, member):
+        """Envia a sessão pendente do membro (antes de um evento com moderador)"""
+        self.flush((member.guild.id, member.id))
+
+    def _summarize(self, session):
+        path = session.path
+        first, last = path[0], path[-1]
+        created_at = session.moves[0][0]
+        if session.events == 1:
+            return voice_event(session.member, first, last, created_at=created_at)
+
+        visited = {channel.id for channel in path if channel is not None}
+        if first is not None and first == last and visited == {first.id}:
+            # Só quedas e reconexões ao mesmo canal
+            return None
+
+        self.stats['chains'] += 1
+        record = voice_event(session.member, first, last, created_at=created_at)
+        return record._replace(
+            path=tuple(channel.name if channel is not None else None for channel in path),
+            duration=session.moves[-1][0] - created_at,
+        )
+
+    def forget_guild(self, guild_id):
+        """Descarta as sessões de um servidor sem enviá-las"""
+        for key in [key for key in self._sessions if key[0] == guild_id]:
+            session = self._sessions.pop(key)
+            if session.timer is not None:
+                session.timer.cancel()
+
+    async def close(self):
+        """Envia todas as sessões pendentes e aguarda os envios"""
+        for key in list(self._sessions):
+            self.flush(key)
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
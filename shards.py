@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import Counter
+
+from config import CLUSTER_ID, SHARD_REPORT_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+
+class ShardMonitor:
+    """Conta eventos por shard e reporta latência do gateway periodicamente"""
+
+    def __init__(self, bot, interval=SHARD_REPORT_INTERVAL, cluster_id=CLUSTER_ID):
+        self.bot = bot
+        self.interval = interval
+        self.cluster_id = cluster_id
+        # shard_id -> eventos desde o último relatório
+        self._window = Counter()
+        self.totals = Counter()
+        self.rates = {}
+        # Eventos recebidos do gateway por tipo (VOICE_STATE_UPDATE, MESSAGE_CREATE, ...)
+        self.gateway_events = Counter()
+        # guild_id -> Counter(tipo do evento -> eventos tratados pelos handlers), só servidores atuais
+        self.events = {}
+        self._window_started = time.monotonic()
+        self._task = None
+
+    def count(self, guild, event_type='other'):
+        """Registra um evento do servidor no shard correspondente"""
+        shard_id = guild.shard_id or 0
+        self._window[shard_id] += 1
+        self.totals[shard_id] += 1
+        events = self.events.get(guild.id)
+        if events is None:
+            events = self.events[guild.id] = Counter()
+        events[event_type] += 1
+
+    def forget_guild(self, guild_id):
+        """Descarta a contagem de eventos de um servidor que o bot deixou"""
+        self.events.pop(guild_id, None)
+
+    def caches(self):
+        return {'shards.events': self.events}
+
+    def count_gateway_event(self, event_type):
+        self.gateway_events[event_type] += 1
+
+    def latencies(self):
+        """Latência do gateway por shard, em segundos"""
+        if hasattr(self.bot, 'latencies'):
+            return dict(self.bot.latencies)
+        return {self.bot.shard_id or 0: self.bot.latency}
+
+    def _roll_window(self):
+        """Fecha a janela atual e calcula eventos por segundo de cada shard"""
+        now = time.monotonic()
+        elapsed = max(now - self._window_started, 1e-6)
+        self.rates = {shard_id: count / elapsed for shard_id, count in self._window.items()}
+        self._window.clear()
+        self._window_started = now
+
+    def report(self):
+        self._roll_window()
+        for shard_id, latency in sorted(self.latencies().items()):
+            latency_ms = latency * 1000 if latency is not None and math.isfinite(latency) else float('nan')
+            logger.info(
+                "Cluster %s - shard %s: latência %.0fms, %.1f eventos/s, %s eventos no total",
+                self.cluster_id, shard_id, latency_ms, self.rates.get(shard_id, 0.0), self.totals[shard_id],
+            )
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.ensure_future(self._report_loop())
+
+    async def _report_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.report()
+            except Exception as e:
+                logger.error("Erro ao gerar relatório dos shards: %s", e)
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+def process_rss_bytes():
+    """Memória residente atual do processo (pico, fora do Linux; 0 no Windows)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        pass
+    try:
+        # Só existe em sistemas Unix
+        import resource
+    except ImportError:
+        return 0
+    # ru_maxrss é em KB no Linux e em bytes no macOS; aqui só sobra o macOS/BSD
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
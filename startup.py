@@ -0,0 +1,100 @@
+"""Medição do tempo de inicialização e checkpoint da conexão com o gateway
+
+O discord.py não consegue retomar (RESUME) a sessão do gateway em um novo
+processo: os eventos reenviados pelo Discord dependem do cache de servidores
+do processo anterior. Em vez disso, o bot grava periodicamente o último
+momento em que estava conectado; ao reiniciar, esse intervalo fora do ar é
+recuperado pelo audit log (AuditLogger.backfill).
+"""
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+
+from config import CHECKPOINT_PATH, CHECKPOINT_INTERVAL, CLUSTER_ID
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimer:
+    """Marcos da inicialização, em segundos desde a importação do bot"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        # fase -> segundos desde o início (só a primeira ocorrência)
+        self.marks = {}
+
+    def mark(self, phase):
+        """Registra a fase; retorna False se ela já tinha acontecido"""
+        if phase in self.marks:
+            return False
+        self.marks[phase] = time.monotonic() - self.started
+        logger.info("Inicialização: %s em %.2fs", phase, self.marks[phase])
+        return True
+
+    def summary(self):
+        return ', '.join(f"{phase} {seconds:.2f}s" for phase, seconds in self.marks.items())
+
+
+class GatewayCheckpoint:
+    """Arquivo com o último momento em que o bot estava conectado"""
+
+    def __init__(self, bot, path=CHECKPOINT_PATH, interval=CHECKPOINT_INTERVAL):
+        self.bot = bot
+        self.path = path
+        self.interval = interval
+        # Checkpoint deixado pelo processo anterior (lido antes de ser sobrescrito)
+        self.previous = self.load()
+        self._task = None
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Checkpoint do gateway ilegível em %s: %s", self.path, e)
+            return None
+
+    def last_connected(self):
+        """Último momento (epoch) em que o processo anterior estava conectado"""
+        if not self.previous:
+            return None
+        return self.previous.get('last_connected')
+
+    def _connected(self):
+        return self.bot.is_ready() and not self.bot.is_closed() and math.isfinite(self.bot.latency)
+
+    def _write(self, data):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    async def save(self):
+        data = {'last_connected': time.time(), 'cluster_id': CLUSTER_ID, 'guilds': len(self.bot.guilds)}
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self._write, data)
+        except OSError as e:
+            logger.warning("Não foi possível gravar o checkpoint do gateway: %s", e)
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.ensure_future(self._loop())
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if self._connected():
+                await self.save()
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._connected():
+            await self.save()
@@ -0,0 +1,138 @@
+import logging
+import time
+from collections import Counter
+
+import aiohttp
+import discord
+
+from caches import LRUCache
+from config import AUDIT_WEBHOOK_NAME, AUDIT_WEBHOOK_URLS, WEBHOOK_POOL_SIZE
+from delivery import as_files, send_to_channel
+
+logger = logging.getLogger(__name__)
+
+# Tempo (segundos) antes de tentar criar de novo um webhook que falhou
+WEBHOOK_RETRY_INTERVAL = 600
+
+
+class WebhookPool:
+    """Entrega de logs via webhook, com uma sessão HTTP compartilhada
+
+    Cada canal de auditoria recebe um webhook criado uma única vez (ou
+    reaproveitado, se o bot já tiver criado um antes) e mantido em cache.
+    Os envios usam o bucket de rate limit do webhook, liberando os buckets
+    do bot para o audit log e o fetch_ban. Se o webhook não puder ser usado,
+    o envio cai para o channel.send normal. Envios para outros canais (o canal
+    alternativo, quando o de auditoria está indisponível) sempre usam o
+    channel.send: nem criam webhook ali nem vão para a URL configurada.
+    """
+
+    def __init__(self, bot, name=AUDIT_WEBHOOK_NAME, urls=AUDIT_WEBHOOK_URLS, pool_size=WEBHOOK_POOL_SIZE,
+                 trace_configs=None, is_audit_channel=None):
+        self.bot = bot
+        # Indica se o canal é o canal de auditoria do servidor (único que usa webhook)
+        self.is_audit_channel = is_audit_channel
+        self.name = name
+        # Webhooks configurados manualmente por servidor (guild_id -> URL)
+        self.urls = dict(urls)
+        self.pool_size = pool_size
+        # Traces do aiohttp (métricas de chamadas REST)
+        self.trace_configs = trace_configs or []
+        self.session = None
+        # channel_id (ou guild_id, para URLs configuradas) -> discord.Webhook; os menos usados
+        # saem após GUILD_CACHE_MAX e são reaproveitados do canal no próximo envio
+        self._webhooks = LRUCache()
+        # channel_id -> momento da última falha ao obter o webhook
+        self._unavailable = {}
+        self.stats = Counter()
+
+    async def start(self):
+        """Abre a sessão HTTP compartilhada por todos os servidores"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, ttl_dns_cache=300)
+            self.session = aiohttp.ClientSession(connector=connector, trace_configs=self.trace_configs)
+
+    async def close(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+
+    async def get_webhook(self, channel):
+        """Retorna o webhook do canal, criando-o na primeira vez"""
+        guild_id = channel.guild.id
+        if guild_id in self.urls:
+            webhook = self._webhooks.get(guild_id)
+            if webhook is None:
+                webhook = self._webhooks[guild_id] = discord.Webhook.from_url(self.urls[guild_id], session=self.session)
+            return webhook
+
+        webhook = self._webhooks.get(channel.id)
+        if webhook is not None:
+            return webhook
+
+        failed_at = self._unavailable.get(channel.id)
+        if failed_at and time.monotonic() - failed_at < WEBHOOK_RETRY_INTERVAL:
+            return None
+
+        try:
+            webhook = await self._find_or_create(channel)
+        except discord.HTTPException as e:
+            self._unavailable[channel.id] = time.monotonic()
+            logger.warning("Não foi possível obter webhook em %s (precisa de 'Gerenciar Webhooks'): %s", channel.name, e)
+            return None
+
+        self._unavailable.pop(channel.id, None)
+        # Reassociar o webhook à sessão compartilhada
+        webhook = discord.Webhook.partial(webhook.id, webhook.token, session=self.session)
+        self._webhooks[channel.id] = webhook
+        return webhook
+
+    async def _find_or_create(self, channel):
+        """Reaproveita um webhook do próprio bot ou cria um novo"""
+        for webhook in await channel.webhooks():
+            if webhook.token and webhook.user and webhook.user.id == self.bot.user.id:
+                return webhook
+        self.stats['created'] += 1
+        logger.info("Criando webhook de auditoria em %s", channel.name)
+        return await channel.create_webhook(name=self.name, reason="Webhook para logs de auditoria")
+
+    def forget(self, channel):
+        self._webhooks.pop(channel.id, None)
+        self._webhooks.pop(channel.guild.id, None)
+
+    def sweep(self):
+        """Esquece falhas mais antigas que WEBHOOK_RETRY_INTERVAL"""
+        now = time.monotonic()
+        expired = [channel_id for channel_id, failed_at in self._unavailable.items()
+                   if now - failed_at >= WEBHOOK_RETRY_INTERVAL]
+        for channel_id in expired:
+            del self._unavailable[channel_id]
+        return len(expired)
+
+    def caches(self):
+        return {'webhooks': self._webhooks, 'webhooks.unavailable': self._unavailable}
+
+    async def send(self, channel, embeds, attachments=None):
+        """Envia os embeds pelo webhook do canal (ou pelo bot, como fallback)"""
+        if self.is_audit_channel is not None and not self.is_audit_channel(channel):
+            self.stats['direct_sends'] += 1
+            await send_to_channel(channel, embeds, attachments)
+            return
+        webhook = await self.get_webhook(channel)
+        if webhook is None:
+            self.stats['fallback_sends'] += 1
+            await send_to_channel(channel, embeds, attachments)
+            return
+
+        try:
+            await webhook.send(
+                embeds=embeds,
+                files=as_files(attachments) or discord.utils.MISSING,
+                username=self.bot.user.name,
+                avatar_url=self.bot.user.display_avatar.url,
+            )
+            self.stats['webhook_sends'] += 1
+        except discord.NotFound:
+            # Webhook apagado no servidor: criar outro no próximo envio
+            self.forget(channel)
+            self.stats['fallback_sends'] += 1
+            await send_to_channel(channel, embeds, attachments)